@@ -3,7 +3,8 @@ from logging.config import fileConfig
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
-from app.database import Base
+from app import models  # noqa: F401  registers the tables on Base.metadata
+from app.database import Base, SQLALCHEMY_DATABASE_URL
 from alembic import context
 
 # this is the Alembic Config object, which provides
@@ -15,6 +16,9 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Same DATABASE_* settings as the app, not the placeholder in alembic.ini
+config.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL.replace("%", "%%"))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
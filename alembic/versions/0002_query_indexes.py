@@ -0,0 +1,67 @@
+"""indexes for foreign keys and hot filters
+
+Built CONCURRENTLY so a live database keeps taking writes. Each index is
+created outside a transaction, so a failed run leaves the ones before it in
+place and the failing one INVALID. Running `alembic upgrade head` again
+skips the valid ones and drops and rebuilds the invalid one.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:20:04.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns, extra create_index arguments)
+INDEXES = [
+    ('ix_orders_customer_id_created_at', 'orders', ['customer_id', 'created_at'], {}),
+    ('ix_orders_locker_id', 'orders', ['locker_id'], {}),
+    ('ix_orders_payment_id', 'orders', ['payment_id'], {}),
+    ('ix_orders_courier_id', 'orders', ['courier_id'], {}),
+    ('ix_orders_laundromat_id', 'orders', ['laundromat_id'], {}),
+    ('ix_orders_open', 'orders', ['laundromat_id'], {'postgresql_where': sa.text('completed_at IS NULL')}),
+    ('ix_orders_awaiting_pickup', 'orders', ['locker_id'], {'postgresql_where': sa.text('picked_up_at IS NULL')}),
+    ('ix_payments_customer_id', 'payments', ['customer_id'], {}),
+    ('ix_lockers_code_lower', 'lockers', [sa.text('lower(code)')], {}),
+    ('ix_customer_deletion_requests_customer_id', 'customer_deletion_requests', ['customer_id'], {}),
+    ('ix_courier_deletion_requests_courier_id', 'courier_deletion_requests', ['courier_id'], {}),
+    ('ix_order_deletion_requests_order_id', 'order_deletion_requests', ['order_id'], {}),
+    ('ix_order_deletion_requests_customer_id', 'order_deletion_requests', ['customer_id'], {}),
+    ('ix_payment_deletion_requests_payment_id', 'payment_deletion_requests', ['payment_id'], {}),
+    ('ix_payment_deletion_requests_customer_id', 'payment_deletion_requests', ['customer_id'], {}),
+    ('ix_notification_deliveries_customer_id', 'notification_deliveries', ['customer_id'], {}),
+]
+
+
+def _existing(table):
+    # index name -> whether it is valid; the inspector lists INVALID ones too
+    return dict(op.get_bind().execute(sa.text(
+        "SELECT index_class.relname, pg_index.indisvalid FROM pg_index "
+        "JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid "
+        "WHERE pg_index.indrelid = CAST(:table AS regclass)"), {"table": table}).all())
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            # Left by an earlier, interrupted run: valid ones are kept
+            valid = _existing(table).get(name)
+            if valid is False:
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+            if not valid:
+                op.create_index(name, table, columns, postgresql_concurrently=True, **kwargs)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            if name in _existing(table):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
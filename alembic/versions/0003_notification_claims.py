@@ -0,0 +1,30 @@
+"""claims on notification batches, so queued deliveries are resumed
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 15:02:41.530117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('notification_batches', sa.Column('claimed_until', sa.DateTime(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_notification_deliveries_queued', 'notification_deliveries', ['batch_id'],
+                        postgresql_where=sa.text("status = 'QUEUED'"), postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_notification_deliveries_queued', table_name='notification_deliveries',
+                      postgresql_concurrently=True)
+    op.drop_column('notification_batches', 'claimed_until')
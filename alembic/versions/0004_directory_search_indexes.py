@@ -0,0 +1,42 @@
+"""prefix search indexes for the account directories
+
+lower(name), lower(email) and phone_number with text_pattern_ops on
+customers, couriers and laundromats, for the ?q= search in
+app/pagination.py. Built CONCURRENTLY, like 0002.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 15:40:12.804411
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+TABLES = ['customers', 'couriers', 'laundromats']
+# (name suffix, indexed expression)
+EXPRESSIONS = [
+    ('name_prefix', 'lower(name) text_pattern_ops'),
+    ('email_prefix', 'lower(email) text_pattern_ops'),
+    ('phone_number_prefix', 'phone_number text_pattern_ops'),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            for suffix, expression in EXPRESSIONS:
+                op.create_index(f'ix_{table}_{suffix}', table, [sa.text(expression)], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            for suffix, _ in EXPRESSIONS:
+                op.drop_index(f'ix_{table}_{suffix}', table_name=table, postgresql_concurrently=True)
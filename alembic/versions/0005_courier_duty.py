@@ -0,0 +1,33 @@
+"""courier duty and position, shared by the dispatch engines of all workers
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 18:05:27.316842
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'courier_duty',
+        sa.Column('courier_id', sa.Integer(), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.Column('position_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['courier_id'], ['couriers.courier_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('courier_id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('courier_duty')
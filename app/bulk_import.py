@@ -0,0 +1,171 @@
+# This API was developed by Alex Mutonga
+# Bulk account import for onboarding corporate clients and courier fleets.
+#
+# Rows are validated with the normal signup schemas, passwords are hashed
+# across a process pool (bcrypt is CPU bound, so threads would not help) and
+# accounts are inserted with multi-row INSERT ... ON CONFLICT DO NOTHING
+# statements. Every rejected row is reported with its row number. Cached
+# listings of the imported kind are invalidated once the rows are in; from
+# the command line that reaches the API workers when the invalidation bus
+# connects in time, and their cache TTL covers it otherwise.
+#
+#   python -m app.bulk_import customers customers.csv
+#   python -m app.bulk_import couriers fleet.json
+import csv
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+from pydantic import ValidationError
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app import models, response_cache, schemas, utils
+
+INSERT_CHUNK_SIZE = 500
+
+# kind -> (model, signup schema, response cache tag of its listings)
+IMPORT_KINDS = {
+    "customers": (models.Customer, schemas.CustomerCreate, "customer:*"),
+    "couriers": (models.Courier, schemas.CourierCreate, "courier:*"),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    # spawn rather than fork: the API process has threads (threadpool, SMS loop)
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_hash_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def parse_rows(content: bytes, filename: str = "") -> List[dict]:
+    text = content.decode("utf-8-sig")
+    if filename.lower().endswith(".json") or text.lstrip().startswith("["):
+        rows = json.loads(text)
+        if not isinstance(rows, list):
+            raise ValueError("JSON import must be a list of objects")
+        return rows
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def _unique_columns(model) -> List[str]:
+    return [column.key for column in model.__table__.columns if column.unique]
+
+
+def _conflict_message(row: dict, existing: dict) -> str:
+    for column, message in utils.UNIQUE_CONFLICT_MESSAGES.items():
+        if row.get(column) is not None and row.get(column) in existing.get(column, set()):
+            return message
+    return "Account already exists"
+
+
+def import_accounts(db: Session, kind: str, rows: List[dict]) -> schemas.ImportReport:
+    model, create_schema, cache_tag = IMPORT_KINDS[kind]
+    unique_columns = _unique_columns(model)
+    errors = []
+    valid = []
+    seen = {column: set() for column in unique_columns}
+
+    # Validate, and reject duplicates within the file itself
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            # e.g. a string or a list in a JSON array
+            errors.append(schemas.ImportRowError(row=number, email=None,
+                                                 errors=[f"Expected an object, got {type(row).__name__}"]))
+            continue
+        try:
+            account = create_schema(**row).dict()
+        except (ValidationError, TypeError) as e:
+            detail = e.errors() if isinstance(e, ValidationError) else str(e)
+            errors.append(schemas.ImportRowError(row=number, email=row.get("email"), errors=[str(detail)]))
+            continue
+        duplicate = next((column for column in unique_columns
+                          if account.get(column) is not None and account[column] in seen[column]), None)
+        if duplicate:
+            errors.append(schemas.ImportRowError(
+                row=number, email=account["email"],
+                errors=[f"Duplicate {duplicate} in import file"]))
+            continue
+        for column in unique_columns:
+            if account.get(column) is not None:
+                seen[column].add(account[column])
+        valid.append((number, account))
+
+    # Hash every password in parallel, keeping input order
+    if valid:
+        passwords = [account["password"] for _, account in valid]
+        chunksize = max(1, len(passwords) // ((os.cpu_count() or 1) * 4))
+        for (_, account), hashed in zip(valid, get_hash_pool().map(utils.hash, passwords, chunksize=chunksize)):
+            account["password"] = hashed
+
+    created = 0
+    for start in range(0, len(valid), INSERT_CHUNK_SIZE):
+        chunk = valid[start:start + INSERT_CHUNK_SIZE]
+        result = db.execute(
+            insert(model).values([account for _, account in chunk])
+            .on_conflict_do_nothing()
+            .returning(model.email)
+        )
+        inserted = {email for (email,) in result}
+        created += len(inserted)
+
+        skipped = [(number, account) for number, account in chunk if account["email"] not in inserted]
+        if skipped:
+            # One lookup to tell the caller which column clashed
+            filters = [getattr(model, column).in_([account[column] for _, account in skipped
+                                                   if account.get(column) is not None])
+                       for column in unique_columns]
+            existing = {column: set() for column in unique_columns}
+            for match in db.query(*[getattr(model, column) for column in unique_columns]).filter(or_(*filters)):
+                for column in unique_columns:
+                    existing[column].add(getattr(match, column))
+            for number, account in skipped:
+                errors.append(schemas.ImportRowError(row=number, email=account["email"],
+                                                     errors=[_conflict_message(account, existing)]))
+        db.commit()
+
+    if created:
+        response_cache.invalidate(cache_tag)
+    errors.sort(key=lambda error: error.row)
+    return schemas.ImportReport(total=len(rows), created=created, failed=len(errors), errors=errors)
+
+
+if __name__ == "__main__":
+    import sys
+    from app import invalidation
+    from app.database import SessionLocal
+
+    if len(sys.argv) != 3 or sys.argv[1] not in IMPORT_KINDS:
+        print(f"usage: python -m app.bulk_import {{{','.join(IMPORT_KINDS)}}} FILE.csv|FILE.json")
+        sys.exit(2)
+
+    with open(sys.argv[2], "rb") as f:
+        import_rows = parse_rows(f.read(), sys.argv[2])
+
+    session = SessionLocal()
+    invalidation.bus.start()
+    try:
+        report = import_accounts(session, sys.argv[1], import_rows)
+    finally:
+        session.close()
+        shutdown_hash_pool()
+        invalidation.bus.stop()
+    print(report.json(indent=2))
+    sys.exit(1 if report.failed else 0)
@@ -0,0 +1,158 @@
+# This API was developed by Alex Mutonga
+# Response compression negotiated from Accept-Encoding.
+#
+# Brotli is preferred when the client accepts it and the brotli package is
+# installed, gzip otherwise. Only text-like content types (JSON, text/*,
+# XML, JavaScript) are compressed, and only once a response reaches
+# compression_min_bytes: below that the CPU costs more than the bytes save.
+#
+# A response sent in one piece (every JSON endpoint) is compressed whole and
+# gets a new Content-Length. A streamed response is compressed chunk by
+# chunk, each flushed so the client sees it without waiting for the rest,
+# and goes out without Content-Length. Large bodies are compressed in the
+# threadpool (zlib and brotli release the GIL) so a multi-megabyte admin
+# listing does not stall the event loop for everyone else.
+#
+# Compression time, and bytes in and out per encoding, go to /metrics.
+import time
+import zlib
+from typing import List, Optional, Tuple
+import anyio
+from app.config import settings
+from app.metrics import registry as metrics_registry
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/xml", "application/javascript")
+# Chunks at least this big are compressed off the event loop
+OFFLOAD_BYTES = 64 * 1024
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    # "br;q=1.0, gzip;q=0.8, *;q=0" -> "br"; None when nothing we offer is acceptable
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        if coding.strip():
+            weights[coding.strip()] = q
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=settings.compression_brotli_quality)
+        else:
+            # wbits 31: gzip header and trailer
+            self._compressor = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, last: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._compressor.process(data)
+            return out + (self._compressor.finish() if last else self._compressor.flush())
+        out = self._compressor.compress(data)
+        return out + self._compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+async def _run(compressor: Compressor, data: bytes, last: bool) -> bytes:
+    started = time.perf_counter()
+    if len(data) >= OFFLOAD_BYTES:
+        out = await anyio.to_thread.run_sync(compressor.compress, data, last)
+    else:
+        out = compressor.compress(data, last)
+    metrics_registry.observe_compression(compressor.encoding, len(data), len(out), time.perf_counter() - started)
+    return out
+
+
+def _compressible(headers: List[Tuple[bytes, bytes]]) -> bool:
+    content_type = b""
+    for name, value in headers:
+        if name == b"content-encoding":
+            return False  # already encoded by the endpoint
+        if name == b"content-type":
+            content_type = value
+    return content_type.decode("latin-1").lower().startswith(COMPRESSIBLE_TYPES)
+
+
+def _content_length(headers: List[Tuple[bytes, bytes]]) -> Optional[int]:
+    for name, value in headers:
+        if name == b"content-length":
+            return int(value)
+    return None
+
+
+class CompressionMiddleware:
+    # Plain ASGI middleware like MetricsMiddleware, so streamed bodies stay streamed
+    def __init__(self, app):
+        self.app = app
+        self.min_bytes = settings.compression_min_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value
+        encoding = negotiate(accept_encoding.decode("latin-1"))
+        if encoding is None or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor: Optional[Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                # Held until the first body chunk shows how big the response is
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = list(start.get("headers", []))
+                size = len(body) if not more_body else _content_length(headers)
+                if start["status"] in (204, 304) or not _compressible(headers) or \
+                        (size is not None and size < self.min_bytes):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = Compressor(encoding)
+                headers = [(name, value) for name, value in headers if name != b"content-length"]
+                headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+                if not more_body:
+                    body = await _run(compressor, body, last=True)
+                    headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": await _run(compressor, body, last=not more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
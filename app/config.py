@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseSettings
 
 
@@ -7,6 +8,9 @@ class Settings(BaseSettings):
     database_password: str
     database_name: str
     database_username: str
+    # Optional streaming replica for read-only GET endpoints (app/database.py)
+    database_replica_url: Optional[str] = None
+    read_your_writes_seconds: float = 5.0
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
@@ -14,6 +18,62 @@ class Settings(BaseSettings):
     twilio_auth_token: str
     twilio_phone_number: str
     twilio_verify_sid: str  # Add this line
+    # Development only: create missing tables at startup. Alembic owns the schema everywhere else
+    dev_create_tables: bool = False
+    # Override upstream base URLs, e.g. http://localhost:12111 for benchmarks/fake_upstreams.py
+    stripe_api_base: Optional[str] = None
+    twilio_api_base: Optional[str] = None
+    # Outbound SMS queue (app/sms.py); keep the rate at our Twilio number's throughput.
+    # 1/s is a single long code: a 5,000-recipient fan-out takes about 83 minutes.
+    # Raise it with a messaging service or short code behind TWILIO_PHONE_NUMBER
+    sms_rate_per_second: float = 1.0
+    sms_batch_size: int = 10
+    sms_max_retries: int = 3
+    sms_retry_backoff_seconds: float = 1.0
+    sms_queue_size: int = 10000
+    sms_workers: int = 4
+    # Bulk notifications (app/notifications.py)
+    notification_status_batch_size: int = 200
+    notification_status_flush_seconds: float = 2.0
+    # A batch whose worker stopped renewing its claim for this long is resumed by another
+    notification_claim_seconds: float = 60.0
+    # Courier dispatch (app/dispatch.py)
+    dispatch_max_jobs_per_courier: int = 8
+    dispatch_load_penalty_km: float = 2.0
+    dispatch_grid_cell_km: float = 1.0
+    route_time_budget_ms: float = 50.0
+    # Laundromat scheduling (app/scheduling.py); counters are re-read from the DB this often
+    scheduler_refresh_seconds: float = 60.0
+    # Price table cache (app/pricing.py); other workers' edits show up after this long
+    pricing_refresh_seconds: float = 300.0
+    # GET response cache (app/response_cache.py); 0 bytes turns it off
+    response_cache_max_bytes: int = 32 * 1024 * 1024
+    response_cache_ttl_seconds: float = 30.0
+    # LISTEN/NOTIFY channel that keeps worker caches coherent (app/invalidation.py); empty turns it off
+    cache_invalidation_channel: str = "cache_invalidation"
+    # Token-bucket rate limits per client (app/rate_limit.py); a 0 rate turns that class off
+    rate_limit_read_per_second: float = 10.0
+    rate_limit_read_burst: int = 40
+    rate_limit_write_per_second: float = 2.0
+    rate_limit_write_burst: int = 20
+    rate_limit_login_per_second: float = 0.2
+    rate_limit_login_burst: int = 5
+    rate_limit_max_keys: int = 100_000
+    # Proxies in front of us that append to X-Forwarded-For (1 on Heroku), 0 for none. Unset,
+    # requests without a valid token are not limited: behind a proxy they would share its address
+    rate_limit_forwarded_hops: Optional[int] = None
+    # Response compression (app/compression.py); smaller responses go out as they are
+    compression_min_bytes: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    # Deletion request queue (app/deletion_requests.py); requests decided per transaction
+    deletion_batch_size: int = 500
+    # Courier GPS history (app/locations.py)
+    location_flush_seconds: float = 2.0
+    location_full_resolution_hours: int = 24
+    location_downsample_seconds: int = 60
+    location_downsample_every_minutes: int = 60
+    location_retention_days: int = 90
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,142 @@
+# This API was developed by Alex Mutonga
+# Per-customer order/spend counters.
+#
+# The counters are bumped inside the same session (and therefore the same
+# transaction) as the order/payment write that caused them, so reading a
+# customer's summary is a single primary-key lookup on customer_stats.
+#
+# Backfill / repair:  python -m app.customer_stats
+from sqlalchemy import func, insert as sa_insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app import models
+
+
+def _utcnow():
+    # updated_at is a naive UTC column, like the datetime.utcnow model default
+    return func.timezone("utc", func.now())
+
+
+def _bump(db: Session, customer_id: int, **deltas):
+    # Upsert so the first order/payment of a customer creates the row
+    stmt = insert(models.CustomerStats).values(customer_id=customer_id, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.CustomerStats.customer_id],
+        set_={
+            **{name: getattr(models.CustomerStats, name) + stmt.excluded[name] for name in deltas},
+            "updated_at": _utcnow(),
+        },
+    )
+    db.execute(stmt)
+
+
+def order_added(db: Session, customer_id: int, weight: float):
+    if customer_id is None:
+        return
+    _bump(db, customer_id, order_count=1, total_weight=weight or 0)
+
+
+def order_removed(db: Session, customer_id: int, weight: float):
+    if customer_id is None:
+        return
+    _bump(db, customer_id, order_count=-1, total_weight=-(weight or 0))
+
+
+def order_weight_changed(db: Session, customer_id: int, old_weight: float, new_weight: float):
+    if customer_id is None or old_weight == new_weight:
+        return
+    _bump(db, customer_id, total_weight=(new_weight or 0) - (old_weight or 0))
+
+
+def payment_added(db: Session, customer_id: int, amount: float):
+    if customer_id is None:
+        return
+    _bump(db, customer_id, payment_count=1, total_spend=amount or 0)
+
+
+def payment_removed(db: Session, customer_id: int, amount: float):
+    if customer_id is None:
+        return
+    _bump(db, customer_id, payment_count=-1, total_spend=-(amount or 0))
+
+
+def _subtract(db: Session, totals, *columns):
+    # UPDATE ... FROM a per-customer aggregate, for bulk deletes
+    db.execute(
+        update(models.CustomerStats)
+        .where(models.CustomerStats.customer_id == totals.c.customer_id)
+        .values(**{name: getattr(models.CustomerStats, name) - totals.c[name] for name in columns},
+                updated_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def orders_removed(db: Session, order_ids):
+    # Call before the orders are deleted
+    totals = select(
+        models.Order.customer_id.label("customer_id"),
+        func.count(models.Order.id).label("order_count"),
+        func.coalesce(func.sum(models.Order.weight), 0).label("total_weight"),
+    ).where(models.Order.id.in_(order_ids), models.Order.customer_id.isnot(None)) \
+        .group_by(models.Order.customer_id).subquery()
+    _subtract(db, totals, "order_count", "total_weight")
+
+
+def payments_removed(db: Session, payment_ids):
+    # Call before the payments are deleted
+    totals = select(
+        models.Payment.customer_id.label("customer_id"),
+        func.count(models.Payment.id).label("payment_count"),
+        func.coalesce(func.sum(models.Payment.amount), 0).label("total_spend"),
+    ).where(models.Payment.id.in_(payment_ids), models.Payment.customer_id.isnot(None)) \
+        .group_by(models.Payment.customer_id).subquery()
+    _subtract(db, totals, "payment_count", "total_spend")
+
+
+def rebuild(db: Session):
+    # Recompute every row from orders and payments in one set-based statement
+    order_totals = select(
+        models.Order.customer_id.label("customer_id"),
+        func.count(models.Order.id).label("order_count"),
+        func.coalesce(func.sum(models.Order.weight), 0).label("total_weight"),
+    ).group_by(models.Order.customer_id).subquery()
+
+    payment_totals = select(
+        models.Payment.customer_id.label("customer_id"),
+        func.count(models.Payment.id).label("payment_count"),
+        func.coalesce(func.sum(models.Payment.amount), 0).label("total_spend"),
+    ).group_by(models.Payment.customer_id).subquery()
+
+    rows = select(
+        models.Customer.customer_id,
+        func.coalesce(order_totals.c.order_count, 0),
+        func.coalesce(order_totals.c.total_weight, 0),
+        func.coalesce(payment_totals.c.payment_count, 0),
+        func.coalesce(payment_totals.c.total_spend, 0),
+        _utcnow(),
+    ).select_from(models.Customer) \
+        .outerjoin(order_totals, order_totals.c.customer_id == models.Customer.customer_id) \
+        .outerjoin(payment_totals, payment_totals.c.customer_id == models.Customer.customer_id)
+
+    # Block concurrent bumps until the rebuilt rows are committed
+    db.execute(text("LOCK TABLE customer_stats IN SHARE ROW EXCLUSIVE MODE"))
+    db.query(models.CustomerStats).delete(synchronize_session=False)
+    result = db.execute(
+        sa_insert(models.CustomerStats).from_select(
+            ["customer_id", "order_count", "total_weight", "payment_count", "total_spend", "updated_at"],
+            rows,
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        count = rebuild(db)
+        print(f"Rebuilt stats for {count} customers")
+    finally:
+        db.close()
@@ -1,20 +1,137 @@
 #This API was developed by Alex Mutonga
-from sqlalchemy import create_engine
+import math
+import threading
+import time
+from fastapi import Request
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.config import settings
 
 SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# The engine (and the driver import that comes with it) is created on first
+# use rather than at import, so importing the app stays cheap
+_engine = None
+_read_engine = None
+_primary_read_engine = None
+_engine_lock = threading.RLock()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush= False, bind=engine)
+_sessionmaker = sessionmaker(autocommit=False, autoflush= False)
 
 Base = declarative_base()
 
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    return _engine
+
+
+def get_read_engine(primary: bool = False):
+    # Read-only sessions go to the replica when one is configured (and the
+    # caller does not need the primary), else to the primary in read-only mode
+    global _read_engine, _primary_read_engine
+    if _primary_read_engine is None:
+        with _engine_lock:
+            if _primary_read_engine is None:
+                _primary_read_engine = get_engine().execution_options(postgresql_readonly=True)
+                _read_engine = _primary_read_engine
+                if settings.database_replica_url:
+                    _read_engine = create_engine(settings.database_replica_url) \
+                        .execution_options(postgresql_readonly=True)
+    return _primary_read_engine if primary else _read_engine
+
+
+def __getattr__(name):
+    # Keeps `from app.database import engine` working
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def SessionLocal() -> Session:
+    return _sessionmaker(bind=get_engine())
+
+
+def dedicated_connection():
+    # A DBAPI connection of its own, taken out of the pool and in autocommit,
+    # for long-lived listeners (app/invalidation.py); close it when done
+    connection = get_engine().raw_connection()
+    connection.detach()
+    dbapi_connection = connection.dbapi_connection
+    dbapi_connection.autocommit = True
+    return dbapi_connection
+
+
+# Read-your-writes: a response to a request that committed on the primary
+# sets a cookie saying until when (wall clock) its client should read from
+# the primary, and reads that carry it stay there so the client never sees a
+# replica that has not caught up with its own write. The marker travels with
+# the client, so it holds whichever worker serves the next request; clients
+# other than browsers have to send the cookie back. A value further out than
+# read_your_writes_seconds is ignored, so a client cannot pin itself to the
+# primary.
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+
+@event.listens_for(_sessionmaker, "after_commit")
+def _remember_write(session):
+    state = session.info.get("request_state")
+    if state is not None:
+        state[READ_PRIMARY_COOKIE] = time.time() + settings.read_your_writes_seconds
+
+
+def wrote_recently(request: Request) -> bool:
+    try:
+        until = float(request.cookies.get(READ_PRIMARY_COOKIE, 0))
+    except ValueError:
+        return False
+    return 0 < until - time.time() <= settings.read_your_writes_seconds
+
+
+class ReadYourWritesMiddleware:
+    # Plain ASGI middleware like MetricsMiddleware: endpoints commit before
+    # the response starts, so the cookie can go on its headers
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marked(message):
+            until = scope.get("state", {}).get(READ_PRIMARY_COOKIE)
+            if message["type"] == "http.response.start" and until is not None:
+                cookie = f"{READ_PRIMARY_COOKIE}={until:.3f}; Max-Age={math.ceil(settings.read_your_writes_seconds)}; " \
+                         "Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_marked)
+
+
 # Dependency
-def get_db():
+def get_db(request: Request):
     db = SessionLocal()
+    db.info["request_state"] = request.scope.setdefault("state", {})
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def read_session(request: Request) -> Session:
+    return _sessionmaker(bind=get_read_engine(primary=wrote_recently(request)))
+
+
+# Dependency for GET endpoints that only read
+def get_read_db(request: Request):
+    db = read_session(request)
     try:
         yield db
     finally:
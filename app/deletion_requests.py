@@ -0,0 +1,168 @@
+# This API was developed by Alex Mutonga
+# Admin queue for customer, courier, order and payment deletion requests.
+#
+# Pending requests are read through the partial "processed = false" index on
+# each request table. Decisions are applied in chunks of deletion_batch_size
+# requests, one transaction per chunk: the chunk's pending rows are claimed
+# with FOR UPDATE SKIP LOCKED, and approving deletes the targets and
+# everything hanging off them with a handful of set-based statements per
+# chunk instead of loading and deleting ORM objects one at a time.
+from typing import Callable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app import customer_stats, dispatch, models, response_cache, schemas
+from app.config import settings
+from app.scheduling import parse_services, scheduler
+
+# kind -> (request model, name of the column holding the target id)
+KINDS = {
+    "customer": (models.CustomerDeletionRequest, "customer_id"),
+    "courier": (models.CourierDeletionRequest, "courier_id"),
+    "order": (models.OrderDeletionRequest, "order_id"),
+    "payment": (models.PaymentDeletionRequest, "payment_id"),
+}
+
+
+def parse_cursor(after: Optional[str], kind: Optional[str] = None) -> Optional[Tuple[str, int]]:
+    # "order:120" is the last request of the previous page; a bare id is
+    # accepted when the listing is of one kind. Raises ValueError otherwise.
+    if after is None:
+        return None
+    after_kind, _, after_id = after.rpartition(":")
+    after_kind = after_kind or kind
+    if after_kind not in KINDS or (kind is not None and after_kind != kind):
+        raise ValueError(f"Invalid cursor: {after}")
+    return after_kind, int(after_id)
+
+
+def list_pending(db: Session, kind: Optional[str] = None, limit: int = 100,
+                 after: Optional[Tuple[str, int]] = None) -> List[schemas.DeletionRequestOut]:
+    # One page in (kind, id) order, kinds in KINDS order; later kinds are
+    # only read once the earlier ones run out
+    names = [kind] if kind is not None else list(KINDS)
+    if after is not None:
+        names = names[names.index(after[0]):]
+    pending = []
+    for name in names:
+        if len(pending) >= limit:
+            break
+        request_model, target = KINDS[name]
+        query = db.query(request_model.id, getattr(request_model, target)) \
+            .filter(request_model.processed == False)
+        if after is not None and name == after[0]:
+            query = query.filter(request_model.id > after[1])
+        pending += [schemas.DeletionRequestOut(kind=name, id=request_id, target_id=target_id)
+                    for request_id, target_id in query.order_by(request_model.id).limit(limit - len(pending))]
+    return pending
+
+
+def _close_requests(db: Session, request_model, column, ids):
+    # Requests pointing at deleted rows are settled by the deletion; the
+    # target is cleared so the foreign key lets the row go
+    db.query(request_model).filter(column.in_(ids)) \
+        .update({column: None, "processed": True, "approved": True}, synchronize_session=False)
+
+
+def _delete_orders(db: Session, order_ids, after_commit: List[Callable]):
+    if not order_ids:
+        return
+    open_orders = db.query(models.Order.laundromat_id, models.Order.services, models.Order.weight) \
+        .filter(models.Order.id.in_(order_ids), models.Order.laundromat_id.isnot(None),
+                models.Order.completed_at.is_(None)).all()
+    customer_stats.orders_removed(db, order_ids)
+    _close_requests(db, models.OrderDeletionRequest, models.OrderDeletionRequest.order_id, order_ids)
+    db.query(models.Order).filter(models.Order.id.in_(order_ids)).delete(synchronize_session=False)
+
+    def release():
+        # Cache first: the dispatch write below can fail
+        response_cache.invalidate(*(f"order:{order_id}" for order_id in order_ids))
+        for laundromat_id, services, weight in open_orders:
+            scheduler.adjust(laundromat_id, parse_services(services), -(weight or 0))
+        dispatch.remove_jobs(db, order_ids)
+    after_commit.append(release)
+
+
+def _delete_payments(db: Session, payment_ids, after_commit: List[Callable]):
+    if not payment_ids:
+        return
+    customer_stats.payments_removed(db, payment_ids)
+    db.query(models.Order).filter(models.Order.payment_id.in_(payment_ids)) \
+        .update({"payment_id": None}, synchronize_session=False)
+    _close_requests(db, models.PaymentDeletionRequest, models.PaymentDeletionRequest.payment_id, payment_ids)
+    db.query(models.Payment).filter(models.Payment.id.in_(payment_ids)).delete(synchronize_session=False)
+
+
+def _delete_customers(db: Session, customer_ids, after_commit: List[Callable]):
+    order_ids = [order_id for order_id, in db.query(models.Order.id)
+                 .filter(models.Order.customer_id.in_(customer_ids))]
+    payment_ids = [payment_id for payment_id, in db.query(models.Payment.id)
+                   .filter(models.Payment.customer_id.in_(customer_ids))]
+    _delete_orders(db, order_ids, after_commit)
+    _delete_payments(db, payment_ids, after_commit)
+    for request_model in (models.OrderDeletionRequest, models.PaymentDeletionRequest):
+        db.query(request_model).filter(request_model.customer_id.in_(customer_ids)) \
+            .update({"customer_id": None}, synchronize_session=False)
+    _close_requests(db, models.CustomerDeletionRequest, models.CustomerDeletionRequest.customer_id, customer_ids)
+    db.query(models.CustomerStats).filter(models.CustomerStats.customer_id.in_(customer_ids)) \
+        .delete(synchronize_session=False)
+    db.query(models.Customer).filter(models.Customer.customer_id.in_(customer_ids)) \
+        .delete(synchronize_session=False)
+
+
+def _delete_couriers(db: Session, courier_ids, after_commit: List[Callable]):
+    db.query(models.Order).filter(models.Order.courier_id.in_(courier_ids)) \
+        .update({"courier_id": None, "assigned_at": None}, synchronize_session=False)
+    db.query(models.CourierLocation).filter(models.CourierLocation.courier_id.in_(courier_ids)) \
+        .delete(synchronize_session=False)
+    _close_requests(db, models.CourierDeletionRequest, models.CourierDeletionRequest.courier_id, courier_ids)
+    db.query(models.Courier).filter(models.Courier.courier_id.in_(courier_ids)) \
+        .delete(synchronize_session=False)
+
+    def release():
+        # Cache first: the dispatch write below can fail
+        response_cache.invalidate(*(f"courier:{courier_id}" for courier_id in courier_ids))
+        # Their pickups go back to the remaining couriers
+        dispatch.go_off_duty(db, courier_ids)
+    after_commit.append(release)
+
+
+CASCADES = {
+    "customer": _delete_customers,
+    "courier": _delete_couriers,
+    "order": _delete_orders,
+    "payment": _delete_payments,
+}
+
+
+def decide(db: Session, kind: str, request_ids: List[int], approve: bool,
+           chunk_size: Optional[int] = None) -> schemas.DeletionDecisionOut:
+    request_model, target = KINDS[kind]
+    target_column = getattr(request_model, target)
+    chunk_size = chunk_size or settings.deletion_batch_size
+    request_ids = sorted(set(request_ids))
+    decided = 0
+
+    for start in range(0, len(request_ids), chunk_size):
+        chunk = request_ids[start:start + chunk_size]
+        # Requests another admin is deciding right now, or already decided, are skipped
+        claimed = db.query(request_model.id, target_column) \
+            .filter(request_model.id.in_(chunk), request_model.processed == False) \
+            .with_for_update(skip_locked=True).all()
+        if not claimed:
+            db.rollback()
+            continue
+
+        after_commit = []
+        if approve:
+            targets = sorted({target_id for _, target_id in claimed if target_id is not None})
+            if targets:
+                CASCADES[kind](db, targets, after_commit)
+        db.query(request_model).filter(request_model.id.in_([request_id for request_id, _ in claimed])) \
+            .update({"processed": True, "approved": approve}, synchronize_session=False)
+        db.commit()
+        decided += len(claimed)
+
+        for callback in after_commit:
+            callback()
+
+    return schemas.DeletionDecisionOut(kind=kind, approved=approve, decided=decided,
+                                       skipped=len(request_ids) - decided)
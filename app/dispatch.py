@@ -0,0 +1,552 @@
+# This API was developed by Alex Mutonga
+# Courier dispatch.
+#
+# Keeps an in-memory view of on-duty couriers (position and current jobs) and
+# open pickup jobs (orders sitting in an occupied locker), and assigns each
+# job to the courier with the lowest  distance + load_penalty * current_jobs,
+# skipping couriers already at capacity. Decisions are incremental: a new job
+# is placed when it arrives, and a courier pulls the nearest waiting jobs when
+# they come on duty, move, or finish a pickup. Both couriers and waiting jobs
+# sit in a grid index so a decision only looks at nearby cells.
+#
+# Orders.courier_id is the durable record of assignments; the in-memory view
+# is rebuilt from the database on first use. Every worker keeps its own view,
+# so persist() writes each decision as a conditional claim: the order must
+# still hold the courier this worker last saw there and the courier must be
+# under capacity, with the courier row locked so claims on one courier are
+# taken one at a time. A claim that loses to another worker is read back from
+# the database. Who is on duty, and where, lives in courier_duty: going on
+# and off duty writes it, and positions are written once per location flush.
+# Changed orders are announced on the invalidation bus as "dispatch:<order
+# id>" and changed couriers as "duty:<courier id>", and the other workers
+# re-read them before their next decision.
+import math
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import false, func, or_, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app import invalidation, models
+from app.config import settings
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.2
+
+# Latest pings of on-duty couriers; a ping older than the stored position is ignored
+POSITIONS_SQL = text("""
+    UPDATE courier_duty
+    SET latitude = ping.latitude, longitude = ping.longitude, position_at = ping.recorded_at
+    FROM unnest(CAST(:courier_ids AS integer[]), CAST(:latitudes AS double precision[]),
+                CAST(:longitudes AS double precision[]), CAST(:recorded_ats AS timestamp[]))
+        AS ping (courier_id, latitude, longitude, recorded_at)
+    WHERE courier_duty.courier_id = ping.courier_id AND courier_duty.position_at < ping.recorded_at
+    RETURNING courier_duty.courier_id
+""")
+
+
+def distance_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    # Equirectangular approximation, well under 1% error at city scale
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_KM * math.hypot(x, y)
+
+
+class GridIndex:
+    # Buckets points into square cells so nearest-neighbour searches only visit
+    # cells around the query point, ring by ring
+    BRUTE_FORCE_BELOW = 64
+
+    def __init__(self, cell_km: float = 1.0):
+        self.cell_km = cell_km
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.cells: Dict[Tuple[int, int], Set[int]] = {}
+        self.points: Dict[int, Tuple[float, float, Tuple[int, int]]] = {}
+
+    def __len__(self):
+        return len(self.points)
+
+    def __contains__(self, key):
+        return key in self.points
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+
+    def add(self, key: int, lat: float, lng: float):
+        self.remove(key)
+        cell = self._cell(lat, lng)
+        self.cells.setdefault(cell, set()).add(key)
+        self.points[key] = (lat, lng, cell)
+
+    def remove(self, key: int):
+        point = self.points.pop(key, None)
+        if point is None:
+            return
+        bucket = self.cells[point[2]]
+        bucket.discard(key)
+        if not bucket:
+            del self.cells[point[2]]
+
+    def nearest(self, lat: float, lng: float, score: Callable[[int, float], Optional[float]] = None):
+        # Returns (key, cost) of the point with the lowest score(key, distance),
+        # where score returns None for ineligible points and is never lower
+        # than the distance itself. Returns None when nothing is eligible.
+        if score is None:
+            score = lambda key, distance: distance  # noqa: E731
+        best = None
+
+        def consider(keys):
+            nonlocal best
+            for key in keys:
+                point_lat, point_lng, _ = self.points[key]
+                cost = score(key, distance_km(lat, lng, point_lat, point_lng))
+                if cost is not None and (best is None or cost < best[1]):
+                    best = (key, cost)
+
+        if len(self.points) < self.BRUTE_FORCE_BELOW:
+            consider(list(self.points))
+            return best
+
+        row, col = self._cell(lat, lng)
+        # Cells shrink east-west away from the equator
+        ring_km = self.cell_km * max(math.cos(math.radians(lat)), 0.1)
+        visited = 0
+        ring = 0
+        while visited < len(self.points):
+            # Everything in this ring is at least (ring - 1) cells away
+            if best is not None and (ring - 1) * ring_km > best[1]:
+                break
+            if ring == 0:
+                cells = [(row, col)]
+            else:
+                cells = [(row + dr, col + dc) for dr in range(-ring, ring + 1) for dc in (-ring, ring)]
+                cells += [(row + dr, col + dc) for dr in (-ring, ring) for dc in range(-ring + 1, ring)]
+            for cell in cells:
+                bucket = self.cells.get(cell)
+                if bucket:
+                    visited += len(bucket)
+                    consider(bucket)
+            ring += 1
+        return best
+
+
+@dataclass
+class Job:
+    order_id: int
+    locker_id: int
+    latitude: float
+    longitude: float
+    courier_id: Optional[int] = None
+    # What orders.courier_id held when this worker last read or wrote it
+    stored_courier_id: Optional[int] = None
+
+
+@dataclass
+class CourierState:
+    courier_id: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    on_duty: bool = False
+    jobs: Set[int] = field(default_factory=set)
+
+
+class DispatchEngine:
+    def __init__(self, max_jobs_per_courier: int, load_penalty_km: float, cell_km: float):
+        self.max_jobs_per_courier = max_jobs_per_courier
+        self.load_penalty_km = load_penalty_km
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.jobs: Dict[int, Job] = {}
+        self.couriers: Dict[int, CourierState] = {}
+        # On-duty couriers, and jobs nobody has been given yet
+        self.courier_index = GridIndex(cell_km)
+        self.waiting = GridIndex(cell_km)
+        # Jobs and couriers another worker changed, re-read before the next decision
+        self.stale: Set[int] = set()
+        self.stale_couriers: Set[int] = set()
+        # Bumped whenever a full reload is asked for
+        self.epoch = 0
+        self.last_decision_ms = 0.0
+
+    def reset(self):
+        # Forget jobs and couriers alike; the next get_engine() reloads them
+        with self.lock:
+            self.loaded = False
+            self.epoch += 1
+            self.jobs, self.couriers, self.stale, self.stale_couriers = {}, {}, set(), set()
+            self.courier_index = GridIndex(self.courier_index.cell_km)
+            self.waiting = GridIndex(self.waiting.cell_km)
+            self.last_decision_ms = 0.0
+
+    def load(self, db: Session):
+        with self.lock:
+            if self.loaded:
+                return
+            epoch = self.epoch
+        # Read without the lock, which the event loop and other requests need meanwhile
+        rows = _open_jobs(db).all()
+        duty = _on_duty(db).all()
+        with self.lock:
+            if self.loaded:
+                return  # another thread loaded first, and may have decided since
+            # Also a reload after missed announcements, so everything starts over;
+            # announcements that came in during the read stay queued for refresh()
+            self.jobs, self.couriers = {}, {}
+            self.courier_index = GridIndex(self.courier_index.cell_km)
+            self.waiting = GridIndex(self.waiting.cell_km)
+            self._sync([row[0] for row in rows], rows)
+            self._sync_duty([row[0] for row in duty], duty)
+            # A reload asked for during the read is still due
+            self.loaded = epoch == self.epoch
+
+    def refresh(self, db: Session):
+        # Re-reads the jobs and couriers other workers announced as changed
+        with self.lock:
+            order_ids, self.stale = self.stale, set()
+            courier_ids, self.stale_couriers = self.stale_couriers, set()
+        if order_ids:
+            rows = _open_jobs(db).filter(models.Order.id.in_(order_ids)).all()
+            with self.lock:
+                self._sync(order_ids, rows)
+        if courier_ids:
+            duty = _on_duty(db).filter(models.CourierDuty.courier_id.in_(courier_ids)).all()
+            with self.lock:
+                self._sync_duty(courier_ids, duty)
+
+    def invalidate(self, order_ids: Optional[Iterable[int]], courier_ids: Iterable[int] = ()):
+        # order_ids None: announcements may have been missed, so everything is reloaded
+        with self.lock:
+            if order_ids is None:
+                self.loaded = False
+                self.epoch += 1
+            else:
+                self.stale.update(order_ids)
+                self.stale_couriers.update(courier_ids)
+
+    def _sync(self, order_ids, rows):
+        # Takes the database's word for these jobs; rows lists the open ones,
+        # the rest were picked up, cancelled or never had coordinates
+        found = {row[0]: row for row in rows}
+        for order_id in list(order_ids):
+            job = self.jobs.pop(order_id, None)
+            if job is not None:
+                self.waiting.remove(order_id)
+                if job.courier_id is not None:
+                    self._courier(job.courier_id).jobs.discard(order_id)
+            row = found.get(order_id)
+            if row is None:
+                continue
+            _, locker_id, courier_id, latitude, longitude = row
+            self.jobs[order_id] = Job(order_id, locker_id, latitude, longitude, courier_id, courier_id)
+            if courier_id is None:
+                self.waiting.add(order_id, latitude, longitude)
+            else:
+                self._courier(courier_id).jobs.add(order_id)
+
+    def _sync_duty(self, courier_ids, rows):
+        # rows lists the couriers on duty with their position; the rest are off duty
+        found = {row[0]: row for row in rows}
+        for courier_id in list(courier_ids):
+            courier = self._courier(courier_id)
+            row = found.get(courier_id)
+            courier.on_duty = row is not None
+            if row is None:
+                self.courier_index.remove(courier_id)
+            else:
+                courier.latitude, courier.longitude = row[1], row[2]
+                self.courier_index.add(courier_id, courier.latitude, courier.longitude)
+
+    def stored_courier(self, order_id: int) -> Optional[int]:
+        with self.lock:
+            job = self.jobs.get(order_id)
+            return job.stored_courier_id if job is not None else None
+
+    def mark_stored(self, assignments: dict):
+        with self.lock:
+            for order_id, courier_id in assignments.items():
+                job = self.jobs.get(order_id)
+                if job is not None:
+                    job.stored_courier_id = courier_id
+
+    def _courier(self, courier_id: int) -> CourierState:
+        courier = self.couriers.get(courier_id)
+        if courier is None:
+            courier = self.couriers[courier_id] = CourierState(courier_id)
+        return courier
+
+    def _courier_cost(self, courier_id: int, distance: float) -> Optional[float]:
+        courier = self.couriers[courier_id]
+        if len(courier.jobs) >= self.max_jobs_per_courier:
+            return None
+        return distance + self.load_penalty_km * len(courier.jobs)
+
+    def _assign(self, job: Job, courier: CourierState, changes: dict):
+        self.waiting.remove(job.order_id)
+        job.courier_id = courier.courier_id
+        courier.jobs.add(job.order_id)
+        changes[job.order_id] = courier.courier_id
+
+    def _place(self, job: Job, changes: dict):
+        found = self.courier_index.nearest(job.latitude, job.longitude, self._courier_cost)
+        if found is None:
+            job.courier_id = None
+            self.waiting.add(job.order_id, job.latitude, job.longitude)
+            changes[job.order_id] = None
+        else:
+            self._assign(job, self.couriers[found[0]], changes)
+
+    def _fill(self, courier: CourierState, changes: dict):
+        while courier.on_duty and len(courier.jobs) < self.max_jobs_per_courier and len(self.waiting):
+            found = self.waiting.nearest(courier.latitude, courier.longitude)
+            if found is None:
+                break
+            self._assign(self.jobs[found[0]], courier, changes)
+
+    def _timed(self, decide):
+        started = time.perf_counter()
+        changes = {}
+        with self.lock:
+            decide(changes)
+        self.last_decision_ms = (time.perf_counter() - started) * 1000
+        return changes
+
+    # Events. Each returns {order_id: courier_id or None} for the assignments it changed.
+
+    def add_job(self, order_id: int, locker_id: int, latitude: float, longitude: float) -> dict:
+        def decide(changes):
+            if order_id in self.jobs:
+                return
+            job = self.jobs[order_id] = Job(order_id, locker_id, latitude, longitude)
+            self._place(job, changes)
+        return self._timed(decide)
+
+    def remove_job(self, order_id: int) -> dict:
+        def decide(changes):
+            job = self.jobs.pop(order_id, None)
+            if job is None:
+                return
+            self.waiting.remove(order_id)
+            if job.courier_id is not None:
+                courier = self._courier(job.courier_id)
+                courier.jobs.discard(order_id)
+                self._fill(courier, changes)
+        return self._timed(decide)
+
+    def courier_on_duty(self, courier_id: int, latitude: float, longitude: float) -> dict:
+        def decide(changes):
+            courier = self._courier(courier_id)
+            courier.latitude, courier.longitude, courier.on_duty = latitude, longitude, True
+            self.courier_index.add(courier_id, latitude, longitude)
+            self._fill(courier, changes)
+        return self._timed(decide)
+
+    def courier_off_duty(self, courier_id: int) -> dict:
+        def decide(changes):
+            courier = self.couriers.get(courier_id)
+            if courier is None:
+                return
+            courier.on_duty = False
+            self.courier_index.remove(courier_id)
+            # Hand their outstanding pickups to whoever is best placed now
+            released, courier.jobs = courier.jobs, set()
+            for order_id in released:
+                self._place(self.jobs[order_id], changes)
+        return self._timed(decide)
+
+    def update_position(self, courier_id: int, latitude: float, longitude: float) -> dict:
+        def decide(changes):
+            courier = self.couriers.get(courier_id)
+            if courier is None or not courier.on_duty:
+                return
+            courier.latitude, courier.longitude = latitude, longitude
+            self.courier_index.add(courier_id, latitude, longitude)
+            self._fill(courier, changes)
+        return self._timed(decide)
+
+    def position_of(self, courier_id: int) -> Optional[Tuple[float, float]]:
+        with self.lock:
+            courier = self.couriers.get(courier_id)
+            if courier is None or not courier.on_duty:
+                return None
+            return courier.latitude, courier.longitude
+
+    def jobs_for(self, courier_id: int):
+        with self.lock:
+            courier = self.couriers.get(courier_id)
+            if courier is None:
+                return []
+            return [self.jobs[order_id] for order_id in sorted(courier.jobs)]
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                "couriers_on_duty": len(self.courier_index),
+                "open_jobs": len(self.jobs),
+                "unassigned_jobs": len(self.waiting),
+                "last_decision_ms": self.last_decision_ms,
+            }
+
+
+engine = DispatchEngine(
+    max_jobs_per_courier=settings.dispatch_max_jobs_per_courier,
+    load_penalty_km=settings.dispatch_load_penalty_km,
+    cell_km=settings.dispatch_grid_cell_km,
+)
+
+
+def _open_jobs(db: Session):
+    # Orders sitting in an occupied locker with coordinates, not yet picked up
+    return db.query(models.Order.id, models.Order.locker_id, models.Order.courier_id,
+                    models.Locker.latitude, models.Locker.longitude) \
+        .join(models.Locker, models.Locker.locker_id == models.Order.locker_id) \
+        .filter(models.Locker.status == models.LockerStatus.OCCUPIED,
+                models.Order.picked_up_at.is_(None),
+                models.Locker.latitude.isnot(None),
+                models.Locker.longitude.isnot(None))
+
+
+def _on_duty(db: Session):
+    return db.query(models.CourierDuty.courier_id, models.CourierDuty.latitude, models.CourierDuty.longitude)
+
+
+def _on_invalidation(keys):
+    if keys is None:
+        engine.invalidate(None)
+        return
+    ids = {"dispatch": [], "duty": []}
+    for key in keys:
+        kind, _, key_id = key.partition(":")
+        ids[kind].append(int(key_id))
+    engine.invalidate(ids["dispatch"], ids["duty"])
+
+
+invalidation.bus.subscribe(_on_invalidation, kinds=["dispatch", "duty"])
+
+
+def _announce_duty(courier_ids):
+    invalidation.publish(*(f"duty:{courier_id}" for courier_id in courier_ids), local=False)
+
+
+def get_engine(db: Session) -> DispatchEngine:
+    engine.load(db)
+    engine.refresh(db)
+    return engine
+
+
+def _claim(db: Session, order_id: int, courier_id: Optional[int], previous: Optional[int], now: datetime) -> bool:
+    order = models.Order
+    if courier_id is None:
+        if previous is None:
+            return True  # nothing of ours to release
+        # Only release what is still ours, or already free (e.g. the courier was deleted)
+        return db.execute(update(order).where(order.id == order_id,
+                                              or_(order.courier_id == previous, order.courier_id.is_(None)))
+                          .values(courier_id=None, assigned_at=None)).rowcount > 0
+    # The courier's other open jobs, counted the way load() finds them
+    open_jobs = _open_jobs(db).filter(order.courier_id == courier_id, order.id != order_id) \
+        .with_entities(func.count()).scalar_subquery()
+    held = or_(order.courier_id.is_(None), order.courier_id == courier_id,
+               order.courier_id == previous if previous is not None else false())
+    return db.execute(update(order).where(order.id == order_id, order.picked_up_at.is_(None), held,
+                                          open_jobs < engine.max_jobs_per_courier)
+                      .values(courier_id=courier_id, assigned_at=now)).rowcount > 0
+
+
+def persist(db: Session, changes: dict):
+    # Writes an event's assignments as claims (see the top of this module)
+    if not changes:
+        return
+    now = datetime.utcnow()
+    couriers = sorted({courier_id for courier_id in changes.values() if courier_id is not None})
+    existing = set()
+    if couriers:
+        # Locked in id order so two workers claiming for the same couriers cannot deadlock
+        existing = {courier_id for courier_id, in db.query(models.Courier.courier_id)
+                    .filter(models.Courier.courier_id.in_(couriers))
+                    .order_by(models.Courier.courier_id).with_for_update()}
+    stored, lost = {}, []
+    for order_id, courier_id in changes.items():
+        if (courier_id is None or courier_id in existing) and \
+                _claim(db, order_id, courier_id, engine.stored_courier(order_id), now):
+            stored[order_id] = courier_id
+        else:
+            lost.append(order_id)
+    db.commit()
+    engine.mark_stored(stored)
+    if lost:
+        engine.invalidate(lost)
+        engine.refresh(db)
+    invalidation.publish(*(f"dispatch:{order_id}" for order_id in changes), local=False)
+
+
+def job_ready(db: Session, order_id: int, locker: models.Locker):
+    # An order was dropped into a locker; lockers without coordinates are
+    # left for couriers to pick up from /lockers/occupied as before
+    if locker.latitude is None or locker.longitude is None:
+        return
+    persist(db, get_engine(db).add_job(order_id, locker.locker_id, locker.latitude, locker.longitude))
+
+
+def go_on_duty(db: Session, courier_id: int, latitude: float, longitude: float) -> DispatchEngine:
+    now = datetime.utcnow()
+    db.execute(insert(models.CourierDuty)
+               .values(courier_id=courier_id, latitude=latitude, longitude=longitude, position_at=now, started_at=now)
+               .on_conflict_do_update(index_elements=["courier_id"],
+                                      set_={"latitude": latitude, "longitude": longitude, "position_at": now}))
+    db.commit()
+    engine = get_engine(db)
+    persist(db, engine.courier_on_duty(courier_id, latitude, longitude))
+    _announce_duty([courier_id])
+    return engine
+
+
+def go_off_duty(db: Session, courier_ids):
+    # Also for deleted couriers, whose courier_duty rows went with them
+    db.query(models.CourierDuty).filter(models.CourierDuty.courier_id.in_(courier_ids)) \
+        .delete(synchronize_session=False)
+    db.commit()
+    engine = get_engine(db)
+    changes = {}
+    for courier_id in courier_ids:
+        changes.update(engine.courier_off_duty(courier_id))
+    persist(db, changes)
+    _announce_duty(courier_ids)
+
+
+def update_positions(db: Session, positions: dict):
+    # {courier_id: (latitude, longitude, recorded_at)}, the latest pings of a
+    # location flush, run in a threadpool thread; couriers who are not on
+    # duty are left out
+    if not positions:
+        return
+    courier_ids = list(positions)
+    moved = db.execute(POSITIONS_SQL, {
+        "courier_ids": courier_ids,
+        "latitudes": [positions[courier_id][0] for courier_id in courier_ids],
+        "longitudes": [positions[courier_id][1] for courier_id in courier_ids],
+        "recorded_ats": [positions[courier_id][2] for courier_id in courier_ids],
+    }).all()
+    db.commit()
+    _announce_duty([courier_id for courier_id, in moved])
+    engine = get_engine(db)
+    changes = {}
+    for courier_id, in moved:
+        latitude, longitude, _ = positions[courier_id]
+        changes.update(engine.update_position(courier_id, latitude, longitude))
+    persist(db, changes)
+
+
+def remove_jobs(db: Session, order_ids):
+    # Picked up, cancelled or deleted orders; their couriers pull new jobs
+    engine = get_engine(db)
+    changes = {}
+    for order_id in order_ids:
+        changes.update(engine.remove_job(order_id))
+    persist(db, changes)
+    invalidation.publish(*(f"dispatch:{order_id}" for order_id in order_ids), local=False)
+
+
+def job_cancelled(db: Session, order_id: int):
+    remove_jobs(db, [order_id])
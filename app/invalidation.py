@@ -0,0 +1,199 @@
+# This API was developed by Alex Mutonga
+# Cross-worker cache invalidation over Postgres LISTEN/NOTIFY.
+#
+# Each worker keeps in-memory copies of data (the response cache in
+# app/response_cache.py, the price table in app/pricing.py). When a handler
+# changes an entity it publishes its keys, e.g. publish("locker:5"): the
+# keys are applied to this worker's caches straight away and sent with
+# NOTIFY on cache_invalidation_channel, and every other worker, on any host,
+# applies them as soon as its listener wakes up.
+#
+# The listener is one thread per worker with a dedicated connection from
+# app/database.py (outside the pool), which also sends the NOTIFYs so the
+# request path never waits on them. A message is dropped if the connection
+# is down; after reconnecting the listener clears every subscribed cache,
+# since anything may have changed in between. An empty channel setting turns
+# the bus off and publish() then only applies keys locally.
+import json
+import logging
+import os
+import queue
+import select
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Iterable, List, Optional
+from app.config import settings
+from app.metrics import registry as metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# NOTIFY payloads must stay under 8000 bytes
+MAX_PAYLOAD_BYTES = 7000
+IDLE_CHECK_SECONDS = 15.0
+RECONNECT_SECONDS = 1.0
+
+# handler(keys) is called with the published keys of the kinds it subscribed
+# to, or with None when everything it caches may be stale
+Handler = Callable[[Optional[List[str]]], None]
+
+
+def _kind(key: str) -> str:
+    return key.partition(":")[0]
+
+
+def _payloads(origin: str, keys: List[str]) -> List[str]:
+    payloads, batch = [], []
+    for key in keys:
+        candidate = json.dumps({"origin": origin, "keys": batch + [key]})
+        if batch and len(candidate.encode()) > MAX_PAYLOAD_BYTES:
+            payloads.append(json.dumps({"origin": origin, "keys": batch}))
+            batch = []
+        batch.append(key)
+    if batch:
+        payloads.append(json.dumps({"origin": origin, "keys": batch}))
+    return payloads
+
+
+class InvalidationBus:
+    def __init__(self, channel: Optional[str]):
+        self.channel = channel
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handlers: List[tuple] = []  # (kinds or None for all, handler)
+        self.outgoing: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+        self.connected = False
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._wake_read, self._wake_write = None, None
+
+    def subscribe(self, handler: Handler, kinds: Optional[Iterable[str]] = None):
+        self.handlers.append((set(kinds) if kinds is not None else None, handler))
+
+    def publish(self, *keys: str, local: bool = True):
+        # local=False tells only the other workers, for state this one already has
+        keys = list(keys)
+        if not keys:
+            return
+        if local:
+            self._apply(keys)
+        if self._thread is None:
+            return
+        for payload in _payloads(self.origin, keys):
+            self.outgoing.put(payload)
+        try:
+            os.write(self._wake_write, b"x")
+        except OSError:
+            pass  # stopped meanwhile
+
+    def _apply(self, keys: Optional[List[str]]):
+        for kinds, handler in self.handlers:
+            chosen = keys if keys is None or kinds is None else [key for key in keys if _kind(key) in kinds]
+            if chosen is None or chosen:
+                try:
+                    handler(chosen)
+                except Exception:
+                    logger.exception("Cache invalidation handler failed")
+
+    def start(self):
+        if not self.channel or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        os.write(self._wake_write, b"x")
+        self._thread.join(timeout=5)
+        self._thread = None
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+    def _run(self):
+        from app.database import dedicated_connection
+
+        first = True
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = dedicated_connection()
+                cursor = connection.cursor()
+                cursor.execute(f'LISTEN "{self.channel}"')
+                self.connected = True
+                if not first:
+                    # Messages sent while we were away are lost
+                    metrics_registry.observe_invalidation("reconnected")
+                    self._apply(None)
+                first = False
+                self._listen(connection, cursor)
+            except Exception:
+                if not self._stopping.is_set():
+                    logger.exception("Cache invalidation listener failed; reconnecting")
+                    self._stopping.wait(RECONNECT_SECONDS)
+            finally:
+                self.connected = False
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+    def _listen(self, connection, cursor):
+        last_activity = time.monotonic()
+        while not self._stopping.is_set():
+            self._send(cursor)
+            # Notifications can also arrive with the results of our own statements
+            self._receive(connection)
+            readable, _, _ = select.select([connection, self._wake_read], [], [], IDLE_CHECK_SECONDS)
+            if self._wake_read in readable:
+                try:
+                    while os.read(self._wake_read, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            if connection in readable:
+                connection.poll()
+                self._receive(connection)
+                last_activity = time.monotonic()
+            elif time.monotonic() - last_activity >= IDLE_CHECK_SECONDS:
+                # Finds a dead connection that select() alone would not
+                cursor.execute("SELECT 1")
+                last_activity = time.monotonic()
+        # What was published just before stop() still goes out
+        self._send(cursor)
+
+    def _send(self, cursor):
+        while True:
+            try:
+                payload = self.outgoing.get_nowait()
+            except queue.Empty:
+                return
+            cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+            metrics_registry.observe_invalidation("sent")
+
+    def _receive(self, connection):
+        keys = []
+        while connection.notifies:
+            notify = connection.notifies.pop(0)
+            try:
+                message = json.loads(notify.payload)
+            except ValueError:
+                continue
+            if message.get("origin") == self.origin:
+                continue  # applied when we published it
+            keys += message.get("keys", [])
+            metrics_registry.observe_invalidation("received")
+        if keys:
+            self._apply(keys)
+
+
+bus = InvalidationBus(settings.cache_invalidation_channel)
+
+
+def publish(*keys: str, local: bool = True):
+    bus.publish(*keys, local=local)
@@ -0,0 +1,181 @@
+# This API was developed by Alex Mutonga
+# Courier GPS ingestion.
+#
+# Pings only touch memory on the request path: the latest position per
+# courier is kept in a dict for instant reads, and history rows are buffered
+# and written with one INSERT per flush interval. The token is all a ping is
+# checked against, so the INSERT joins couriers and drops pings from couriers
+# deleted since their token was issued. Each courier's latest position of the
+# interval then goes to dispatch from the same threadpool thread, so the event
+# loop never waits on the dispatch engine. A periodic job thins history older
+# than location_full_resolution_hours down to one point per courier per
+# location_downsample_seconds, and drops points past the retention window.
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import text
+from app import dispatch, models
+from app.config import settings
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+DOWNSAMPLE_SQL = text("""
+    DELETE FROM courier_locations
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY courier_id, floor(extract(epoch FROM recorded_at) / :bucket_seconds)
+                ORDER BY recorded_at
+            ) AS position_in_bucket
+            FROM courier_locations
+            WHERE recorded_at >= :since AND recorded_at < :until
+        ) ranked
+        WHERE position_in_bucket > 1
+    )
+""")
+
+RETENTION_SQL = text("DELETE FROM courier_locations WHERE recorded_at < :cutoff")
+
+# One statement for the whole buffer, keeping only couriers that still exist
+INSERT_SQL = text("""
+    INSERT INTO courier_locations (courier_id, latitude, longitude, accuracy, recorded_at)
+    SELECT ping.courier_id, ping.latitude, ping.longitude, ping.accuracy, ping.recorded_at
+    FROM unnest(CAST(:courier_ids AS integer[]), CAST(:latitudes AS double precision[]),
+                CAST(:longitudes AS double precision[]), CAST(:accuracies AS double precision[]),
+                CAST(:recorded_ats AS timestamp[]))
+        AS ping (courier_id, latitude, longitude, accuracy, recorded_at)
+    JOIN couriers ON couriers.courier_id = ping.courier_id
+""")
+
+
+class LocationTracker:
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.latest: Dict[int, Tuple[float, float, datetime]] = {}
+        self.pending = []
+        # courier_id -> latest position since the last flush, for dispatch
+        self.pending_positions: Dict[int, Tuple[float, float, datetime]] = {}
+        self._tasks = []
+
+    def record(self, courier_id: int, latitude: float, longitude: float,
+               recorded_at: Optional[datetime] = None, accuracy: Optional[float] = None):
+        recorded_at = recorded_at or datetime.utcnow()
+        if recorded_at.tzinfo is not None:
+            # Stored as naive UTC like the rest of the schema
+            recorded_at = (recorded_at - recorded_at.utcoffset()).replace(tzinfo=None)
+        # A phone clock running ahead would otherwise pin "latest" in the future
+        recorded_at = min(recorded_at, datetime.utcnow())
+        with self.lock:
+            previous = self.latest.get(courier_id)
+            # Offline-buffered pings can arrive late; never move "latest" backwards
+            is_latest = previous is None or recorded_at >= previous[2]
+            if is_latest:
+                self.latest[courier_id] = self.pending_positions[courier_id] = (latitude, longitude, recorded_at)
+            self.pending.append({
+                "courier_id": courier_id,
+                "latitude": latitude,
+                "longitude": longitude,
+                "accuracy": accuracy,
+                "recorded_at": recorded_at,
+            })
+
+    def latest_for(self, courier_id: int) -> Optional[Tuple[float, float, datetime]]:
+        with self.lock:
+            return self.latest.get(courier_id)
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._flush_forever()), loop.create_task(self._downsample_forever())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+
+    async def flush(self):
+        with self.lock:
+            rows, self.pending = self.pending, []
+            positions, self.pending_positions = self.pending_positions, {}
+        if not rows:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _write, rows, positions)
+        except Exception:
+            logger.exception("Failed to update dispatch for %d courier positions", len(positions))
+
+    async def _flush_forever(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def _downsample_forever(self):
+        interval = settings.location_downsample_every_minutes * 60
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, downsample)
+            except Exception:
+                logger.exception("Courier location downsampling failed")
+
+
+def _write(rows, positions):
+    db = SessionLocal()
+    try:
+        if rows:
+            try:
+                result = db.execute(INSERT_SQL, {
+                    "courier_ids": [row["courier_id"] for row in rows],
+                    "latitudes": [row["latitude"] for row in rows],
+                    "longitudes": [row["longitude"] for row in rows],
+                    "accuracies": [row["accuracy"] for row in rows],
+                    "recorded_ats": [row["recorded_at"] for row in rows],
+                })
+                db.commit()
+                if result.rowcount < len(rows):
+                    logger.info("Dropped %d locations of deleted couriers", len(rows) - result.rowcount)
+            except Exception:
+                # Losing a flush of history must not hold up dispatch
+                db.rollback()
+                logger.exception("Failed to write %d courier locations", len(rows))
+        # Dispatch decisions for the new positions are made here, off the event
+        # loop, once per flush rather than per ping
+        dispatch.update_positions(db, positions)
+    finally:
+        db.close()
+
+
+def downsample(now: Optional[datetime] = None):
+    now = now or datetime.utcnow()
+    until = now - timedelta(hours=settings.location_full_resolution_hours)
+    # Only the slice that aged out since the previous run (with overlap), not
+    # the whole history every time
+    since = until - timedelta(minutes=settings.location_downsample_every_minutes * 2)
+    db = SessionLocal()
+    try:
+        thinned = db.execute(DOWNSAMPLE_SQL, {
+            "bucket_seconds": settings.location_downsample_seconds, "since": since, "until": until,
+        }).rowcount
+        expired = db.execute(RETENTION_SQL, {
+            "cutoff": now - timedelta(days=settings.location_retention_days),
+        }).rowcount
+        db.commit()
+        return thinned, expired
+    finally:
+        db.close()
+
+
+def latest_from_db(db, courier_id: int):
+    # Another worker may have received this courier's pings
+    return db.query(models.CourierLocation.latitude, models.CourierLocation.longitude,
+                    models.CourierLocation.recorded_at) \
+        .filter(models.CourierLocation.courier_id == courier_id) \
+        .order_by(models.CourierLocation.recorded_at.desc()).first()
+
+
+tracker = LocationTracker(flush_interval=settings.location_flush_seconds)
@@ -1,44 +1,101 @@
 #This API was developed by Alex Mutonga
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from app import models
-from app.routers import customers, auth, laundromat, courier, admins, lockers, payment, orders
-from .database import engine
+from app.metrics import MetricsMiddleware, registry as metrics_registry
+from app.rate_limit import RateLimitMiddleware
+from app.compression import CompressionMiddleware
+from app.sms import dispatcher as sms_dispatcher
+from app.notifications import status_writer as notification_status_writer
+from app.locations import tracker as location_tracker
+from app.invalidation import bus as invalidation_bus
+from app.bulk_import import shutdown_hash_pool
+from app.routers import customers, auth, laundromat, courier, admins, lockers, payment, orders, notifications, dispatch, prices, deletion_requests
 from app.config import settings
-#from .routers import post, user, auth, vote
-from .config import settings   
-from .routers import auth
+from app.database import ReadYourWritesMiddleware, get_engine
 
+logger = logging.getLogger(__name__)
 
-print(settings)
+import_ms = (time.perf_counter() - _import_started) * 1000
 
-models.Base.metadata.create_all(bind=engine) 
-#uses sqlachemy to create tables for you
-#you might not need it any longer as  ALEMBIC will auto generate tables for you
+origins = ["*"] #You should connect only to your damain during deployment *(security best practices)*
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.dev_create_tables:
+        # Development convenience only; in production run `alembic upgrade head`
+        models.Base.metadata.create_all(bind=get_engine())
+    sms_dispatcher.start()
+    notification_status_writer.start()
+    location_tracker.start()
+    invalidation_bus.start()
+    app.state.startup_ms = (time.perf_counter() - app.state.created_at) * 1000
+    logger.info("Application started in %.1f ms (imports %.1f ms)", app.state.startup_ms, import_ms)
+    yield
+    await sms_dispatcher.stop()
+    # After the dispatcher has drained so the last results are written
+    await notification_status_writer.stop()
+    await location_tracker.stop()
+    invalidation_bus.stop()
+    shutdown_hash_pool()
+
+
+def create_app() -> FastAPI:
+    # Building the app does no I/O: the database engine and the Twilio/Stripe
+    # clients are created on first use
+    # orjson renders every response; see app/responses.py for list endpoints
+    app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+    app.state.created_at = time.perf_counter()
+    app.state.startup_ms = None
+
+    app.add_middleware(ReadYourWritesMiddleware)
+    # Inside CORS so browsers can read the 429s
+    app.add_middleware(RateLimitMiddleware)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(CompressionMiddleware)
+    # Outermost, so the time spent in CORS handling and compression is included
+    app.add_middleware(MetricsMiddleware)
+
+    app.include_router(customers.router)
+    app.include_router(laundromat.router)
+    app.include_router(auth.router)
+    app.include_router(courier.router)
+    app.include_router(admins.router)
+    app.include_router(lockers.router)
+    app.include_router(payment.router)
+    app.include_router(orders.router)
+    app.include_router(notifications.router)
+    app.include_router(dispatch.router)
+    app.include_router(prices.router)
+    app.include_router(deletion_requests.router)
+
+    @app.get("/")
+    async def root():
+        return {"Welcome to Smart launders"}
+
+    # Time spent importing the app and from create_app() until it was ready to serve
+    @app.get("/health")
+    async def health(request: Request):
+        return {"status": "ok", "import_ms": import_ms, "startup_ms": request.app.state.startup_ms}
+
+    # Prometheus scrape endpoint
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+    return app
 
-origins = ["*"] #You should connect only to your damain during deployment *(security best practices)*
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
-app.include_router(customers.router)
-app.include_router(laundromat.router)
-app.include_router(auth.router)
-app.include_router(courier.router)
-app.include_router(admins.router)
-app.include_router(lockers.router)
-app.include_router(payment.router)
-app.include_router(orders.router)
-
-@app.get("/")
-async def root():
-    return {"Welcome to Smart launders"}
+app = create_app()
@@ -0,0 +1,263 @@
+# This API was developed by Alex Mutonga
+# Request, SQL and upstream metrics in Prometheus text format (GET /metrics).
+#
+# MetricsMiddleware times each request and labels it with the matched route
+# template (/orders/{order_id}, not /orders/42) so the label set stays
+# small. SQL statements are counted and timed from SQLAlchemy cursor events
+# into a per-request object carried in a context variable, which also
+# reaches the threadpool that runs sync endpoints. Stripe and Twilio calls
+# are recorded by their HTTP clients through upstream_call().
+#
+# Everything is plain in-process counters, per worker; Prometheus sums the
+# workers when it scrapes them.
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+COMPRESSION_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.durations: Dict[Tuple[str, str], Histogram] = {}
+        self.request_statements: Dict[Tuple[str, str], Histogram] = {}
+        self.request_db_seconds: Dict[Tuple[str, str], Histogram] = {}
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.upstream: Dict[Tuple[str, str], int] = {}
+        self.upstream_seconds: Dict[str, Histogram] = {}
+        # Response cache (app/response_cache.py)
+        self.cache_lookups: Dict[Tuple[str, str], int] = {}
+        self.cache_removals: Dict[str, int] = {}
+        self.cache_entries = 0
+        self.cache_bytes = 0
+        # Invalidation bus (app/invalidation.py)
+        self.invalidations: Dict[str, int] = {}
+        # Rate limiting (app/rate_limit.py)
+        self.rate_limited: Dict[str, int] = {}
+        # Response compression (app/compression.py), by encoding
+        self.compressed_bytes_in: Dict[str, int] = {}
+        self.compressed_bytes_out: Dict[str, int] = {}
+        self.compression_seconds: Dict[str, Histogram] = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self.lock:
+            self.requests[method, route, status] = self.requests.get((method, route, status), 0) + 1
+            if key not in self.durations:
+                self.durations[key] = Histogram(SECONDS_BUCKETS)
+                self.request_statements[key] = Histogram(STATEMENT_BUCKETS)
+                self.request_db_seconds[key] = Histogram(SECONDS_BUCKETS)
+            self.durations[key].observe(seconds)
+            self.request_statements[key].observe(stats.statements)
+            self.request_db_seconds[key].observe(stats.db_seconds)
+
+    def observe_statement(self, seconds: float):
+        with self.lock:
+            self.statements += 1
+            self.db_seconds += seconds
+
+    def observe_upstream(self, service: str, outcome: str, seconds: float):
+        with self.lock:
+            self.upstream[service, outcome] = self.upstream.get((service, outcome), 0) + 1
+            if service not in self.upstream_seconds:
+                self.upstream_seconds[service] = Histogram(SECONDS_BUCKETS)
+            self.upstream_seconds[service].observe(seconds)
+
+    def observe_cache(self, route: str, outcome: str):
+        with self.lock:
+            self.cache_lookups[route, outcome] = self.cache_lookups.get((route, outcome), 0) + 1
+
+    def observe_cache_removal(self, reason: str):
+        with self.lock:
+            self.cache_removals[reason] = self.cache_removals.get(reason, 0) + 1
+
+    def observe_invalidation(self, event: str):
+        with self.lock:
+            self.invalidations[event] = self.invalidations.get(event, 0) + 1
+
+    def observe_rate_limited(self, route_class: str):
+        with self.lock:
+            self.rate_limited[route_class] = self.rate_limited.get(route_class, 0) + 1
+
+    def observe_compression(self, encoding: str, bytes_in: int, bytes_out: int, seconds: float):
+        with self.lock:
+            self.compressed_bytes_in[encoding] = self.compressed_bytes_in.get(encoding, 0) + bytes_in
+            self.compressed_bytes_out[encoding] = self.compressed_bytes_out.get(encoding, 0) + bytes_out
+            if encoding not in self.compression_seconds:
+                self.compression_seconds[encoding] = Histogram(COMPRESSION_BUCKETS)
+            self.compression_seconds[encoding].observe(seconds)
+
+    def render(self) -> str:
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name, labels, hist):
+            cumulative = 0
+            for bound, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += hist.counts[-1]
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {hist.sum}")
+            lines.append(f"{name}_count{{{labels}}} {cumulative}")
+
+        with self.lock:
+            header("http_requests_in_flight", "gauge", "Requests being handled right now")
+            lines.append(f"http_requests_in_flight {self.in_flight}")
+
+            header("http_requests_total", "counter", "Requests by route and status code")
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+            for name, text, table in (
+                    ("http_request_duration_seconds", "Request latency", self.durations),
+                    ("http_request_db_statements", "SQL statements per request", self.request_statements),
+                    ("http_request_db_seconds", "Time spent in SQL per request", self.request_db_seconds)):
+                header(name, "histogram", text)
+                for (method, route), hist in sorted(table.items()):
+                    histogram(name, f'method="{method}",route="{route}"', hist)
+
+            header("db_statements_total", "counter", "SQL statements, including background work")
+            lines.append(f"db_statements_total {self.statements}")
+            header("db_seconds_total", "counter", "Time spent in SQL, including background work")
+            lines.append(f"db_seconds_total {self.db_seconds}")
+
+            header("upstream_calls_total", "counter", "Outbound Stripe/Twilio HTTP calls by outcome")
+            for (service, outcome), count in sorted(self.upstream.items()):
+                lines.append(f'upstream_calls_total{{service="{service}",outcome="{outcome}"}} {count}')
+            header("upstream_call_duration_seconds", "histogram", "Outbound Stripe/Twilio call latency")
+            for service, hist in sorted(self.upstream_seconds.items()):
+                histogram("upstream_call_duration_seconds", f'service="{service}"', hist)
+
+            header("response_cache_lookups_total", "counter", "Response cache lookups by route and hit/miss")
+            for (route, outcome), count in sorted(self.cache_lookups.items()):
+                lines.append(f'response_cache_lookups_total{{route="{route}",outcome="{outcome}"}} {count}')
+            header("response_cache_removals_total", "counter", "Response cache entries dropped, by reason")
+            for reason, count in sorted(self.cache_removals.items()):
+                lines.append(f'response_cache_removals_total{{reason="{reason}"}} {count}')
+            header("response_cache_entries", "gauge", "Responses held in the cache")
+            lines.append(f"response_cache_entries {self.cache_entries}")
+            header("response_cache_bytes", "gauge", "Approximate memory held by cached responses")
+            lines.append(f"response_cache_bytes {self.cache_bytes}")
+
+            header("cache_invalidation_events_total", "counter",
+                   "Invalidation bus messages sent and received, and listener reconnects")
+            for name, count in sorted(self.invalidations.items()):
+                lines.append(f'cache_invalidation_events_total{{event="{name}"}} {count}')
+
+            header("http_rate_limited_total", "counter", "Requests answered 429 by the rate limiter, by route class")
+            for route_class, count in sorted(self.rate_limited.items()):
+                lines.append(f'http_rate_limited_total{{class="{route_class}"}} {count}')
+
+            # Compression ratio: rate(..._out) / rate(..._in)
+            for name, text, table in (
+                    ("http_compression_bytes_in_total", "Response bytes before compression", self.compressed_bytes_in),
+                    ("http_compression_bytes_out_total", "Response bytes after compression", self.compressed_bytes_out)):
+                header(name, "counter", text)
+                for encoding, count in sorted(table.items()):
+                    lines.append(f'{name}{{encoding="{encoding}"}} {count}')
+            header("http_compression_seconds", "histogram", "Time spent compressing a response or streamed chunk")
+            for encoding, hist in sorted(self.compression_seconds.items()):
+                histogram("http_compression_seconds", f'encoding="{encoding}"', hist)
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def upstream_call(service: str, status_code: Optional[int], seconds: float):
+    # status_code None means the call failed without a response
+    outcome = f"{status_code // 100}xx" if status_code else "error"
+    registry.observe_upstream(service, outcome, seconds)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["metrics_started"].pop()
+    registry.observe_statement(seconds)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += seconds
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # after_cursor_execute does not run for a failed statement
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("metrics_started"):
+        conn.info["metrics_started"].pop()
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware: no extra task or response buffering per request
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            registry.in_flight -= 1
+            _request_stats.reset(token)
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            registry.observe_request(scope["method"], getattr(route, "path", "unmatched"), status_code,
+                                     time.perf_counter() - started, stats)
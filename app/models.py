@@ -1,8 +1,19 @@
 from datetime import datetime
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Float, ForeignKey, Integer, String, Boolean, Enum, DateTime
+from sqlalchemy import BigInteger, Column, Float, ForeignKey, Index, Integer, String, Boolean, Enum, DateTime, func, text
 from app.database import Base
-from app.schemas import LockerSize, LockerStatus
+from app.schemas import LockerSize, LockerStatus, NotificationStatus
+
+def directory_search_indexes(table: str, name, email, phone_number):
+    # Prefix search on the account directories (app/pagination.py); the
+    # pattern ops let LIKE 'abc%' use the index under any collation
+    return (
+        Index(f'ix_{table}_name_prefix', func.lower(name).label('name_lower'),
+              postgresql_ops={'name_lower': 'text_pattern_ops'}),
+        Index(f'ix_{table}_email_prefix', func.lower(email).label('email_lower'),
+              postgresql_ops={'email_lower': 'text_pattern_ops'}),
+        Index(f'ix_{table}_phone_number_prefix', phone_number, postgresql_ops={'phone_number': 'text_pattern_ops'}),
+    )
 
 # Customer Model
 class Customer(Base):
@@ -21,18 +32,31 @@ class Customer(Base):
     payment_deletion_requests = relationship('PaymentDeletionRequest', back_populates='customer')
     customer_deletion_requests = relationship("CustomerDeletionRequest", back_populates="customer")
     order_deletion_requests = relationship("OrderDeletionRequest", back_populates="customer")
+    # Goes with the customer; the FK cascades, so an unloaded row is left to Postgres
+    stats = relationship("CustomerStats", back_populates="customer", uselist=False,
+                         cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = directory_search_indexes('customers', name, email, phone_number)
 
 # Model for customer deletion request
 class CustomerDeletionRequest(Base):
     __tablename__ = 'customer_deletion_requests'
 
     id = Column(Integer, primary_key=True)
-    customer_id = Column(Integer, ForeignKey('customers.customer_id'))
+    customer_id = Column(Integer, ForeignKey('customers.customer_id'), index=True)
     processed = Column(Boolean, default=False)
+    # Outcome once processed: true when approved, false when rejected
+    approved = Column(Boolean, nullable=True)
 
     # Define the relationship to Customer (not Courier)
     customer = relationship("Customer", back_populates="customer_deletion_requests")
 
+    # Pending requests only, for the review queue; deleting a customer goes through
+    # the full index on customer_id, which also serves the foreign key checks
+    __table_args__ = (
+        Index('ix_customer_deletion_requests_pending', 'customer_id', postgresql_where=text('processed = false')),
+    )
+
 #lockers model
 class Locker(Base):
     __tablename__ = 'lockers'
@@ -43,9 +67,16 @@ class Locker(Base):
     status = Column(Enum(LockerStatus), default=LockerStatus.AVAILABLE)
     size = Column(Enum(LockerSize))
     code = Column(String(6), nullable=True)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
 
     orders = relationship("Order", back_populates="locker")
 
+    # Unlocking matches codes case-insensitively
+    __table_args__ = (
+        Index('ix_lockers_code_lower', func.lower(code)),
+    )
+
 #laundromat model
 class Laundromat(Base):
     __tablename__ = 'laundromats'
@@ -55,6 +86,31 @@ class Laundromat(Base):
     phone_number = Column(String, nullable=True, unique=True)
     email = Column(String, nullable=False, unique=True)
     password = Column(String, nullable=False)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+
+    capacities = relationship("LaundromatCapacity", back_populates="laundromat", cascade="all, delete-orphan")
+
+    __table_args__ = directory_search_indexes('laundromats', name, email, phone_number)
+
+# Throughput of a laundromat for one service
+class LaundromatCapacity(Base):
+    __tablename__ = 'laundromat_capacities'
+
+    laundromat_id = Column(Integer, ForeignKey('laundromats.laundromat_id', ondelete='CASCADE'), primary_key=True)
+    service = Column(String, primary_key=True)
+    kg_per_hour = Column(Float, nullable=False)
+
+    laundromat = relationship("Laundromat", back_populates="capacities")
+
+# Price per service, used to quote orders (app/pricing.py)
+class ServicePrice(Base):
+    __tablename__ = 'service_prices'
+
+    service = Column(String, primary_key=True)
+    price_per_kg = Column(Float, nullable=False)
+    minimum_charge = Column(Float, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 # Courier model
 class Courier(Base):
@@ -69,16 +125,23 @@ class Courier(Base):
 
     deletion_requests = relationship("CourierDeletionRequest", back_populates="courier")
 
+    __table_args__ = directory_search_indexes('couriers', name, email, phone_number)
+
 # Courier deletion requests
 class CourierDeletionRequest(Base):
     __tablename__ = 'courier_deletion_requests'
 
     id = Column(Integer, primary_key=True)
-    courier_id = Column(Integer, ForeignKey('couriers.courier_id'))
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id'), index=True)
     processed = Column(Boolean, default=False)
+    approved = Column(Boolean, nullable=True)
 
     courier = relationship("Courier", back_populates="deletion_requests")
 
+    __table_args__ = (
+        Index('ix_courier_deletion_requests_pending', 'courier_id', postgresql_where=text('processed = false')),
+    )
+
 # Admin model
 class Admin(Base):
     __tablename__ = 'admins'
@@ -96,9 +159,18 @@ class Order(Base):
     customer_id = Column(Integer, ForeignKey('customers.customer_id'))
     services = Column(String)
     weight = Column(Float)
-    payment_id = Column(Integer, ForeignKey('payments.id'))
-    locker_id = Column(Integer, ForeignKey('lockers.locker_id'))
+    payment_id = Column(Integer, ForeignKey('payments.id'), index=True)
+    locker_id = Column(Integer, ForeignKey('lockers.locker_id'), index=True)
     locker_code = Column(String)
+    # Courier pickup, set by the dispatch engine (app/dispatch.py)
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id', ondelete='SET NULL'), nullable=True, index=True)
+    assigned_at = Column(DateTime, nullable=True)
+    picked_up_at = Column(DateTime, nullable=True)
+    # Laundromat processing, set by the scheduler (app/scheduling.py)
+    laundromat_id = Column(Integer, ForeignKey('laundromats.laundromat_id', ondelete='SET NULL'), nullable=True,
+                           index=True)
+    estimated_ready_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
 
@@ -107,24 +179,39 @@ class Order(Base):
     locker = relationship('Locker', back_populates='orders')
     order_deletion_requests = relationship("OrderDeletionRequest", back_populates="order")
 
+    __table_args__ = (
+        # A customer's orders, newest first
+        Index('ix_orders_customer_id_created_at', 'customer_id', 'created_at'),
+        # What the scheduler and the dispatch engine load at startup
+        Index('ix_orders_open', 'laundromat_id', postgresql_where=text('completed_at IS NULL')),
+        Index('ix_orders_awaiting_pickup', 'locker_id', postgresql_where=text('picked_up_at IS NULL')),
+    )
+
 # Model for order deletion request
 class OrderDeletionRequest(Base):
     __tablename__ = 'order_deletion_requests'
 
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey('orders.id'))
-    customer_id = Column(Integer, ForeignKey('customers.customer_id'))
+    order_id = Column(Integer, ForeignKey('orders.id'), index=True)
+    customer_id = Column(Integer, ForeignKey('customers.customer_id'), index=True)
     processed = Column(Boolean, default=False)
+    approved = Column(Boolean, nullable=True)
 
     customer = relationship('Customer', back_populates='order_deletion_requests')
     order = relationship('Order', back_populates='order_deletion_requests')
 
+    __table_args__ = (
+        Index('ix_order_deletion_requests_pending', 'order_id', postgresql_where=text('processed = false')),
+    )
+
 # Model for payments
 class Payment(Base):
     __tablename__ = 'payments'
     id = Column(Integer, primary_key=True)
-    customer_id = Column(Integer, ForeignKey('customers.customer_id'))
+    customer_id = Column(Integer, ForeignKey('customers.customer_id'), index=True)
     amount = Column(Float)
+    stripe_payment_id = Column(String, nullable=True)
+    status = Column(String, nullable=True)
     payment_date = Column(DateTime, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
@@ -138,12 +225,92 @@ class PaymentDeletionRequest(Base):
     __tablename__ = 'payment_deletion_requests'
 
     id = Column(Integer, primary_key=True)
-    payment_id = Column(Integer, ForeignKey('payments.id'))
-    customer_id = Column(Integer, ForeignKey('customers.customer_id'))
+    payment_id = Column(Integer, ForeignKey('payments.id'), index=True)
+    customer_id = Column(Integer, ForeignKey('customers.customer_id'), index=True)
     processed = Column(Boolean, default=False)
+    approved = Column(Boolean, nullable=True)
 
     customer = relationship('Customer', back_populates='payment_deletion_requests')
     payment = relationship('Payment', back_populates='payment_deletion_requests')
 
+    __table_args__ = (
+        Index('ix_payment_deletion_requests_pending', 'payment_id', postgresql_where=text('processed = false')),
+    )
+
+# Per-customer order and spend totals
+class CustomerStats(Base):
+    __tablename__ = 'customer_stats'
 
+    # Running totals kept in step with orders/payments, see app/customer_stats.py
+    customer_id = Column(Integer, ForeignKey('customers.customer_id', ondelete='CASCADE'), primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0, server_default='0')
+    total_weight = Column(Float, nullable=False, default=0, server_default='0')
+    payment_count = Column(Integer, nullable=False, default=0, server_default='0')
+    total_spend = Column(Float, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    customer = relationship('Customer', back_populates='stats')
+
+# Model for bulk notification batches
+class NotificationBatch(Base):
+    __tablename__ = 'notification_batches'
+
+    id = Column(Integer, primary_key=True)
+    template = Column(String, nullable=False)
+    recipient_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # The worker sending the batch keeps pushing this forward; once it lapses
+    # another worker resumes the queued deliveries (app/notifications.py)
+    claimed_until = Column(DateTime, nullable=True)
+
+    deliveries = relationship('NotificationDelivery', back_populates='batch')
+
+# Model for a single SMS of a notification batch
+class NotificationDelivery(Base):
+    __tablename__ = 'notification_deliveries'
+
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(Integer, ForeignKey('notification_batches.id', ondelete='CASCADE'), nullable=False, index=True)
+    customer_id = Column(Integer, ForeignKey('customers.customer_id', ondelete='SET NULL'), nullable=True, index=True)
+    phone_number = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    status = Column(Enum(NotificationStatus), nullable=False, default=NotificationStatus.QUEUED)
+    twilio_sid = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, onupdate=datetime.utcnow)
 
+    batch = relationship('NotificationBatch', back_populates='deliveries')
+
+    __table_args__ = (
+        Index('ix_notification_deliveries_queued', 'batch_id', postgresql_where=text("status = 'QUEUED'")),
+    )
+
+# Courier GPS history, written in batches by app/locations.py
+class CourierLocation(Base):
+    __tablename__ = 'courier_locations'
+
+    id = Column(BigInteger, primary_key=True)
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id', ondelete='CASCADE'), nullable=False)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    accuracy = Column(Float, nullable=True)
+    recorded_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('ix_courier_locations_courier_id_recorded_at', 'courier_id', 'recorded_at'),
+        Index('ix_courier_locations_recorded_at', 'recorded_at'),
+    )
+
+# Couriers on duty and where they were last seen, shared by every worker's
+# dispatch engine (app/dispatch.py); the row goes when they go off duty
+class CourierDuty(Base):
+    __tablename__ = 'courier_duty'
+
+    courier_id = Column(Integer, ForeignKey('couriers.courier_id', ondelete='CASCADE'), primary_key=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    # When the position was recorded, so a late ping cannot move it backwards
+    position_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,315 @@
+# This API was developed by Alex Mutonga
+# Bulk SMS notifications, e.g. "your laundry is in locker 12" to every
+# customer with an order in a locker bank.
+#
+# A fan-out is recorded as one notification_batches row plus one
+# notification_deliveries row per unique phone number, inserted in chunks.
+# Messages then go through the shared SMS dispatcher (app/sms.py), whose
+# worker pool and rate limiter keep us inside our Twilio throughput, and
+# delivery results are written back in batched UPDATEs rather than one
+# commit per message.
+#
+# A fan-out can outlive its worker (5,000 messages at 1/s is over an hour).
+# The sending worker holds a claim on the batch (claimed_until) and renews
+# it while deliveries are outstanding, and gives it up on shutdown. Every
+# worker looks for batches with QUEUED deliveries and no live claim when it
+# starts and every claim period after, claims them in one conditional UPDATE
+# so only one worker wins, and sends what is left. A message sent just
+# before a crash, whose result was not written yet, goes out again.
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, insert, or_, update
+from sqlalchemy.orm import Session
+from app import models
+from app.config import settings
+from app.database import SessionLocal
+from app.schemas import NotificationStatus
+from app.sms import dispatcher
+
+logger = logging.getLogger(__name__)
+
+INSERT_CHUNK_SIZE = 1000
+
+
+class _TemplateContext(dict):
+    # Leave unknown placeholders in place instead of failing the whole batch
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def render(template: str, context: dict) -> str:
+    return template.format_map(_TemplateContext(context))
+
+
+def normalise_phone(phone_number: str) -> str:
+    return "".join(ch for ch in phone_number if ch.isdigit() or ch == "+")
+
+
+def find_recipients(db: Session, customer_ids: Optional[List[int]] = None,
+                    locker_ids: Optional[List[int]] = None, location: Optional[str] = None):
+    # One query for all recipients; with a locker filter every row carries its
+    # order and locker so templates can mention them
+    if locker_ids or location:
+        query = db.query(
+            models.Customer.customer_id,
+            models.Customer.name,
+            models.Customer.phone_number,
+            models.Order.id.label("order_id"),
+            models.Locker.locker_number,
+            models.Locker.location,
+            models.Order.locker_code.label("code"),
+        ).join(models.Order, models.Order.customer_id == models.Customer.customer_id) \
+            .join(models.Locker, models.Locker.locker_id == models.Order.locker_id) \
+            .filter(models.Locker.status == models.LockerStatus.OCCUPIED)
+        if locker_ids:
+            query = query.filter(models.Locker.locker_id.in_(locker_ids))
+        if location:
+            query = query.filter(models.Locker.location == location)
+        # Most recent order first so it wins deduplication
+        query = query.order_by(models.Order.created_at.desc())
+    else:
+        query = db.query(
+            models.Customer.customer_id,
+            models.Customer.name,
+            models.Customer.phone_number,
+        )
+
+    if customer_ids:
+        query = query.filter(models.Customer.customer_id.in_(customer_ids))
+
+    query = query.filter(models.Customer.phone_number.isnot(None))
+    return [row._asdict() for row in query]
+
+
+def dedupe_recipients(recipients: List[dict]) -> List[dict]:
+    seen = set()
+    unique = []
+    for recipient in recipients:
+        phone_number = normalise_phone(recipient["phone_number"])
+        if not phone_number or phone_number in seen:
+            continue
+        seen.add(phone_number)
+        unique.append({**recipient, "phone_number": phone_number})
+    return unique
+
+
+def create_batch(db: Session, template: str, recipients: List[dict]):
+    recipients = dedupe_recipients(recipients)
+
+    batch = models.NotificationBatch(template=template, recipient_count=len(recipients),
+                                     claimed_until=_claim_expiry())
+    db.add(batch)
+    db.flush()
+
+    deliveries = []
+    for start in range(0, len(recipients), INSERT_CHUNK_SIZE):
+        rows = [
+            {
+                "batch_id": batch.id,
+                "customer_id": recipient.get("customer_id"),
+                "phone_number": recipient["phone_number"],
+                "body": render(template, recipient),
+                "status": NotificationStatus.QUEUED,
+            }
+            for recipient in recipients[start:start + INSERT_CHUNK_SIZE]
+        ]
+        result = db.execute(
+            insert(models.NotificationDelivery).returning(
+                models.NotificationDelivery.id,
+                models.NotificationDelivery.batch_id,
+                models.NotificationDelivery.phone_number,
+                models.NotificationDelivery.body,
+            ),
+            rows,
+        )
+        deliveries.extend(result.all())
+
+    db.commit()
+    db.refresh(batch)
+    return batch, deliveries
+
+
+def batch_status_counts(db: Session, batch_id: int) -> dict:
+    counts = db.query(models.NotificationDelivery.status, func.count(models.NotificationDelivery.id)) \
+        .filter(models.NotificationDelivery.batch_id == batch_id) \
+        .group_by(models.NotificationDelivery.status).all()
+    return {status.value: count for status, count in counts}
+
+
+def _claim_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.notification_claim_seconds)
+
+
+class DeliveryStatusWriter:
+    # Buffers delivery results from the dispatcher's callbacks and writes them
+    # in one executemany UPDATE per flush, off the event loop. Also holds this
+    # worker's batch claims, see the top of the file.
+    def __init__(self, batch_size: int, flush_interval: float, claim_seconds: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.claim_seconds = claim_seconds
+        self.pending = []
+        # batch id -> deliveries handed to the dispatcher without a result yet
+        self.outstanding: Dict[int, int] = {}
+        self._task = None
+        self._flushing = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        # Whatever the dispatcher did not get to is still QUEUED; let the next
+        # worker to start pick it up without waiting for the claim to lapse
+        if self.outstanding:
+            batch_ids, self.outstanding = list(self.outstanding), {}
+            await self._in_executor(_set_claims, batch_ids, None)
+
+    def track(self, batch_id: int, count: int):
+        self.outstanding[batch_id] = self.outstanding.get(batch_id, 0) + count
+
+    def record(self, delivery_id: int, batch_id: int, sid: Optional[str], error: Optional[Exception],
+               attempts: int):
+        remaining = self.outstanding.get(batch_id, 0) - 1
+        if remaining > 0:
+            self.outstanding[batch_id] = remaining
+        else:
+            self.outstanding.pop(batch_id, None)
+        self.pending.append({
+            "id": delivery_id,
+            "status": NotificationStatus.SENT if error is None else NotificationStatus.FAILED,
+            "twilio_sid": sid,
+            "error": None if error is None else str(error)[:500],
+            "attempts": attempts,
+        })
+        if len(self.pending) >= self.batch_size and (self._flushing is None or self._flushing.done()):
+            self._flushing = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        rows, self.pending = self.pending, []
+        if not rows:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, _write_statuses, rows)
+        except Exception:
+            logger.exception("Failed to write %d notification statuses", len(rows))
+
+    async def resume(self):
+        # Claims batches nobody is sending and queues their remaining deliveries
+        try:
+            deliveries = await self._in_executor(_claim_stalled)
+        except Exception:
+            logger.exception("Failed to look for unsent notifications")
+            return
+        if deliveries:
+            logger.info("Resuming %d queued notifications", len(deliveries))
+            await _fan_out(deliveries)
+
+    async def _renew(self):
+        if not self.outstanding:
+            return
+        try:
+            await self._in_executor(_set_claims, list(self.outstanding), _claim_expiry())
+        except Exception:
+            logger.exception("Failed to renew notification batch claims")
+
+    async def _in_executor(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    async def _run(self):
+        # Renew well before a claim can lapse; look for stalled batches at
+        # start and once per claim period
+        renew_every = self.claim_seconds / 3
+        last_renewed = last_resumed = float("-inf")
+        loop = asyncio.get_running_loop()
+        while True:
+            if loop.time() - last_resumed >= self.claim_seconds:
+                last_resumed = loop.time()
+                loop.create_task(self.resume())
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if loop.time() - last_renewed >= renew_every:
+                last_renewed = loop.time()
+                await self._renew()
+
+
+def _set_claims(batch_ids: List[int], claimed_until: Optional[datetime]):
+    db = SessionLocal()
+    try:
+        db.query(models.NotificationBatch).filter(models.NotificationBatch.id.in_(batch_ids)) \
+            .update({"claimed_until": claimed_until}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _claim_stalled():
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        queued = db.query(models.NotificationDelivery.batch_id) \
+            .filter(models.NotificationDelivery.status == NotificationStatus.QUEUED)
+        # Re-checked under the row lock, so of two workers only one gets a batch
+        batch_ids = db.execute(
+            update(models.NotificationBatch)
+            .where(models.NotificationBatch.id.in_(queued.scalar_subquery()),
+                   or_(models.NotificationBatch.claimed_until.is_(None),
+                       models.NotificationBatch.claimed_until < now))
+            .values(claimed_until=_claim_expiry())
+            .returning(models.NotificationBatch.id)
+        ).scalars().all()
+        deliveries = []
+        if batch_ids:
+            deliveries = db.query(models.NotificationDelivery.id, models.NotificationDelivery.batch_id,
+                                  models.NotificationDelivery.phone_number, models.NotificationDelivery.body) \
+                .filter(models.NotificationDelivery.batch_id.in_(batch_ids),
+                        models.NotificationDelivery.status == NotificationStatus.QUEUED) \
+                .order_by(models.NotificationDelivery.id).all()
+        db.commit()
+        return deliveries
+    finally:
+        db.close()
+
+
+def _write_statuses(rows: List[dict]):
+    db = SessionLocal()
+    try:
+        db.execute(update(models.NotificationDelivery), rows)
+        db.commit()
+    finally:
+        db.close()
+
+
+status_writer = DeliveryStatusWriter(
+    batch_size=settings.notification_status_batch_size,
+    flush_interval=settings.notification_status_flush_seconds,
+    claim_seconds=settings.notification_claim_seconds,
+)
+
+
+def _on_result(delivery_id: int, batch_id: int):
+    def callback(message, sid, error):
+        status_writer.record(delivery_id, batch_id, sid, error, message.attempts)
+    return callback
+
+
+async def _fan_out(deliveries):
+    for delivery in deliveries:
+        status_writer.track(delivery.batch_id, 1)
+    for delivery in deliveries:
+        await dispatcher.submit(delivery.phone_number, delivery.body,
+                                on_result=_on_result(delivery.id, delivery.batch_id))
+
+
+def start_fan_out(deliveries):
+    # Called from sync route handlers (threadpool); the sends run on the
+    # dispatcher's event loop and the request returns immediately
+    if not dispatcher.running:
+        raise RuntimeError("SMS dispatcher is not running")
+    return asyncio.run_coroutine_threadsafe(_fan_out(deliveries), dispatcher.loop)
@@ -1,5 +1,6 @@
 # This API was developed by Alex Mutonga
-from fastapi import Depends, HTTPException, status
+import logging
+from fastapi import Depends, HTTPException, Request, status
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from app import schemas, database, utils
@@ -10,6 +11,8 @@ from app.models import Customer, Laundromat, Courier, Admin
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/login')
 
+logger = logging.getLogger(__name__)
+
 # SECRET_key
 # Algorithm
 # Expiration time
@@ -44,19 +47,28 @@ def verify_access_token(token: str, credentials_exception):
     except JWTError:
         raise credentials_exception
     except Exception as e:
-        print("Exception in verify_access_token:", e)
+        logger.warning("Exception in verify_access_token: %s", e)
         raise credentials_exception
 
     return token_data
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+def get_token_data(token: str = Depends(oauth2_scheme)):
+    # Signature and expiry check only, without loading the account. For hot
+    # paths such as courier location pings where a DB read per call is too much.
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                          detail="Could not validate credentials",
+                                          headers={"WWW-Authenticate": "Bearer"})
+    return verify_access_token(token, credentials_exception)
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                                           detail="Could not validate credentials",
                                           headers={"WWW-Authenticate": "Bearer"})
     token_data = verify_access_token(token, credentials_exception)
     user = None
 
-    if token_data:
+    # A read session of its own, returned to the pool before the endpoint runs
+    with database.read_session(request) as db:
         if token_data.user_type == "admin":
             user = db.query(Admin).filter(Admin.admin_id == token_data.id).first()
         elif token_data.user_type == "courier":
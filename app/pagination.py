@@ -0,0 +1,60 @@
+# This API was developed by Alex Mutonga
+# Keyset pagination for the account directories (/customers/, /courier/,
+# /laundromat/). Pages are "id > cursor ORDER BY id LIMIT n", so the cost of
+# a page does not grow with how deep into the list it is, and only the
+# columns the *Out schema exposes are selected (no password hashes). Those
+# rows are returned through rows_response() without re-validation.
+from typing import Optional
+from fastapi import Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from app.responses import rows_response
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class DirectoryParams:
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after: Optional[int] = Query(None, description="id of the last row of the previous page"),
+        q: Optional[str] = Query(None, min_length=1, description="name, email or phone number prefix"),
+    ):
+        self.limit = limit
+        self.after = after
+        self.q = q
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_filter(model, q: str):
+    # Each branch matches one of the prefix indexes in models.directory_search_indexes
+    prefix = _escape_like(q.lower()) + "%"
+    return or_(
+        func.lower(model.name).like(prefix, escape="\\"),
+        func.lower(model.email).like(prefix, escape="\\"),
+        model.phone_number.like(_escape_like(q) + "%", escape="\\"),
+    )
+
+
+def directory_page(db: Session, model, out_schema, id_column, params: DirectoryParams) -> ORJSONResponse:
+    columns = [getattr(model, name) for name in out_schema.__fields__]
+    query = db.query(*columns)
+
+    if params.q:
+        query = query.filter(search_filter(model, params.q))
+
+    if params.after is not None:
+        query = query.filter(id_column > params.after)
+
+    # One extra row tells us whether there is a next page
+    rows = query.order_by(id_column).limit(params.limit + 1).all()
+    headers = {}
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        headers["X-Next-Cursor"] = str(getattr(rows[-1], id_column.key))
+    return rows_response(rows, out_schema, headers=headers)
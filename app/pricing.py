@@ -0,0 +1,97 @@
+# This API was developed by Alex Mutonga
+# Server-side pricing.
+#
+# An order costs, for each requested service, max(price_per_kg * weight,
+# minimum_charge). The service_prices table is read into memory once and
+# every quote is computed from that copy, so quoting does not touch the
+# database. Replacing the table through replace_prices() invalidates the copy
+# in every worker through the bus in app/invalidation.py; a worker that
+# missed the message still reloads after pricing_refresh_seconds.
+import threading
+import time
+from typing import Dict, List, Tuple
+from sqlalchemy.orm import Session
+from app import invalidation, models, schemas
+from app.config import settings
+from app.scheduling import parse_services
+
+
+class UnknownService(ValueError):
+    pass
+
+
+class PriceTable:
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.Lock()
+        self.prices: Dict[str, Tuple[float, float]] = {}
+        self.loaded_at = None
+
+    def load(self, db: Session, force: bool = False) -> Dict[str, Tuple[float, float]]:
+        loaded_at = self.loaded_at
+        if not force and loaded_at is not None and time.monotonic() - loaded_at < self.refresh_seconds:
+            return self.prices
+        with self.lock:
+            if not force and self.loaded_at is not None and self.loaded_at != loaded_at:
+                # Another thread reloaded while we waited
+                return self.prices
+            self.prices = {
+                service: (price_per_kg, minimum_charge or 0.0)
+                for service, price_per_kg, minimum_charge in db.query(
+                    models.ServicePrice.service,
+                    models.ServicePrice.price_per_kg,
+                    models.ServicePrice.minimum_charge)
+            }
+            self.loaded_at = time.monotonic()
+            return self.prices
+
+    def invalidate(self):
+        self.loaded_at = None
+
+
+price_table = PriceTable(refresh_seconds=settings.pricing_refresh_seconds)
+invalidation.bus.subscribe(lambda keys: price_table.invalidate(), kinds=["price"])
+
+
+def quote(prices: Dict[str, Tuple[float, float]], services: str, weight: float) -> schemas.QuoteOut:
+    lines = []
+    for service in parse_services(services):
+        if service not in prices:
+            raise UnknownService(f"No price for service: {service}")
+        price_per_kg, minimum_charge = prices[service]
+        lines.append(schemas.QuoteLine(service=service, amount=round(max(price_per_kg * weight, minimum_charge), 2)))
+    if not lines:
+        raise UnknownService("No services requested")
+    return schemas.QuoteOut(services=services, weight=weight, lines=lines,
+                            total=round(sum(line.amount for line in lines), 2))
+
+
+def quote_order(db: Session, services: str, weight: float) -> schemas.QuoteOut:
+    return quote(price_table.load(db), services, weight or 0)
+
+
+def quote_orders(db: Session, orders: List[schemas.OrderBase]) -> List[schemas.QuoteOut]:
+    # One table lookup for the whole batch; unpriceable orders carry an error instead of failing it
+    prices = price_table.load(db)
+    quotes = []
+    for order in orders:
+        try:
+            quotes.append(quote(prices, order.services, order.weight))
+        except UnknownService as e:
+            quotes.append(schemas.QuoteOut(services=order.services, weight=order.weight, error=str(e)))
+    return quotes
+
+
+def is_configured(db: Session) -> bool:
+    return bool(price_table.load(db))
+
+
+def replace_prices(db: Session, prices: List[schemas.ServicePrice]) -> Dict[str, Tuple[float, float]]:
+    table = {parse_services(item.service)[0]: item for item in prices if parse_services(item.service)}
+    db.query(models.ServicePrice).delete(synchronize_session=False)
+    db.add_all([models.ServicePrice(service=service, price_per_kg=item.price_per_kg,
+                                    minimum_charge=item.minimum_charge)
+                for service, item in table.items()])
+    db.commit()
+    invalidation.publish("price:*")
+    return price_table.load(db)
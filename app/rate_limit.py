@@ -0,0 +1,162 @@
+# This API was developed by Alex Mutonga
+# Per-client token-bucket rate limiting.
+#
+# Every request is charged to a bucket for its client and route class:
+#
+#   login   POST /customerlogin and the other */login routes
+#   write   any other POST, PUT, PATCH or DELETE
+#   read    GET and HEAD
+#
+# The client is the principal in the bearer token ("customer:42"), the same
+# user_type and id that oauth2.get_current_user resolves, checked here only
+# for signature and expiry so a rejected request costs no DB read. Requests
+# without a valid token are counted against their IP address, which takes
+# knowing how many proxies sit in front (rate_limit_forwarded_hops); until
+# that is configured they are not limited at all. A bucket holds
+# up to burst tokens and refills at per_second; a request that finds it
+# empty gets a 429 with Retry-After, before it takes a threadpool thread or
+# a DB connection.
+#
+# A bucket untouched for burst / per_second seconds is full again, which is
+# the same as having none, so it is dropped then: memory follows the clients
+# active in that window. rate_limit_max_keys caps each class against
+# address spraying; beyond it the least recently seen client starts over
+# with a full bucket.
+#
+# Limits are per worker, so a client can reach about workers times the
+# configured rate. Setting a class's rate to 0 turns its limit off.
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from fastapi import HTTPException
+from app import oauth2
+from app.config import settings
+from app.metrics import registry as metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Not limited: health checks and scrapes come from our own infrastructure
+EXEMPT_PATHS = {"/health", "/metrics"}
+READ_METHODS = {"GET", "HEAD"}
+
+RETRY_BODY = b'{"detail":"Too many requests"}'
+
+
+class Limit:
+    def __init__(self, per_second: float, burst: int, max_keys: int):
+        self.per_second = per_second
+        self.burst = burst
+        self.max_keys = max_keys
+        # Seconds an untouched bucket takes to fill up again
+        self.refill_seconds = burst / per_second if per_second > 0 else 0.0
+        # key -> [tokens, updated_at], least recently touched first
+        self.buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def take(self, key: str, now: float) -> float:
+        # 0 when the request may go ahead, otherwise seconds until it could
+        self._evict(now)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [float(self.burst), now]
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.per_second)
+            bucket[1] = now
+            self.buckets.move_to_end(key)
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.per_second
+
+    def _evict(self, now: float):
+        # Amortised O(1): each bucket is dropped at most once
+        while self.buckets:
+            key, (_, updated_at) = next(iter(self.buckets.items()))
+            if now - updated_at < self.refill_seconds:
+                return
+            del self.buckets[key]
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    if path in EXEMPT_PATHS or method == "OPTIONS":
+        return None
+    if method in READ_METHODS:
+        return "read"
+    if method == "POST" and path.rstrip("/").endswith("login"):
+        return "login"
+    return "write"
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def client_key(scope, forwarded_hops: Optional[int]) -> Optional[str]:
+    # None when the client can only be told apart by an address we cannot trust
+    authorization = _header(scope, b"authorization")
+    if authorization and authorization[:7].lower() == "bearer ":
+        try:
+            token_data = oauth2.verify_access_token(authorization[7:], HTTPException(status_code=401))
+            return f"{token_data.user_type}:{token_data.id}"
+        except HTTPException:
+            pass  # Counted by address; the endpoint rejects the token itself
+    if forwarded_hops is None:
+        return None
+    if forwarded_hops > 0:
+        # The address our own proxies saw, not whatever the client wrote in
+        forwarded = [part.strip() for part in (_header(scope, b"x-forwarded-for") or "").split(",") if part.strip()]
+        if len(forwarded) >= forwarded_hops:
+            return "ip:" + forwarded[-forwarded_hops]
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class RateLimitMiddleware:
+    # Plain ASGI middleware like MetricsMiddleware; the buckets are only
+    # touched from the event loop, so they need no lock
+    def __init__(self, app):
+        self.app = app
+        self.forwarded_hops = settings.rate_limit_forwarded_hops
+        self.limits: Dict[str, Limit] = {
+            name: Limit(per_second, burst, settings.rate_limit_max_keys)
+            for name, (per_second, burst) in (
+                ("login", (settings.rate_limit_login_per_second, settings.rate_limit_login_burst)),
+                ("write", (settings.rate_limit_write_per_second, settings.rate_limit_write_burst)),
+                ("read", (settings.rate_limit_read_per_second, settings.rate_limit_read_burst)))
+            if per_second > 0
+        }
+        if self.limits and self.forwarded_hops is None:
+            logger.warning("RATE_LIMIT_FORWARDED_HOPS is not set, so requests without a valid token "
+                           "(logins included) are not rate limited")
+        elif self.limits:
+            logger.warning("Requests without a valid token are rate limited by IP address, taken %s",
+                           f"{self.forwarded_hops} hop(s) back in X-Forwarded-For" if self.forwarded_hops
+                           else "from the connection; set RATE_LIMIT_FORWARDED_HOPS if a proxy is in front")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        name = route_class(scope["method"], scope["path"])
+        limit = self.limits.get(name)
+        key = client_key(scope, self.forwarded_hops) if limit is not None else None
+        if key is not None:
+            wait = limit.take(key, time.monotonic())
+            if wait > 0:
+                metrics_registry.observe_rate_limited(name)
+                await _too_many_requests(send, wait)
+                return
+        await self.app(scope, receive, send)
+
+
+async def _too_many_requests(send, wait: float):
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(RETRY_BODY)).encode()),
+               (b"retry-after", str(max(1, math.ceil(wait))).encode())]
+    await send({"type": "http.response.start", "status": 429, "headers": headers})
+    await send({"type": "http.response.body", "body": RETRY_BODY})
@@ -0,0 +1,202 @@
+# This API was developed by Alex Mutonga
+# In-memory cache of rendered GET responses.
+#
+# A few read endpoints (/laundromat/, /lockers/available, /courier/,
+# /orders/{order_id}) return the same body to many callers while the data
+# behind it rarely changes. Their handlers check permissions, then look the
+# response up by route, path and query parameters and a caller scope: "all"
+# when every permitted caller sees the same thing, or something like
+# "courier:7" for a caller's own record. On a miss the handler renders as
+# usual and stores the response with entity tags:
+#
+#   cached = response_cache.lookup(request, scope="all")
+#   if cached.hit:
+#       return cached.response
+#   ...
+#   return cached.store(rows_response(lockers, schemas.LockerOut), tags=["locker:*"])
+#
+# Handlers that change an entity call invalidate("locker:5") after
+# committing, which drops entries tagged locker:5 and the locker:* lists;
+# invalidate("locker:*") drops every locker entry. A response rendered while
+# its kind was being invalidated is not stored, so a slow reader cannot put
+# back what a writer just cleared. With a read replica configured, nothing of
+# a kind is stored for read_your_writes_seconds after its invalidation
+# either: the replica may not have the write yet, and a response rendered
+# from it would otherwise be cached until the TTL.
+#
+# Entries expire after response_cache_ttl_seconds and the least recently used
+# ones are evicted beyond response_cache_max_bytes (0 turns the cache off).
+# Each worker has its own cache; invalidations reach the others through the
+# bus in app/invalidation.py, and the TTL covers anything the bus misses.
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from fastapi import Request, Response
+from app import invalidation
+from app.config import settings
+from app.metrics import registry as metrics_registry
+
+# Rough per-entry bookkeeping on top of the body and headers
+ENTRY_OVERHEAD_BYTES = 256
+
+
+class Entry:
+    __slots__ = ("body", "status_code", "raw_headers", "tags", "expires_at", "size")
+
+    def __init__(self, body: bytes, status_code: int, raw_headers: List[Tuple[bytes, bytes]], tags: List[str],
+                 expires_at: float):
+        self.body = body
+        self.status_code = status_code
+        self.raw_headers = raw_headers
+        self.tags = tags
+        self.expires_at = expires_at
+        self.size = len(body) + sum(len(name) + len(value) for name, value in raw_headers) + ENTRY_OVERHEAD_BYTES
+
+
+def _kind(tag: str) -> str:
+    return tag.partition(":")[0]
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int, ttl_seconds: float, replica_lag_seconds: float = 0.0):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.replica_lag_seconds = replica_lag_seconds
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[tuple, Entry]" = OrderedDict()
+        self.by_tag: Dict[str, Set[tuple]] = {}
+        self.bytes = 0
+        # Bumped by every invalidation; kind -> value at its last invalidation
+        self.generation = 0
+        self.invalidated_at: Dict[str, int] = {}
+        # kind ("*" after a clear) -> monotonic time until which it is not stored
+        self.settling_until: Dict[str, float] = {}
+
+    def get(self, key: tuple) -> Optional[Entry]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key, "expired")
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, entry: Entry, started_at: int) -> bool:
+        if entry.size > self.max_bytes:
+            return False
+        with self.lock:
+            if any(self.invalidated_at.get(_kind(tag), -1) > started_at for tag in entry.tags):
+                return False
+            now = time.monotonic()
+            if any(self.settling_until.get(kind, 0) > now for kind in {_kind(tag) for tag in entry.tags} | {"*"}):
+                return False
+            if key in self.entries:
+                self._remove(key, None)
+            self.entries[key] = entry
+            self.bytes += entry.size
+            for tag in entry.tags:
+                self.by_tag.setdefault(tag, set()).add(key)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)), "evicted")
+            self._report()
+        return True
+
+    def invalidate(self, *tags: str):
+        with self.lock:
+            self.generation += 1
+            settling_until = time.monotonic() + self.replica_lag_seconds
+            for tag in tags:
+                kind = _kind(tag)
+                self.invalidated_at[kind] = self.generation
+                self.settling_until[kind] = settling_until
+                if tag.endswith(":*"):
+                    # Every entry of the kind, lists and single records alike
+                    matching = [t for t in self.by_tag if _kind(t) == kind]
+                else:
+                    matching = [tag, f"{kind}:*"]
+                for name in matching:
+                    for key in list(self.by_tag.get(name, ())):
+                        self._remove(key, "invalidated")
+            self._report()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.by_tag.clear()
+            self.bytes = 0
+            self.settling_until["*"] = time.monotonic() + self.replica_lag_seconds
+            self._report()
+
+    def _remove(self, key: tuple, reason: Optional[str]):
+        entry = self.entries.pop(key)
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self.by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_tag[tag]
+        if reason is not None:
+            metrics_registry.observe_cache_removal(reason)
+
+    def _report(self):
+        metrics_registry.cache_entries = len(self.entries)
+        metrics_registry.cache_bytes = self.bytes
+
+
+cache = ResponseCache(max_bytes=settings.response_cache_max_bytes, ttl_seconds=settings.response_cache_ttl_seconds,
+                      replica_lag_seconds=settings.read_your_writes_seconds if settings.database_replica_url else 0.0)
+
+
+class Lookup:
+    def __init__(self, key: tuple, entry: Optional[Entry], started_at: int):
+        self.key = key
+        self.entry = entry
+        self.started_at = started_at
+
+    @property
+    def hit(self) -> bool:
+        return self.entry is not None
+
+    @property
+    def response(self) -> Response:
+        response = Response(content=self.entry.body, status_code=self.entry.status_code)
+        response.raw_headers = self.entry.raw_headers + [(b"x-cache", b"hit")]
+        return response
+
+    def store(self, response: Response, tags: Iterable[str], ttl_seconds: Optional[float] = None) -> Response:
+        # Only successful, fully rendered responses are kept
+        if response.status_code == 200 and cache.max_bytes > 0:
+            entry = Entry(response.body, response.status_code, list(response.raw_headers), list(tags),
+                          time.monotonic() + (cache.ttl_seconds if ttl_seconds is None else ttl_seconds))
+            cache.put(self.key, entry, self.started_at)
+        response.raw_headers.append((b"x-cache", b"miss"))
+        return response
+
+
+def lookup(request: Request, scope: str) -> Lookup:
+    route = getattr(request.scope.get("route"), "path", request.url.path)
+    key = (route, tuple(sorted(request.path_params.items())), tuple(sorted(request.query_params.multi_items())),
+           scope)
+    started_at = cache.generation
+    entry = cache.get(key) if cache.max_bytes > 0 else None
+    metrics_registry.observe_cache(route, "hit" if entry is not None else "miss")
+    return Lookup(key, entry, started_at)
+
+
+def invalidate(*tags: str):
+    # Here and in every other worker
+    invalidation.publish(*tags)
+
+
+def _on_invalidation(keys: Optional[List[str]]):
+    if keys is None:
+        cache.clear()
+    else:
+        cache.invalidate(*keys)
+
+
+invalidation.bus.subscribe(_on_invalidation)
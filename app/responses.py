@@ -0,0 +1,27 @@
+# This API was developed by Alex Mutonga
+# Fast JSON responses.
+#
+# The app renders every response with orjson (ORJSONResponse is the default
+# response class). List endpoints whose rows come straight from our own
+# queries can also skip FastAPI's response_model pass, which builds a
+# pydantic object per row, runs jsonable_encoder over it and only then
+# serialises: rows_response() reads the schema's fields off each row and
+# hands plain dicts to orjson. The response_model stays on the route for the
+# OpenAPI docs.
+from typing import Dict, Iterable, Optional, Type
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+def row_dict(row, fields) -> dict:
+    # Works for ORM instances and for Row tuples of selected columns alike
+    return {name: getattr(row, name) for name in fields}
+
+
+def rows_response(rows: Iterable, schema: Type[BaseModel], status_code: int = 200,
+                  headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    # Only for rows whose attributes already have the schema's types, i.e.
+    # columns read from the database; anything else should go through the
+    # response_model as usual
+    fields = list(schema.__fields__)
+    return ORJSONResponse([row_dict(row, fields) for row in rows], status_code=status_code, headers=headers)
@@ -1,10 +1,11 @@
 #This API was developed by Alex Mutonga
 from typing import List
-from fastapi import status, HTTPException, Depends, APIRouter
+from fastapi import status, HTTPException, Depends, APIRouter, File, UploadFile
 from sqlalchemy.orm import Session
-from app import models, oauth2
+from app import bulk_import, models, oauth2
 from app import schemas, utils
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.responses import rows_response
 
 router=APIRouter(
     prefix="/admin",
@@ -23,46 +24,28 @@ def create_admin(admin: schemas.AdminCreate,
     #     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
 
 
-      # Check if email already exists
-    if db.query(models.Admin).filter(models.Admin.email == admin.email).first():
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already exists")
-
-    # Check if phone number already exists
-    if db.query(models.Admin).filter(models.Admin.phone_number == admin.phone_number).first():
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Phone number already exists")
-    
-
     #hash the password - courierts.password
     hashed_password = utils.hash(admin.password)
     admin.password = hashed_password
 
+    # Duplicate email/phone number is rejected by the unique constraints
     new_admin = models.Admin(**admin.dict())
-    db.add(new_admin)
-    db.commit()
-    db.refresh(new_admin)
-
-    # Convert new_couriert object to dictionary
-    new_admin_dict = new_admin.__dict__
-
-    # Remove the "_sa_instance_state" key from the dictionary
-    new_admin_dict.pop("_sa_instance_state", None)
-
-    return new_admin_dict
+    return utils.insert_unique(db, new_admin)
 
 #fetch all admins
 @router.get("/", response_model=List[schemas.AdminOut], status_code=status.HTTP_200_OK)
-def get_admin(current_user: schemas.TokenData = Depends (oauth2.get_current_user), db: Session = Depends(get_db)
+def get_admin(current_user: schemas.TokenData = Depends (oauth2.get_current_user), db: Session = Depends(get_read_db)
     ) -> List[schemas.AdminOut]:
     # check if logged in account is admin
     if current_user.user_type not in ["admin"]:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
     admin = db.query(models.Admin).all()
-    return [admin.__dict__ for admin in admin]
+    return rows_response(admin, schemas.AdminOut)
 
 #get admin by id
 @router.get('/{admin_id}', response_model=schemas.AdminOut, status_code=status.HTTP_200_OK)
 def get_admin(admin_id: int, current_user: schemas.TokenData = Depends (oauth2.get_current_user),
-              db: Session = Depends(get_db)) -> schemas.AdminOut:
+              db: Session = Depends(get_read_db)) -> schemas.AdminOut:
     #check whether current_user is Admin
     if current_user.user_type not in ["admin"]:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
@@ -112,3 +95,21 @@ def delete_admin(admin_id: int, current_user: schemas.TokenData = Depends (oauth
     db.delete(admin)
     db.commit()
     return admin
+
+# Bulk import of customer or courier accounts from a CSV or JSON file
+@router.post('/import/{kind}', response_model=schemas.ImportReport, status_code=status.HTTP_200_OK)
+def import_accounts(kind: str, file: UploadFile = File(...),
+                    current_user: schemas.TokenData = Depends (oauth2.get_current_user),
+                    db: Session = Depends(get_db)) -> schemas.ImportReport:
+    #check whether current_user is Admin
+    if current_user.user_type not in ["admin"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+    if kind not in bulk_import.IMPORT_KINDS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Cannot import {kind}")
+
+    try:
+        rows = bulk_import.parse_rows(file.file.read(), file.filename or "")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unreadable import file: {e}")
+
+    return bulk_import.import_accounts(db, kind, rows)
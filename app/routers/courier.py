@@ -1,10 +1,13 @@
 #This API was developed by Alex Mutonga
 from typing import List
-from fastapi import Response, status, HTTPException, Depends, APIRouter
+from fastapi import Request, Response, status, HTTPException, Depends, APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from app import models, oauth2
+from app import locations, models, oauth2, response_cache
 from app import schemas, utils
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.pagination import DirectoryParams, directory_page
+from app.responses import rows_response
 from app.models import Courier, CourierDeletionRequest 
  
 router=APIRouter(
@@ -17,40 +20,23 @@ router=APIRouter(
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model= schemas.CourierOut)
 def create_courier(courier: schemas.CourierCreate, db: Session = Depends(get_db)):
 
-      # Check if email already exists
-    if db.query(models.Courier).filter(models.Courier.email == courier.email).first():
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already exists")
-
-    # Check if phone number already exists
-    if db.query(models.Courier).filter(models.Courier.phone_number == courier.phone_number).first():
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Phone number already exists")
-    
-    # Check if phone number already exists
-    if db.query(models.Courier).filter(models.Courier.vehicle_reg_no == courier.vehicle_reg_no).first():
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Vehicle already registerd")
-    
     #hash the password - courierts.password
     hashed_password = utils.hash(courier.password)
     courier.password = hashed_password
 
+    # Duplicate email/phone number/vehicle is rejected by the unique constraints
     new_courier = models.Courier(**courier.dict())
-    db.add(new_courier)
-    db.commit()
-    db.refresh(new_courier)
-
-    # Convert new_couriert object to dictionary
-    new_courier_dict = new_courier.__dict__
-
-    # Remove the "_sa_instance_state" key from the dictionary
-    new_courier_dict.pop("_sa_instance_state", None)
-
-    return new_courier_dict
+    created = utils.insert_unique(db, new_courier)
+    response_cache.invalidate(f"courier:{created['courier_id']}")
+    return created
 
 # Fetching all Couriers
 @router.get("/", status_code=status.HTTP_200_OK, response_model=List[schemas.CourierOut])
 def get_courier(
+    request: Request,
+    page: DirectoryParams = Depends(),
     current_user: schemas.TokenData = Depends(oauth2.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> List[schemas.CourierOut]:
     
     # Courier fetching thier own info
@@ -59,24 +45,88 @@ def get_courier(
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Courier ID not found in token")
         #check if current_user_id and id requested match
         courier_id = int(current_user.courier_id)
+        cached = response_cache.lookup(request, scope=f"courier:{courier_id}")
+        if cached.hit:
+            return cached.response
         courier = db.query(models.Courier).filter(models.Courier.courier_id == courier_id).first()
         if not courier:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Courier not found")
-        return [courier]
+        return cached.store(rows_response([courier], schemas.CourierOut), tags=[f"courier:{courier_id}"])
 
-    # fetching all couriers
+    # fetching all couriers, one page at a time
     if current_user.user_type in ["admin", "laundromat"]:
-        couriers = db.query(models.Courier).all()
-        return couriers
+        # Admins and laundromats see the same directory
+        cached = response_cache.lookup(request, scope="all")
+        if cached.hit:
+            return cached.response
+        page_response = directory_page(db, models.Courier, schemas.CourierOut, models.Courier.courier_id, page)
+        return cached.store(page_response, tags=["courier:*"])
 
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized")
 
+# Courier GPS pings; a list so apps can send what they buffered while offline
+@router.post("/location", status_code=status.HTTP_202_ACCEPTED)
+async def report_location(
+    pings: List[schemas.LocationPing],
+    token_data: schemas.TokenData = Depends(oauth2.get_token_data),
+):
+    # Check if the current user is a courier (token only, no DB read per ping)
+    if token_data.user_type != "courier":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized")
+
+    for ping in pings:
+        locations.tracker.record(int(token_data.id), ping.latitude, ping.longitude, ping.recorded_at, ping.accuracy)
+    return {"accepted": len(pings)}
+
+# Same as above over a long-lived connection: one JSON ping per message
+@router.websocket("/location/ws")
+async def report_location_ws(websocket: WebSocket, token: str):
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    try:
+        token_data = oauth2.verify_access_token(token, credentials_exception)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    if token_data.user_type != "courier":
+        await websocket.close(code=1008)
+        return
+
+    courier_id = int(token_data.id)
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                ping = schemas.LocationPing(**await websocket.receive_json())
+            except (ValidationError, TypeError, ValueError):
+                await websocket.send_json({"error": "Invalid location"})
+                continue
+            locations.tracker.record(courier_id, ping.latitude, ping.longitude, ping.recorded_at, ping.accuracy)
+    except WebSocketDisconnect:
+        pass
+
+# Latest known position of a courier
+@router.get('/{courier_id}/location', response_model=schemas.CourierLocationOut, status_code=status.HTTP_200_OK)
+def get_courier_location(
+    courier_id: int,
+    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+    db: Session = Depends(get_read_db),
+) -> schemas.CourierLocationOut:
+    # Check whether current_user is admin or laundromat
+    if current_user.user_type not in ["admin", "laundromat"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized")
+
+    latest = locations.tracker.latest_for(courier_id) or locations.latest_from_db(db, courier_id)
+    if not latest:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No location for courier with id: {courier_id}")
+    latitude, longitude, recorded_at = latest
+    return schemas.CourierLocationOut(courier_id=courier_id, latitude=latitude, longitude=longitude, recorded_at=recorded_at)
+
 # Get courier by id
 @router.get('/{courier_id}', response_model=schemas.CourierOut, status_code=status.HTTP_201_CREATED)
 def get_courier(
     courier_id: int,
     current_user: schemas.TokenData = Depends(oauth2.get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ) -> schemas.CourierOut:
     # Check whether current_user is admin or laundromat
     if current_user.user_type in ["admin", "laundromat"]:
@@ -117,6 +167,7 @@ def update_courier(
         # Commit changes to the database
         db.commit()
         db.refresh(current_courier)
+        response_cache.invalidate(f"courier:{courier_id}")
 
         # Create the response model
         courier_out = schemas.CourierOut(
@@ -194,6 +245,7 @@ def delete_Courier(
             deletion_request.processed = True
         
         db.commit()
+        response_cache.invalidate(f"courier:{courier_id}")
         
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     
@@ -4,7 +4,8 @@ from fastapi import Response, status, HTTPException, Depends, APIRouter
 from sqlalchemy.orm import Session
 from app import models, oauth2
 from app import schemas, utils
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.pagination import DirectoryParams, directory_page
 
 router=APIRouter(
     prefix="/customers",
@@ -17,37 +18,21 @@ async def create_customer(
     db: Session = Depends(get_db),
 ):
 
-    # Check if email already exists
-    if db.query(models.Customer).filter(models.Customer.email == customer.email).first():
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already exists")
-
-    # Check if phone number already exists
-    if db.query(models.Customer).filter(models.Customer.phone_number == customer.phone_number).first():
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Phone number already exists")
-
     # hash the password - customer.password
     hashed_password = utils.hash(customer.password)
     customer.password = hashed_password
 
+    # Duplicate email/phone number is rejected by the unique constraints
     new_customer = models.Customer(**customer.dict())
-    db.add(new_customer)
-    db.commit()
-    db.refresh(new_customer)
-
-    # Convert new_customer object to dictionary
-    new_customer_dict = new_customer.__dict__
-
-    # Remove the "_sa_instance_state" key from the dictionary
-    new_customer_dict.pop("_sa_instance_state", None)
-
-    return new_customer_dict
+    return utils.insert_unique(db, new_customer)
 
 
 
 @router.get("/", status_code=status.HTTP_200_OK, response_model=Union[List[schemas.CustomerOut], schemas.CustomerOut])
 def get_customer(
+    page: DirectoryParams = Depends(),
     current_user: schemas.TokenData = Depends(oauth2.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
 
     # Customer fetching their own info
@@ -61,25 +46,33 @@ def get_customer(
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer not found")
         return customer
 
-    # fetching all customers
+    # fetching all customers, one page at a time
     if current_user.user_type in ["admin"]:
-        customers = db.query(models.Customer).all()
-        return customers
+        return directory_page(db, models.Customer, schemas.CustomerOut, models.Customer.customer_id, page)
 
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized")
 
-@router.get('/{customer_id}',status_code=status.HTTP_200_OK, response_model=Union[List[schemas.CustomerOut], schemas.CustomerOut])
+@router.get('/{customer_id}',status_code=status.HTTP_200_OK, response_model=schemas.CustomerDetailOut)
 def get_customer(
     customer_id: int,
     current_user: schemas.TokenData = Depends(oauth2.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    #check whether is admin or laundromat
-    if current_user.user_type in ["admin", "laundromat"]:
+    #check whether is admin, laundromat or the customer themselves
+    if current_user.user_type in ["admin", "laundromat"] or (
+        current_user.user_type == "customer" and current_user.customer_id == customer_id
+    ):
         customer = db.query(models.Customer).filter(models.Customer.customer_id == customer_id).first()
         if not customer:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Courier with id: {customer_id} does not exist")
-        return customer
+        # order/spend summary is a single primary-key read on customer_stats
+        return schemas.CustomerDetailOut(
+            customer_id=customer.customer_id,
+            name=customer.name,
+            phone_number=customer.phone_number,
+            email=customer.email,
+            stats=db.query(models.CustomerStats).get(customer_id) or schemas.CustomerStatsOut(),
+        )
     else:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized")
 
@@ -0,0 +1,59 @@
+#This API was developed by Alex Mutonga
+from typing import List, Optional
+from fastapi import status, HTTPException, Depends, APIRouter, Query
+from sqlalchemy.orm import Session
+from app import deletion_requests, oauth2, schemas
+from app.database import get_db, get_read_db
+
+router = APIRouter(
+    prefix="/deletion-requests",
+    tags=['admin']
+)
+
+def _check_kind(kind: Optional[str]):
+    if kind is not None and kind not in deletion_requests.KINDS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown deletion request type: {kind}")
+
+# Pending deletion requests of every type, or of one type
+@router.get("/", response_model=List[schemas.DeletionRequestOut], status_code=status.HTTP_200_OK)
+def get_pending(kind: Optional[str] = None,
+                limit: int = Query(100, ge=1, le=1000),
+                after: Optional[str] = Query(None, description='"<kind>:<id>" of the last request of the previous page'),
+                current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+                db: Session = Depends(get_read_db)
+                ) -> List[schemas.DeletionRequestOut]:
+    # Check user is admin
+    if current_user.user_type not in ["admin"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+    _check_kind(kind)
+    try:
+        cursor = deletion_requests.parse_cursor(after, kind)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return deletion_requests.list_pending(db, kind, limit, cursor)
+
+# Approve requests: the customers/couriers/orders/payments are deleted
+@router.post("/{kind}/approve", response_model=schemas.DeletionDecisionOut, status_code=status.HTTP_200_OK)
+def approve(kind: str,
+            decision: schemas.DeletionDecision,
+            current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+            db: Session = Depends(get_db)
+            ) -> schemas.DeletionDecisionOut:
+    # Check user is admin
+    if current_user.user_type not in ["admin"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+    _check_kind(kind)
+    return deletion_requests.decide(db, kind, decision.ids, approve=True)
+
+# Reject requests: they are closed and nothing is deleted
+@router.post("/{kind}/reject", response_model=schemas.DeletionDecisionOut, status_code=status.HTTP_200_OK)
+def reject(kind: str,
+           decision: schemas.DeletionDecision,
+           current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+           db: Session = Depends(get_db)
+           ) -> schemas.DeletionDecisionOut:
+    # Check user is admin
+    if current_user.user_type not in ["admin"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+    _check_kind(kind)
+    return deletion_requests.decide(db, kind, decision.ids, approve=False)
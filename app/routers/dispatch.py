@@ -0,0 +1,138 @@
+# This API was developed by Alex Mutonga
+import time
+from datetime import datetime
+from typing import List, Optional
+from fastapi import status, HTTPException, Depends, APIRouter
+from sqlalchemy.orm import Session
+from app import dispatch, models, oauth2, routing, schemas
+from app.config import settings
+from app.database import get_db
+
+router = APIRouter(
+    prefix="/dispatch",
+    tags=['dispatch']
+)
+
+
+def _jobs_out(jobs) -> List[schemas.DispatchJobOut]:
+    return [schemas.DispatchJobOut(order_id=job.order_id, locker_id=job.locker_id, latitude=job.latitude,
+                                   longitude=job.longitude, courier_id=job.courier_id) for job in jobs]
+
+# Courier going on duty at a position; returns the pickups assigned to them
+@router.post("/duty", response_model=List[schemas.DispatchJobOut], status_code=status.HTTP_200_OK)
+def start_duty(
+    position: schemas.Position,
+    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if the current user is a courier
+    if current_user.user_type != "courier":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+
+    engine = dispatch.go_on_duty(db, current_user.courier_id, position.latitude, position.longitude)
+    return _jobs_out(engine.jobs_for(current_user.courier_id))
+
+# Courier going off duty; their outstanding pickups are reassigned
+@router.delete("/duty", status_code=status.HTTP_200_OK)
+def end_duty(
+    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if the current user is a courier
+    if current_user.user_type != "courier":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+
+    dispatch.go_off_duty(db, [current_user.courier_id])
+    return {"message": "Courier is off duty"}
+
+# Pickups currently assigned to the courier
+@router.get("/jobs", response_model=List[schemas.DispatchJobOut], status_code=status.HTTP_200_OK)
+def get_jobs(
+    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if the current user is a courier
+    if current_user.user_type != "courier":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+
+    return _jobs_out(dispatch.get_engine(db).jobs_for(current_user.courier_id))
+
+# Courier has collected an order from its locker
+@router.post("/jobs/{order_id}/pickup", response_model=List[schemas.DispatchJobOut], status_code=status.HTTP_200_OK)
+def pickup_job(
+    order_id: int,
+    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if the current user is a courier
+    if current_user.user_type != "courier":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+
+    # Fetch the order and check it is assigned to this courier
+    order = db.query(models.Order).filter(models.Order.id == order_id,
+                                          models.Order.courier_id == current_user.courier_id).first()
+    if not order:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Order with id: {order_id} is not assigned to you")
+
+    order.picked_up_at = datetime.utcnow()
+    db.commit()
+
+    dispatch.remove_jobs(db, [order_id])
+    return _jobs_out(dispatch.engine.jobs_for(current_user.courier_id))
+
+# Best order to visit the courier's assigned lockers, optionally finishing at a laundromat
+@router.get("/route", response_model=schemas.RouteOut, status_code=status.HTTP_200_OK)
+def get_route(
+    laundromat_id: Optional[int] = None,
+    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if the current user is a courier
+    if current_user.user_type != "courier":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+
+    engine = dispatch.get_engine(db)
+    position = engine.position_of(current_user.courier_id)
+    if position is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Go on duty before planning a route")
+
+    stops = [schemas.RouteStop(kind="start", latitude=position[0], longitude=position[1], leg_km=0)]
+    for job in engine.jobs_for(current_user.courier_id):
+        stops.append(schemas.RouteStop(kind="locker", latitude=job.latitude, longitude=job.longitude, leg_km=0,
+                                       order_id=job.order_id, locker_id=job.locker_id))
+
+    end = None
+    if laundromat_id is not None:
+        laundromat = db.query(models.Laundromat.latitude, models.Laundromat.longitude) \
+            .filter(models.Laundromat.laundromat_id == laundromat_id).first()
+        if not laundromat:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"laundromat with id: {laundromat_id} does not exist")
+        if laundromat.latitude is None or laundromat.longitude is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Laundromat has no location")
+        end = len(stops)
+        stops.append(schemas.RouteStop(kind="laundromat", latitude=laundromat.latitude, longitude=laundromat.longitude,
+                                       leg_km=0, laundromat_id=laundromat_id))
+
+    started = time.perf_counter()
+    order, legs, total = routing.plan_route([stop.latitude for stop in stops], [stop.longitude for stop in stops],
+                                            end=end, time_budget_ms=settings.route_time_budget_ms)
+    planning_ms = (time.perf_counter() - started) * 1000
+
+    ordered = []
+    for index, leg in zip(order, legs):
+        stop = stops[index]
+        stop.leg_km = leg
+        ordered.append(stop)
+    return schemas.RouteOut(stops=ordered, total_km=total, planning_ms=planning_ms)
+
+# Dispatch overview for admins
+@router.get("/status", response_model=schemas.DispatchStatusOut, status_code=status.HTTP_200_OK)
+def get_status(
+    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if the current user is an admin
+    if current_user.user_type != "admin":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+
+    return dispatch.get_engine(db).status()
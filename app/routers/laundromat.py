@@ -1,10 +1,13 @@
 #This API was developed by Alex Mutonga
+from datetime import datetime
 from typing import List
-from fastapi import Response, status, HTTPException, Depends, APIRouter
+from fastapi import Request, Response, status, HTTPException, Depends, APIRouter
 from sqlalchemy.orm import Session
-from app import models, oauth2
+from app import models, oauth2, response_cache, scheduling
 from app import schemas, utils
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.pagination import DirectoryParams, directory_page
+from app.responses import rows_response
 
 router=APIRouter(
     prefix="/laundromat",
@@ -15,34 +18,21 @@ router=APIRouter(
 def create_laundromat(laundromat: schemas.LaundromatCreate, db: Session = Depends(get_db)):
 
 
-      # Check if email already exists
-    if db.query(models.Laundromat).filter(models.Laundromat.email == laundromat.email).first():
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already exists")
-
-    # Check if phone number already exists
-    if db.query(models.Laundromat).filter(models.Laundromat.phone_number == laundromat.phone_number).first():
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Phone number already exists")
-
     #hash the password - laundromats.password
     hashed_password = utils.hash(laundromat.password)
     laundromat.password = hashed_password
 
+    # Duplicate email/phone number is rejected by the unique constraints
     new_laundromat = models.Laundromat(**laundromat.dict())
-    db.add(new_laundromat)
-    db.commit()
-    db.refresh(new_laundromat)
-
-    # Convert new_laundromat object to dictionary
-    new_laundromat_dict = new_laundromat.__dict__
-
-    # Remove the "_sa_instance_state" key from the dictionary
-    new_laundromat_dict.pop("_sa_instance_state", None)
-
-    return new_laundromat_dict
+    created = utils.insert_unique(db, new_laundromat)
+    response_cache.invalidate(f"laundromat:{created['laundromat_id']}")
+    return created
 
 @router.get("/", response_model=List[schemas.LaundromatOut], status_code=status.HTTP_200_OK)
-def get_laundromats(current_user: schemas.TokenData = Depends(oauth2.get_current_user),
-                    db: Session = Depends(get_db)
+def get_laundromats(request: Request,
+                    page: DirectoryParams = Depends(),
+                    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+                    db: Session = Depends(get_read_db)
                     ) -> List[schemas.LaundromatOut]:
     
     # Laundroromat fetching their own info
@@ -51,24 +41,106 @@ def get_laundromats(current_user: schemas.TokenData = Depends(oauth2.get_current
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not authorized")
         #check if current_user_id and id requested match
         laundromat_id = int (current_user.laundromat_id)
+        cached = response_cache.lookup(request, scope=f"laundromat:{laundromat_id}")
+        if cached.hit:
+            return cached.response
         laundromat = db.query(models.Laundromat).filter(models.Laundromat.laundromat_id == laundromat_id).first()
         if laundromat is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Laundromat not found")
-        return [laundromat]
+        return cached.store(rows_response([laundromat], schemas.LaundromatOut), tags=[f"laundromat:{laundromat_id}"])
 
     # Check whether current user is admin
     if current_user.user_type in ["admin"]:
-        #fetch all Laundromats
-        laundromats = db.query(models.Laundromat).all()
-        return [laundromats.__dict__ for laundromats in laundromats]
+        cached = response_cache.lookup(request, scope="all")
+        if cached.hit:
+            return cached.response
+        #fetch all Laundromats, one page at a time
+        page_response = directory_page(db, models.Laundromat, schemas.LaundromatOut, models.Laundromat.laundromat_id, page)
+        return cached.store(page_response, tags=["laundromat:*"])
     
     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not authorized")
 
+# Soonest laundromat and ready time for an order that has not been placed yet
+@router.post("/eta", response_model=schemas.EtaOut, status_code=status.HTTP_200_OK)
+def estimate_eta(order: schemas.OrderBase,
+                 current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+                 db: Session = Depends(get_db)
+                 ) -> schemas.EtaOut:
+    # Like the order quotes, any authenticated user may ask for an estimate
+    found = scheduling.estimate(db, order.services, order.weight)
+    if found is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No laundromat offers these services")
+    laundromat_id, estimated_ready_at, hours = found
+    return schemas.EtaOut(laundromat_id=laundromat_id, estimated_ready_at=estimated_ready_at, hours=hours)
+
+# Laundromat marking an order as done
+@router.post("/orders/{order_id}/complete", response_model=schemas.OrderOut, status_code=status.HTTP_200_OK)
+def complete_order(order_id: int,
+                   current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+                   db: Session = Depends(get_db)
+                   ) -> schemas.OrderOut:
+    # Check user is laundromat
+    if current_user.user_type not in ["laundromat"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not authorized")
+
+    order = db.query(models.Order).filter(models.Order.id == order_id,
+                                          models.Order.laundromat_id == current_user.laundromat_id).first()
+    if not order:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Order with id: {order_id} is not scheduled here")
+    if order.completed_at is None:
+        release = scheduling.order_finished(order)
+        order.completed_at = datetime.utcnow()
+        db.commit()
+        release()
+        db.refresh(order)
+    return order
+
+# Declare throughput per service (kg/hour), replacing the previous list
+@router.put('/{laundromat_id}/capacity', response_model=schemas.LaundromatLoadOut, status_code=status.HTTP_200_OK)
+def set_capacity(laundromat_id: int,
+                 capacities: List[schemas.ServiceCapacity],
+                 current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+                 db: Session = Depends(get_db)
+                 ) -> schemas.LaundromatLoadOut:
+    # Check user is the laundromat itself or an admin
+    if not (current_user.user_type == "admin" or
+            (current_user.user_type == "laundromat" and current_user.laundromat_id == laundromat_id)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not authorized")
+
+    if not db.query(models.Laundromat.laundromat_id).filter(models.Laundromat.laundromat_id == laundromat_id).first():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"laundromat with id: {laundromat_id} does not exist")
+
+    capacity = {scheduling.parse_services(item.service)[0]: item.kg_per_hour
+                for item in capacities if scheduling.parse_services(item.service)}
+    db.query(models.LaundromatCapacity).filter(models.LaundromatCapacity.laundromat_id == laundromat_id) \
+        .delete(synchronize_session=False)
+    db.add_all([models.LaundromatCapacity(laundromat_id=laundromat_id, service=service, kg_per_hour=kg_per_hour)
+                for service, kg_per_hour in capacity.items()])
+    db.commit()
+
+    scheduler = scheduling.get_scheduler(db)
+    scheduler.set_capacity(laundromat_id, capacity)
+    return schemas.LaundromatLoadOut(laundromat_id=laundromat_id, services=scheduler.load_of(laundromat_id))
+
+# Current capacity and queued work per service
+@router.get('/{laundromat_id}/load', response_model=schemas.LaundromatLoadOut, status_code=status.HTTP_200_OK)
+def get_load(laundromat_id: int,
+             current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+             db: Session = Depends(get_db)
+             ) -> schemas.LaundromatLoadOut:
+    # Check user is the laundromat itself or an admin
+    if not (current_user.user_type == "admin" or
+            (current_user.user_type == "laundromat" and current_user.laundromat_id == laundromat_id)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not authorized")
+
+    scheduler = scheduling.get_scheduler(db)
+    return schemas.LaundromatLoadOut(laundromat_id=laundromat_id, services=scheduler.load_of(laundromat_id))
+
 # Get Laundromat by id
 @router.get('/{laundromat_id}', response_model=schemas.LaundromatOut, status_code=status.HTTP_200_OK)
 def get_laundromat(laundromat_id: int, 
                    current_user: schemas.TokenData = Depends(oauth2.get_current_user), 
-                   db: Session = Depends(get_db)
+                   db: Session = Depends(get_read_db)
                    ) -> schemas.LaundromatOut:
     # Check user is admin
     if current_user.user_type in ["admin"]:
@@ -108,6 +180,7 @@ def update_laundromat(laundromat_id: int,
 
             db.commit()
             db.refresh(current_laundromat)
+            response_cache.invalidate(f"laundromat:{laundromat_id}")
 
             # Create Response Model
             return current_laundromat.__dict__
@@ -130,6 +203,8 @@ def delete_laundromat(
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You are not authorized")
         db.delete(current_laundromat)
         db.commit()
+        # Its orders lose their laundromat_id through ON DELETE SET NULL
+        response_cache.invalidate(f"laundromat:{laundromat_id}", "order:*")
         return  
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
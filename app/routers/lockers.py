@@ -5,8 +5,9 @@ import string
 from typing import List
 from fastapi import status, HTTPException, Depends, APIRouter, Request
 from sqlalchemy.orm import Session
-from app import models, schemas, oauth2
-from app.database import get_db
+from app import dispatch, models, response_cache, schemas, oauth2
+from app.database import get_db, get_read_db
+from app.responses import rows_response
 
 router = APIRouter(
     prefix="/lockers",
@@ -33,6 +34,7 @@ async def create_locker(
     db.add(new_locker)
     db.commit()
     db.refresh(new_locker)
+    response_cache.invalidate(f"locker:{new_locker.locker_id}")
 
     # Convert new_locker object to dictionary
     new_locker_dict = new_locker.__dict__
@@ -67,13 +69,11 @@ def book_locker(
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Locker is already booked")
 
     # Fetch the customer's most recent order
-    customer_orders = db.query(models.Order).filter(models.Order.customer_id == current_user.customer_id).\
-        order_by(models.Order.created_at.desc()).all()
-    if not customer_orders:
+    recent_order = db.query(models.Order).filter(models.Order.customer_id == current_user.customer_id).\
+        order_by(models.Order.created_at.desc()).first()
+    if not recent_order:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No orders found for the customer")
 
-    recent_order = customer_orders[0]  # Get the most recent order
-
     # Associate the locker with the recent order
     recent_order.locker_id = locker.locker_id
 
@@ -86,6 +86,10 @@ def book_locker(
     locker.status = models.LockerStatus.OCCUPIED
 
     db.commit()
+    response_cache.invalidate(f"locker:{locker_id}", f"order:{recent_order.id}")
+
+    # The order is now waiting for a courier
+    dispatch.job_ready(db, recent_order.id, locker)
 
     return {"message": f"Locker with id: {locker_id} successfully booked by customer", "code": code}
 
@@ -122,6 +126,7 @@ async def unlock_locker(
     # Unlock the locker
     current_locker.status = models.LockerStatus.AVAILABLE
     db.commit()
+    response_cache.invalidate(f"locker:{locker_id}")
 
     return {"message": f"Locker with id: {locker_id} successfully unlocked by customer"}
 
@@ -157,47 +162,54 @@ async def lock_locker(
     # Lock the locker
     locker.status = models.LockerStatus.OCCUPIED
     db.commit()
+    response_cache.invalidate(f"locker:{locker_id}")
 
     return {"message": f"Locker with id: {locker_id} successfully locked by customer"}
 
 # Fetching all lockers
 @router.get("/", response_model=List[schemas.LockerOut])
 def get_all_lockers(current_user: schemas.TokenData = Depends(oauth2.get_current_user),
-                    db: Session = Depends(get_db)) -> List[schemas.LockerOut]:
+                    db: Session = Depends(get_read_db)) -> List[schemas.LockerOut]:
     # Check if the current user is an admin
     if current_user.user_type != "admin":
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
 
     lockers = db.query(models.Locker).all()
-    return lockers
+    return rows_response(lockers, schemas.LockerOut)
 
 # Fetching Available Lockers
 @router.get("/available", response_model=List[schemas.LockerOut])
-def get_available_lockers(current_user: schemas.TokenData = Depends(oauth2.get_current_user),
-                          db: Session = Depends(get_db)) -> List[schemas.LockerOut]:
+def get_available_lockers(request: Request,
+                          current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+                          db: Session = Depends(get_read_db)) -> List[schemas.LockerOut]:
     # Check if the current user is a customer, laundromat, or admin
     if current_user.user_type not in ["customer", "laundromat", "admin"]:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
 
+    # Same list for everyone allowed to see it
+    cached = response_cache.lookup(request, scope="all")
+    if cached.hit:
+        return cached.response
+
     available_lockers = db.query(models.Locker).filter(models.Locker.status == models.LockerStatus.AVAILABLE).all()
 
     if len(available_lockers) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No lockers available")
 
-    return available_lockers
+    return cached.store(rows_response(available_lockers, schemas.LockerOut), tags=["locker:*"])
 
 #  Route for getting all occupied Lockers
 @router.get("/occupied", response_model=List[schemas.LockerOut])
 def get_occupied_lockers(
     current_user: schemas.TokenData = Depends(oauth2.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> List[schemas.LockerOut]:
     # Check if the current user is an admin, laundromat, or courier
     if current_user.user_type not in ["admin", "laundromat", "courier"]:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
 
     occupied_lockers = db.query(models.Locker).filter(models.Locker.status == models.LockerStatus.OCCUPIED).all()
-    return occupied_lockers
+    return rows_response(occupied_lockers, schemas.LockerOut)
 
     # ocupied_lockers = db.query(models.Locker).filter(models.LockerStatus.OCCUPIED).all()
     # return ocupied_lockers
@@ -206,18 +218,21 @@ def get_occupied_lockers(
 @router.get("/booked", response_model=List[schemas.LockerOut])
 def get_booked_lockers(
     current_user: schemas.TokenData = Depends(oauth2.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> List[schemas.LockerOut]:
     # Check if the current user is a customer
     if current_user.user_type != "customer":
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
 
+    # Occupied lockers holding one of the customer's orders
     booked_lockers = db.query(models.Locker).filter(
         models.Locker.status == models.LockerStatus.OCCUPIED,
-        models.Customer.customer_id == current_user.customer_id
+        models.Locker.locker_id.in_(
+            db.query(models.Order.locker_id).filter(models.Order.customer_id == current_user.customer_id)
+        )
     ).all()
 
-    return booked_lockers
+    return rows_response(booked_lockers, schemas.LockerOut)
 
 # Route for Deleting lockers
 @router.delete("/{locker_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -235,4 +250,5 @@ def delete_locker(
     
     db.delete(locker)
     db.commit()
+    response_cache.invalidate(f"locker:{locker_id}")
     return {"message": f"Locker with id: {id} successfully deleted"}
\ No newline at end of file
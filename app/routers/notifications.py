@@ -0,0 +1,74 @@
+# This API was developed by Alex Mutonga
+from fastapi import status, HTTPException, Depends, APIRouter
+from sqlalchemy.orm import Session
+from app import models, notifications, oauth2, schemas
+from app.database import get_db, get_read_db
+
+router = APIRouter(
+    prefix="/notifications",
+    tags=['notifications']
+)
+
+# Send a templated SMS to many customers at once
+@router.post("/", status_code=status.HTTP_202_ACCEPTED, response_model=schemas.NotificationBatchOut)
+def create_notification_batch(
+    notification: schemas.NotificationCreate,
+    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Check if the current user is an admin or laundromat
+    if current_user.user_type not in ["admin", "laundromat"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+
+    if not (notification.customer_ids or notification.locker_ids or notification.location):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Select recipients by customer_ids, locker_ids or location")
+
+    recipients = notifications.find_recipients(
+        db,
+        customer_ids=notification.customer_ids,
+        locker_ids=notification.locker_ids,
+        location=notification.location,
+    )
+    if not recipients:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No recipients found")
+
+    batch, deliveries = notifications.create_batch(db, notification.template, recipients)
+
+    # Sending happens on the SMS dispatcher; progress is visible on GET /notifications/{id}
+    try:
+        notifications.start_fan_out(deliveries)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+
+    return schemas.NotificationBatchOut(
+        id=batch.id,
+        template=batch.template,
+        recipient_count=batch.recipient_count,
+        created_at=batch.created_at,
+        queued=len(deliveries),
+    )
+
+# Delivery progress of a batch
+@router.get("/{batch_id}", response_model=schemas.NotificationBatchOut)
+def get_notification_batch(
+    batch_id: int,
+    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    # Check if the current user is an admin or laundromat
+    if current_user.user_type not in ["admin", "laundromat"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+
+    batch = db.query(models.NotificationBatch).get(batch_id)
+    if not batch:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Notification batch with id: {batch_id} not found")
+
+    counts = notifications.batch_status_counts(db, batch_id)
+    return schemas.NotificationBatchOut(
+        id=batch.id,
+        template=batch.template,
+        recipient_count=batch.recipient_count,
+        created_at=batch.created_at,
+        **counts,
+    )
@@ -1,9 +1,11 @@
 # This API was developed by Alex Mutonga
 from typing import List
-from fastapi import Response, status, HTTPException, Depends, APIRouter
+from fastapi import Request, Response, status, HTTPException, Depends, APIRouter
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
-from app import oauth2, schemas
-from app.database import get_db
+from app import customer_stats, dispatch, oauth2, pricing, response_cache, scheduling, schemas
+from app.database import get_db, get_read_db
+from app.responses import row_dict, rows_response
 from app.models import Customer, Order, OrderDeletionRequest
 
 router = APIRouter(
@@ -31,16 +33,42 @@ def create_order(
         services=order.services,
         weight=order.weight
     )
+    # Pick the laundromat that can finish it soonest
+    reserve = scheduling.schedule_order(db, new_order)
     db.add(new_order)
+    customer_stats.order_added(db, customer.customer_id, order.weight)
     db.commit()
+    reserve()
     db.refresh(new_order)
     return new_order
 
 
+# Price an order without creating it
+@router.post("/quote", response_model=schemas.QuoteOut, status_code=status.HTTP_200_OK)
+def quote_order(
+    order: schemas.OrderBase,
+    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+    db: Session = Depends(get_db)
+):
+    try:
+        return pricing.quote_order(db, order.services, order.weight)
+    except pricing.UnknownService as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+# Price many orders in one call; orders that cannot be priced carry an error
+@router.post("/quote/batch", response_model=List[schemas.QuoteOut], status_code=status.HTTP_200_OK)
+def quote_orders(
+    orders: List[schemas.OrderBase],
+    current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+    db: Session = Depends(get_db)
+):
+    return pricing.quote_orders(db, orders)
+
+
 # Fetch all orders
 @router.get("/", response_model=List[schemas.OrderOut], status_code=status.HTTP_200_OK)
 def get_orders(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: schemas.TokenData = Depends(oauth2.get_current_user)
 ) -> List[schemas.OrderOut]:
     if current_user.user_type == "customer":
@@ -53,20 +81,25 @@ def get_orders(
         # Handle other user types if needed
         orders = []
 
-    return orders
+    return rows_response(orders, schemas.OrderOut)
 
 # Get orders by id
 @router.get('/{order_id}', response_model=schemas.OrderOut, status_code=status.HTTP_200_OK)
 def get_order(order_id: int, 
+              request: Request,
               current_user: schemas.TokenData = Depends(oauth2.get_current_user), 
-              db: Session = Depends(get_db)) -> schemas.OrderOut:
+              db: Session = Depends(get_read_db)) -> schemas.OrderOut:
     # Check if current_user is admin or laundromat
     if current_user.user_type in ["admin", "laundromat"]:
+        # Admins and laundromats see the same order
+        cached = response_cache.lookup(request, scope="staff")
+        if cached.hit:
+            return cached.response
         # Fetch order from database
         order = db.query(Order).get(order_id)
         if not order:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Order with id: {order_id} does not exist")
-        return order
+        return cached.store(ORJSONResponse(row_dict(order, schemas.OrderOut.__fields__)), tags=[f"order:{order_id}"])
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
 
 # Update an order
@@ -83,12 +116,18 @@ def update_order(
     current_order = db.query(Order).filter(Order.id == order_id, Order.customer_id == current_user.id).first()
     if not current_order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Order with id: {order_id} not found")
+    old_weight = current_order.weight
+    old_services = current_order.services
     # update the order fields
     for field, value in order.dict(exclude_unset=True).items():
         setattr(current_order, field, value)
+    customer_stats.order_weight_changed(db, current_order.customer_id, old_weight, current_order.weight)
+    reschedule = scheduling.order_changed(current_order, old_services, old_weight)
 
     db.commit()
+    reschedule()
     db.refresh(current_order)
+    response_cache.invalidate(f"order:{order_id}")
     return current_order
 
 # Request for deleting an order
@@ -141,6 +180,8 @@ def delete_order(
         
         # Delete the order
         db.delete(order)
+        customer_stats.order_removed(db, order.customer_id, order.weight)
+        release = scheduling.order_finished(order)
         
         # Update the corresponding deletion request
         deletion_request = db.query(OrderDeletionRequest).filter(
@@ -152,6 +193,11 @@ def delete_order(
             deletion_request.processed = True
         
         db.commit()
+        release()
+        response_cache.invalidate(f"order:{order_id}")
+
+        # Drop any pending pickup for the order
+        dispatch.job_cancelled(db, order_id)
         
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     
@@ -1,10 +1,13 @@
 import stripe
 import os
+import time
 from fastapi import Response, status, HTTPException, Depends, APIRouter
 from sqlalchemy.orm import Session
-from app import schemas, oauth2
+from app import customer_stats, metrics, pricing, schemas, oauth2
 from app import models
-from app.database import get_db
+from app.config import settings
+from app.database import get_db, get_read_db
+from app.responses import rows_response
 from app.models import Order, Payment, Customer, PaymentDeletionRequest
 from datetime import datetime
 from typing import List
@@ -18,6 +21,24 @@ router = APIRouter(
 )
 
 # Set up Stripe API keys
+stripe.api_key = os.getenv("STRIPE_API_KEY")
+if settings.stripe_api_base:
+    stripe.api_base = settings.stripe_api_base
+
+
+class MeteredStripeClient(stripe.http_client.RequestsClient):
+    # Counts every HTTP attempt the Stripe library makes, retries included
+    def request(self, method, url, headers, post_data=None):
+        started = time.perf_counter()
+        status_code = None
+        try:
+            content, status_code, response_headers = super().request(method, url, headers, post_data)
+            return content, status_code, response_headers
+        finally:
+            metrics.upstream_call("stripe", status_code, time.perf_counter() - started)
+
+
+stripe.default_http_client = MeteredStripeClient()
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.PaymentOut)
 def create_payment(
@@ -34,9 +55,31 @@ def create_payment(
     if not customer:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Customer not found")
 
+    # The order being paid for: the one named, else the customer's latest
+    order_query = db.query(Order).filter_by(customer_id=customer.customer_id)
+    if payment.order_id is not None:
+        order = order_query.filter(Order.id == payment.order_id).first()
+        if not order:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Order with id: {payment.order_id} not found")
+    else:
+        order = order_query.order_by(Order.created_at.desc()).first()
+
+    # Charge the server-side price; a client amount is only accepted while no prices are configured
+    if pricing.is_configured(db):
+        if not order:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No order to pay for")
+        try:
+            amount = pricing.quote_order(db, order.services, order.weight).total
+        except pricing.UnknownService as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    elif payment.amount is not None:
+        amount = payment.amount
+    else:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="amount is required")
+
     # Create the payment with the associated customer_id
     new_payment = Payment(
-        amount=payment.amount,
+        amount=amount,
         payment_date=datetime.utcnow(),
         customer_id=customer.customer_id
     )
@@ -44,7 +87,7 @@ def create_payment(
     # Charge the payment using the Stripe API
     try:
         charge = stripe.PaymentIntent.create(
-            amount=int(payment.amount * 100),  # Stripe expects the amount in cents
+            amount=int(round(amount * 100)),  # Stripe expects the amount in cents
             currency="usd",  # Replace with your desired currency
             description="Payment for laundry service",  # Replace with your payment description
             customer=customer.stripe_customer_id,  # Replace with the customer's Stripe Customer ID
@@ -58,15 +101,13 @@ def create_payment(
         # Handle Stripe API errors
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
     db.add(new_payment)
+    customer_stats.payment_added(db, customer.customer_id, amount)
     db.commit()
     db.refresh(new_payment)
 
-    # Fetch the latest order of the customer
-    latest_order = db.query(Order).filter_by(customer_id=customer.customer_id).order_by(Order.created_at.desc()).first()
-
-    if latest_order:
-        # Update the payment_id in the latest order
-        latest_order.payment_id = new_payment.id
+    if order:
+        # Link the order to its payment
+        order.payment_id = new_payment.id
 
         db.commit()
 
@@ -77,7 +118,7 @@ def create_payment(
 @router.get("/", response_model=List[schemas.PaymentOut])
 def get_payments(
     current_user: schemas.TokenData = Depends(oauth2.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> List[schemas.PaymentOut]:
     # Check if the current user is a customer and return all payments with the current user id
     if current_user.user_type == "customer":
@@ -89,24 +130,16 @@ def get_payments(
     else:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
 
-    # Retrieve payment details from Stripe API and update payment status
-    for payment in payments:
-        if payment.stripe_payment_id:
-            try:
-                stripe_payment = stripe.PaymentIntent.retrieve(payment.stripe_payment_id)
-                payment.status = stripe_payment.status
-            except stripe.error.StripeError as e:
-                # Handle Stripe API errors
-                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-
-    return payments
+    # No Stripe lookups here: one call per row made the listing as slow as the
+    # customer's payment history was long. GET /payments/{id} has the live status.
+    return rows_response(payments, schemas.PaymentOut)
 
 
 @router.get('/{payment_id}', response_model=schemas.PaymentOut)
 def get_payment(
     payment_id: int,
     current_user: schemas.TokenData = Depends(oauth2.get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ) -> schemas.PaymentOut:
     # Check if the current user is a customer
     if current_user.user_type == "customer":
@@ -134,7 +167,7 @@ def get_payment(
     return payment
 
 
-@router.put('/{payment_id}', response_model=schemas.PaymentUpdate)
+@router.put('/{payment_id}', response_model=schemas.PaymentOut)
 def update_payment(
     payment_id: int,
     payment: schemas.PaymentUpdate,
@@ -211,6 +244,7 @@ def delete_payment(
 
         # Delete the payment
         db.delete(payment)
+        customer_stats.payment_removed(db, payment.customer_id, payment.amount)
 
         # Update the corresponding deletion request
         deletion_request = db.query(models.PaymentDeletionRequest).filter(
@@ -0,0 +1,33 @@
+#This API was developed by Alex Mutonga
+from typing import List
+from fastapi import status, HTTPException, Depends, APIRouter
+from sqlalchemy.orm import Session
+from app import models, oauth2, pricing, schemas
+from app.database import get_db, get_read_db
+from app.responses import rows_response
+
+router = APIRouter(
+    prefix="/prices",
+    tags=['prices']
+)
+
+# Current price table
+@router.get("/", response_model=List[schemas.ServicePrice], status_code=status.HTTP_200_OK)
+def get_prices(current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+               db: Session = Depends(get_read_db)
+               ) -> List[schemas.ServicePrice]:
+    return rows_response(db.query(models.ServicePrice).order_by(models.ServicePrice.service), schemas.ServicePrice)
+
+# Replace the price table; quotes use the new prices straight away
+@router.put("/", response_model=List[schemas.ServicePrice], status_code=status.HTTP_200_OK)
+def set_prices(prices: List[schemas.ServicePrice],
+               current_user: schemas.TokenData = Depends(oauth2.get_current_user),
+               db: Session = Depends(get_db)
+               ) -> List[schemas.ServicePrice]:
+    # Check user is admin
+    if current_user.user_type not in ["admin"]:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized access")
+
+    table = pricing.replace_prices(db, prices)
+    return [schemas.ServicePrice(service=service, price_per_kg=price_per_kg, minimum_charge=minimum_charge)
+            for service, (price_per_kg, minimum_charge) in sorted(table.items())]
@@ -0,0 +1,84 @@
+# This API was developed by Alex Mutonga
+# Stop ordering for a courier run.
+#
+# The distance matrix is built in one vectorised NumPy pass, a route is
+# constructed by nearest insertion and then improved with 2-opt until no
+# move helps or the time budget runs out. Routes are open paths from the
+# courier's position, optionally ending at a fixed stop (the laundromat).
+import time
+from typing import List, Optional
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_matrix(latitudes, longitudes) -> np.ndarray:
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lng = np.radians(np.asarray(longitudes, dtype=float))
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    # Haversine
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def route_length(dist: np.ndarray, route) -> float:
+    route = np.asarray(route)
+    return float(dist[route[:-1], route[1:]].sum())
+
+
+def nearest_insertion(dist: np.ndarray, start: int, end: Optional[int] = None) -> List[int]:
+    n = len(dist)
+    route = [start] if end is None or end == start else [start, end]
+    remaining = np.ones(n, dtype=bool)
+    remaining[route] = False
+    # Distance from every node to its closest node already on the route
+    closest = dist[route].min(axis=0)
+
+    while remaining.any():
+        node = int(np.where(remaining, closest, np.inf).argmin())
+        path = np.asarray(route)
+        # Cost of inserting between each consecutive pair...
+        added = dist[path[:-1], node] + dist[node, path[1:]] - dist[path[:-1], path[1:]]
+        if end is None:
+            # ...or of appending to an open path
+            added = np.append(added, dist[path[-1], node])
+        route.insert(int(added.argmin()) + 1, node)
+        remaining[node] = False
+        closest = np.minimum(closest, dist[node])
+    return route
+
+
+def two_opt(dist: np.ndarray, route: List[int], fixed_end: bool, deadline: float) -> List[int]:
+    route = np.asarray(route)
+    n = len(route)
+    # Reversing route[i:j + 1]; the start never moves, nor the end if fixed
+    last = n - 2 if fixed_end else n - 1
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, last):
+            a, b = route[i - 1], route[i]
+            j = np.arange(i + 1, last + 1)
+            c = route[j]
+            has_next = j + 1 < n
+            following = route[np.minimum(j + 1, n - 1)]
+            delta = dist[a, c] - dist[a, b] + np.where(has_next, dist[b, following] - dist[c, following], 0.0)
+            k = int(delta.argmin())
+            if delta[k] < -1e-9:
+                route[i:j[k] + 1] = route[i:j[k] + 1][::-1].copy()
+                improved = True
+            if time.perf_counter() >= deadline:
+                break
+    return route.tolist()
+
+
+def plan_route(latitudes, longitudes, end: Optional[int] = None, time_budget_ms: float = 50.0):
+    # Point 0 is the start. Returns (order of point indexes, leg distances, total km)
+    deadline = time.perf_counter() + time_budget_ms / 1000
+    dist = distance_matrix(latitudes, longitudes)
+    route = nearest_insertion(dist, 0, end)
+    if len(route) > 3:
+        route = two_opt(dist, route, end is not None, deadline)
+    legs = [0.0] + [float(dist[a, b]) for a, b in zip(route[:-1], route[1:])]
+    return route, legs, sum(legs)
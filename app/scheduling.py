@@ -0,0 +1,160 @@
+# This API was developed by Alex Mutonga
+# Capacity-aware laundromat scheduling.
+#
+# Laundromats declare a throughput (kg/hour) per service. New orders go to
+# the laundromat that would finish them soonest given what it already has
+# queued: for each requested service, (backlog_kg + order_kg) / kg_per_hour,
+# summed over services since they run one after another. Capacities and
+# per-service backlog counters live in memory and are updated once orders are
+# scheduled, changed, completed or deleted; they are re-read from the
+# database every scheduler_refresh_seconds so several workers converge.
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app import models
+from app.config import settings
+
+
+def parse_services(services: str) -> List[str]:
+    # "Wash, Dry" -> ["dry", "wash"]
+    return sorted({service.strip().lower() for service in (services or "").split(",") if service.strip()})
+
+
+class Scheduler:
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.RLock()
+        self.capacity: Dict[int, Dict[str, float]] = {}
+        self.backlog: Dict[int, Dict[str, float]] = {}
+        self.loaded_at = None
+
+    def reset(self):
+        # Forget everything; the next get_scheduler() reloads from the database
+        with self.lock:
+            self.capacity, self.backlog = {}, {}
+            self.loaded_at = None
+
+    def load(self, db: Session, force: bool = False):
+        with self.lock:
+            if not force and self.loaded_at is not None and time.monotonic() - self.loaded_at < self.refresh_seconds:
+                return
+            capacity = {}
+            for laundromat_id, service, kg_per_hour in db.query(
+                    models.LaundromatCapacity.laundromat_id,
+                    models.LaundromatCapacity.service,
+                    models.LaundromatCapacity.kg_per_hour):
+                capacity.setdefault(laundromat_id, {})[service] = kg_per_hour
+
+            # Open orders grouped by their service combination, so this is one
+            # row per (laundromat, combination) rather than one per order
+            backlog = {}
+            for laundromat_id, services, weight in db.query(
+                    models.Order.laundromat_id, models.Order.services, func.coalesce(func.sum(models.Order.weight), 0)) \
+                    .filter(models.Order.laundromat_id.isnot(None), models.Order.completed_at.is_(None)) \
+                    .group_by(models.Order.laundromat_id, models.Order.services):
+                counters = backlog.setdefault(laundromat_id, {})
+                for service in parse_services(services):
+                    counters[service] = counters.get(service, 0.0) + weight
+
+            self.capacity, self.backlog = capacity, backlog
+            self.loaded_at = time.monotonic()
+
+    def hours_at(self, laundromat_id: int, services: List[str], weight: float) -> Optional[float]:
+        capacity = self.capacity.get(laundromat_id, {})
+        if not services or any(service not in capacity for service in services):
+            return None
+        backlog = self.backlog.get(laundromat_id, {})
+        return sum((backlog.get(service, 0.0) + weight) / capacity[service] for service in services)
+
+    def choose(self, services: List[str], weight: float) -> Optional[Tuple[int, float]]:
+        with self.lock:
+            best = None
+            for laundromat_id in self.capacity:
+                hours = self.hours_at(laundromat_id, services, weight)
+                if hours is not None and (best is None or hours < best[1]):
+                    best = (laundromat_id, hours)
+            return best
+
+    def adjust(self, laundromat_id: int, services: List[str], weight: float):
+        with self.lock:
+            counters = self.backlog.setdefault(laundromat_id, {})
+            for service in services:
+                counters[service] = max(0.0, counters.get(service, 0.0) + weight)
+
+    def set_capacity(self, laundromat_id: int, capacity: Dict[str, float]):
+        with self.lock:
+            if capacity:
+                self.capacity[laundromat_id] = dict(capacity)
+            else:
+                self.capacity.pop(laundromat_id, None)
+
+    def load_of(self, laundromat_id: int):
+        with self.lock:
+            capacity = self.capacity.get(laundromat_id, {})
+            backlog = self.backlog.get(laundromat_id, {})
+            return [
+                {
+                    "service": service,
+                    "kg_per_hour": kg_per_hour,
+                    "backlog_kg": backlog.get(service, 0.0),
+                    "backlog_hours": backlog.get(service, 0.0) / kg_per_hour,
+                }
+                for service, kg_per_hour in sorted(capacity.items())
+            ]
+
+
+scheduler = Scheduler(refresh_seconds=settings.scheduler_refresh_seconds)
+
+
+def get_scheduler(db: Session) -> Scheduler:
+    scheduler.load(db)
+    return scheduler
+
+
+def estimate(db: Session, services: str, weight: float) -> Optional[Tuple[int, datetime, float]]:
+    choice = get_scheduler(db).choose(parse_services(services), weight or 0)
+    if choice is None:
+        return None
+    laundromat_id, hours = choice
+    return laundromat_id, datetime.utcnow() + timedelta(hours=hours), hours
+
+
+def schedule_order(db: Session, order: models.Order) -> Callable[[], None]:
+    # Sets laundromat_id/estimated_ready_at on a new order and returns the
+    # backlog update for the caller to run once its commit succeeds
+    services, weight = parse_services(order.services), order.weight or 0
+    choice = get_scheduler(db).choose(services, weight)
+    if choice is None:
+        return _nothing
+    order.laundromat_id = choice[0]
+    order.estimated_ready_at = datetime.utcnow() + timedelta(hours=choice[1])
+    return lambda: scheduler.adjust(choice[0], services, weight)
+
+
+def order_changed(order: models.Order, old_services: str, old_weight: float) -> Callable[[], None]:
+    # Run the returned callable after the commit that saves the change
+    if order.laundromat_id is None or order.completed_at is not None:
+        return _nothing
+    laundromat_id = order.laundromat_id
+    new_services, new_weight = parse_services(order.services), order.weight or 0
+
+    def apply():
+        scheduler.adjust(laundromat_id, parse_services(old_services), -(old_weight or 0))
+        scheduler.adjust(laundromat_id, new_services, new_weight)
+    return apply
+
+
+def order_finished(order: models.Order) -> Callable[[], None]:
+    # Completed or deleted: it no longer occupies the laundromat once the
+    # caller has committed and runs the returned callable
+    if order.laundromat_id is None or order.completed_at is not None:
+        return _nothing
+    laundromat_id, services, weight = order.laundromat_id, parse_services(order.services), order.weight or 0
+    return lambda: scheduler.adjust(laundromat_id, services, -weight)
+
+
+def _nothing():
+    pass
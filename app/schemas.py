@@ -21,6 +21,18 @@ class CustomerOut(BaseModel):
     class Config:
         orm_mode = True
 
+class CustomerStatsOut(BaseModel):
+    order_count: int = 0
+    total_weight: float = 0
+    payment_count: int = 0
+    total_spend: float = 0
+
+    class Config:
+        orm_mode = True
+
+class CustomerDetailOut(CustomerOut):
+    stats: Optional[CustomerStatsOut] = None
+
 class CustomerUpdate(BaseModel):
     name: str
     phone_number: str
@@ -37,10 +49,17 @@ class PaymentBase(BaseModel):
     payment_date: datetime = Field(default_factory=datetime.utcnow)
 
 class PaymentCreate(PaymentBase):
+    # Worked out from the order when prices are configured
+    amount: Optional[float] = None
+    # Defaults to the customer's latest order
+    order_id: Optional[int] = None
+
     class Config:
         orm_mode = True
 
-class PaymentUpdate(PaymentBase):
+class PaymentUpdate(BaseModel):
+    # No amount: it is the quoted price that was charged, not the customer's to change
+    payment_date: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
     class Config:
@@ -70,6 +89,8 @@ class OrderUpdate(OrderBase):
 class OrderOut(OrderBase):
     id: int
     # customer_id: int
+    laundromat_id: Optional[int] = None
+    estimated_ready_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
@@ -81,12 +102,16 @@ class LaundromatCreate(BaseModel):
     phone_number: str
     email: str
     password: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 class LaundromatOut(BaseModel):
     laundromat_id: int
     name: str
     phone_number: Optional[str]
     email: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
     class Config:
         orm_mode = True
@@ -95,6 +120,45 @@ class LaundromatLogin(BaseModel):
     email: EmailStr
     password: str
 
+class ServiceCapacity(BaseModel):
+    service: str
+    kg_per_hour: float = Field(..., gt=0)
+
+    class Config:
+        orm_mode = True
+
+class ServiceLoadOut(ServiceCapacity):
+    backlog_kg: float
+    backlog_hours: float
+
+class LaundromatLoadOut(BaseModel):
+    laundromat_id: int
+    services: List[ServiceLoadOut]
+
+class EtaOut(BaseModel):
+    laundromat_id: int
+    estimated_ready_at: datetime
+    hours: float
+
+class ServicePrice(BaseModel):
+    service: str
+    price_per_kg: float = Field(..., ge=0)
+    minimum_charge: float = Field(0, ge=0)
+
+    class Config:
+        orm_mode = True
+
+class QuoteLine(BaseModel):
+    service: str
+    amount: float
+
+class QuoteOut(BaseModel):
+    services: str
+    weight: float
+    lines: List[QuoteLine] = []
+    total: Optional[float] = None
+    error: Optional[str] = None
+
 #schemas for couriers
 class CourierBase(BaseModel):
     name: str
@@ -143,6 +207,33 @@ class AdminLogin(BaseModel):
     email: EmailStr
     password: str
     
+#schemas for bulk account import
+class ImportRowError(BaseModel):
+    row: int
+    email: Optional[str] = None
+    errors: List[str]
+
+class ImportReport(BaseModel):
+    total: int
+    created: int
+    failed: int
+    errors: List[ImportRowError] = []
+
+#schemas for the deletion request queue
+class DeletionRequestOut(BaseModel):
+    kind: str
+    id: int
+    target_id: Optional[int] = None
+
+class DeletionDecision(BaseModel):
+    ids: List[int]
+
+class DeletionDecisionOut(BaseModel):
+    kind: str
+    approved: bool
+    decided: int
+    skipped: int
+
 #schemas for locker system (lockers)
 class LockerStatus(str, Enum):
     AVAILABLE = "available"
@@ -159,6 +250,8 @@ class LockerCreate(BaseModel):
     location: str
     # status: LockerStatus
     size: LockerSize
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 class LockerOut(BaseModel):
     locker_id: int
@@ -166,10 +259,79 @@ class LockerOut(BaseModel):
     location: str
     status: LockerStatus
     size: LockerSize
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+    class Config:
+        orm_mode = True
+
+#schemas for bulk notifications
+class NotificationStatus(str, Enum):
+    QUEUED = "queued"
+    SENT = "sent"
+    FAILED = "failed"
+
+class NotificationCreate(BaseModel):
+    # Placeholders: {name}, {order_id}, {locker_number}, {location}, {code}
+    template: str
+    customer_ids: Optional[List[int]] = None
+    locker_ids: Optional[List[int]] = None
+    location: Optional[str] = None
+
+class NotificationBatchOut(BaseModel):
+    id: int
+    template: str
+    recipient_count: int
+    created_at: datetime
+    queued: int = 0
+    sent: int = 0
+    failed: int = 0
 
     class Config:
         orm_mode = True
 
+#schemas for courier dispatch
+class Position(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+class LocationPing(Position):
+    accuracy: Optional[float] = None
+    recorded_at: Optional[datetime] = None
+
+class CourierLocationOut(BaseModel):
+    courier_id: int
+    latitude: float
+    longitude: float
+    recorded_at: datetime
+
+class DispatchJobOut(BaseModel):
+    order_id: int
+    locker_id: int
+    latitude: float
+    longitude: float
+    courier_id: Optional[int] = None
+
+class DispatchStatusOut(BaseModel):
+    couriers_on_duty: int
+    open_jobs: int
+    unassigned_jobs: int
+    last_decision_ms: float
+
+class RouteStop(BaseModel):
+    kind: str  # start, locker or laundromat
+    latitude: float
+    longitude: float
+    leg_km: float
+    order_id: Optional[int] = None
+    locker_id: Optional[int] = None
+    laundromat_id: Optional[int] = None
+
+class RouteOut(BaseModel):
+    stops: List[RouteStop]
+    total_km: float
+    planning_ms: float
+
 #schemas for tokenisation
 class Token(BaseModel):
     access_token: str
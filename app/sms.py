@@ -1,5 +1,36 @@
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+from twilio.base.exceptions import TwilioRestException
 from fastapi import HTTPException
-from app.twilio_service import send_verification_code, verify_code
+from app.config import settings
+from app.twilio_service import get_client, get_async_client, close_async_client, send_verification_code, verify_code
+
+logger = logging.getLogger(__name__)
+
+
+def send_sms(to: str, body: str):
+    # Blocking send, for scripts and anything running outside the API's event loop
+    message = get_client().messages.create(
+        body=body,
+        from_=settings.twilio_phone_number,
+        to=to
+    )
+
+    return message.sid
+
+
+async def send_sms_async(to: str, body: str):
+    message = await get_async_client().messages.create_async(
+        body=body,
+        from_=settings.twilio_phone_number,
+        to=to
+    )
+
+    return message.sid
 
 
 def send_sms_verification(to: str):
@@ -18,3 +49,163 @@ def verify_sms_code(phone_number: str, code: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@dataclass
+class OutboundSms:
+    to: str
+    body: str
+    attempts: int = 0
+    # Called as on_result(message, sid, error) once the message is sent or given up on
+    on_result: Optional[Callable] = None
+
+
+class RateLimiter:
+    # Token bucket shared by all sends of a dispatcher, so the overall send
+    # rate never exceeds what our Twilio number is allowed to push.
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SmsDispatcher:
+    # In-process outbound SMS queue. Request handlers call enqueue() and return
+    # straight away; a small pool of background tasks drains the queue in
+    # batches, sends through the shared async Twilio client and retries
+    # failures with exponential backoff. All workers share one rate limiter.
+    def __init__(self, rate: float, batch_size: int, max_retries: int, backoff: float, queue_size: int,
+                 workers: int = 1):
+        self.limiter = RateLimiter(rate)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.queue_size = queue_size
+        self.queue = None
+        self._loop = None
+        self._tasks = []
+
+    @property
+    def loop(self):
+        return self._loop
+
+    @property
+    def running(self):
+        return any(not task.done() for task in self._tasks)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [self._loop.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        if not self.running:
+            return
+        # Give queued messages a chance to go out before shutting down
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("SMS dispatcher stopped with %d messages still queued", self.queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await close_async_client()
+
+    def enqueue(self, to: str, body: str):
+        message = OutboundSms(to=to, body=body)
+        if not self.running:
+            # Sending inline would block the caller on Twilio; scripts call send_sms() themselves
+            logger.error("SMS dispatcher is not running, dropping message to %s", to)
+            return
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+        if in_loop:
+            self._put(message)
+        else:
+            # Sync route handlers run in the threadpool; hand over to the loop
+            self._loop.call_soon_threadsafe(self._put, message)
+
+    async def submit(self, to: str, body: str, on_result: Callable = None):
+        # Like enqueue() but waits for queue space instead of dropping, for
+        # bulk producers running on the dispatcher's loop
+        await self.queue.put(OutboundSms(to=to, body=body, on_result=on_result))
+
+    def _put(self, message: OutboundSms):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull as e:
+            logger.error("SMS queue full, dropping message to %s", message.to)
+            self._finish(message, None, e)
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await asyncio.gather(*(self._send(message) for message in batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _send(self, message: OutboundSms):
+        await self.limiter.acquire()
+        message.attempts += 1
+        try:
+            sid = await send_sms_async(message.to, message.body)
+        except TwilioRestException as e:
+            # 4xx other than throttling will fail the same way again
+            if e.status < 500 and e.status != 429:
+                logger.error("SMS to %s rejected by Twilio: %s", message.to, e.msg)
+                self._finish(message, None, e)
+                return
+            self._retry(message, e)
+        except Exception as e:
+            self._retry(message, e)
+        else:
+            self._finish(message, sid, None)
+
+    def _retry(self, message: OutboundSms, error: Exception):
+        if message.attempts > self.max_retries:
+            logger.error("Giving up on SMS to %s after %d attempts: %s", message.to, message.attempts, error)
+            self._finish(message, None, error)
+            return
+        delay = self.backoff * 2 ** (message.attempts - 1) * (1 + random.random() / 2)
+        self._loop.call_later(delay, self._put, message)
+
+    def _finish(self, message: OutboundSms, sid: Optional[str], error: Optional[Exception]):
+        if message.on_result is None:
+            return
+        try:
+            message.on_result(message, sid, error)
+        except Exception:
+            logger.exception("SMS result callback failed for %s", message.to)
+
+
+dispatcher = SmsDispatcher(
+    rate=settings.sms_rate_per_second,
+    batch_size=settings.sms_batch_size,
+    max_retries=settings.sms_max_retries,
+    backoff=settings.sms_retry_backoff_seconds,
+    queue_size=settings.sms_queue_size,
+    workers=settings.sms_workers,
+)
+
+
+def enqueue_sms(to: str, body: str):
+    dispatcher.enqueue(to, body)
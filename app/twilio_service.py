@@ -1,12 +1,85 @@
+import threading
+import time
+from urllib.parse import urlsplit
 from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from twilio.http.async_http_client import AsyncTwilioHttpClient
 from fastapi import HTTPException
+from app import metrics
 from app.config import settings
 
+def _rewrite_url(url: str) -> str:
+    # Point every Twilio domain (api., verify., ...) at twilio_api_base, e.g.
+    # the local stand-in in benchmarks/fake_upstreams.py
+    if not settings.twilio_api_base:
+        return url
+    parts = urlsplit(url)
+    rewritten = settings.twilio_api_base.rstrip("/") + parts.path
+    return f"{rewritten}?{parts.query}" if parts.query else rewritten
+
+
+class RoutedTwilioHttpClient(TwilioHttpClient):
+    def request(self, method, url, *args, **kwargs):
+        started = time.perf_counter()
+        status_code = None
+        try:
+            response = super().request(method, _rewrite_url(url), *args, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            metrics.upstream_call("twilio", status_code, time.perf_counter() - started)
+
+
+class RoutedAsyncTwilioHttpClient(AsyncTwilioHttpClient):
+    async def request(self, method, url, *args, **kwargs):
+        started = time.perf_counter()
+        status_code = None
+        try:
+            response = await super().request(method, _rewrite_url(url), *args, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            metrics.upstream_call("twilio", status_code, time.perf_counter() - started)
+
+
+# One Twilio client per process. Building a Client per call threw away the
+# underlying HTTP session and repeated the TLS handshake on every request.
+_client = None
+_client_lock = threading.Lock()
+
+# The async client owns an aiohttp session, which is bound to the event loop
+# that created it, so it is built lazily from inside the running loop.
+_async_client = None
+
+
+def get_client() -> Client:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Client(settings.twilio_account_sid, settings.twilio_auth_token,
+                                 http_client=RoutedTwilioHttpClient(pool_connections=True))
+    return _client
+
+
+def get_async_client() -> Client:
+    global _async_client
+    if _async_client is None:
+        _async_client = Client(settings.twilio_account_sid, settings.twilio_auth_token,
+                               http_client=RoutedAsyncTwilioHttpClient(pool_connections=True))
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.http_client.close()
+        _async_client = None
+
 
 def send_verification_code(phone_number: str):
     try:
-        client = Client(settings.twilio_account_sid, settings.twilio_auth_token)
-        verification = client.verify.v2.services(settings.twilio_verify_sid) \
+        verification = get_client().verify.v2.services(settings.twilio_verify_sid) \
             .verifications \
             .create(to=phone_number, channel="sms")
         return verification.status
@@ -16,8 +89,7 @@ def send_verification_code(phone_number: str):
 
 def verify_code(phone_number: str, code: str):
     try:
-        client = Client(settings.twilio_account_sid, settings.twilio_auth_token)
-        verification_check = client.verify.v2.services(settings.twilio_verify_sid) \
+        verification_check = get_client().verify.v2.services(settings.twilio_verify_sid) \
             .verification_checks \
             .create(to=phone_number, code=code)
         return verification_check.status
@@ -1,5 +1,8 @@
 #This API was developed by Alex Mutonga
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -8,4 +11,32 @@ def hash(password: str):
     return pwd_context.hash(password)
 
 def verify(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(plain_password, hashed_password)
+
+# 409 messages for the unique columns on the account tables
+UNIQUE_CONFLICT_MESSAGES = {
+    "email": "Email already exists",
+    "phone_number": "Phone number already exists",
+    "vehicle_reg_no": "Vehicle already registerd",
+}
+
+def insert_unique(db: Session, instance):
+    # Insert straight away and let the table's unique constraints reject
+    # duplicates, instead of a SELECT per unique column beforehand (which also
+    # raced with concurrent signups). Returns the new row's columns as a dict.
+    db.add(instance)
+    try:
+        db.flush()
+        created = {column.key: getattr(instance, column.key) for column in instance.__table__.columns}
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        # Postgres names unnamed unique constraints <table>_<column>_key
+        constraint = getattr(getattr(e.orig, "diag", None), "constraint_name", None)
+        for column, message in UNIQUE_CONFLICT_MESSAGES.items():
+            if constraint == f"{instance.__tablename__}_{column}_key":
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=message)
+        if getattr(e.orig, "pgcode", None) == "23505":
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
+        raise
+    return created
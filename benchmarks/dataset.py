@@ -0,0 +1,343 @@
+# Synthetic dataset generator for reproducing production-sized tables.
+#
+# Bulk-loads customers, couriers, laundromats, lockers, orders and payments
+# with COPY, generating each chunk with numpy rather than building ORM
+# objects, so ten million rows take minutes:
+#
+#   python -m benchmarks.dataset --customers 300000 --lockers 20000 \
+#       --orders 6000000 --payments 4000000 --seed 42
+#
+# Uses the database from the usual DATABASE_* settings, which must be a
+# scratch database: tables are created if missing and every table is
+# truncated first. The same --seed and --end give the same rows.
+#
+# Shape of the data:
+#   - orders per customer follow a Pareto distribution, so a few heavy
+#     customers own a large share of the orders
+#   - orders are spread over --days days up to --end, busier towards the end,
+#     with morning and evening peak hours
+#   - weights are log-normal around 5 kg; services mix mostly wash/dry
+#   - lockers sit in sites of about 25, with a small/medium/large mix; about
+#     a third are occupied
+#   - orders older than two days are completed; --payments of the orders are
+#     paid, priced from the seeded price table
+# customer_stats is rebuilt from the loaded rows and every table is
+# analyzed at the end.
+import argparse
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+SERVICES = ["wash", "wash, dry", "wash, dry, iron", "dry", "iron"]
+SERVICE_SHARE = [0.35, 0.45, 0.12, 0.05, 0.03]
+PRICES = {"wash": (1.5, 5.0), "dry": (1.0, 3.0), "iron": (2.0, 4.0)}  # per kg, minimum charge
+# Relative order volume per local hour of the day; timestamps are stored in
+# UTC, like datetime.utcnow() in the models
+HOUR_WEIGHTS = [1, 0.5, 0.3, 0.3, 0.5, 1.5, 4, 8, 9, 6, 4, 4, 5, 4, 3.5, 4, 6, 9, 10, 8, 5, 3, 2, 1.5]
+LOCKER_SIZES = ["SMALL", "MEDIUM", "LARGE"]  # enum names, as SQLAlchemy stores them
+LOCKER_SIZE_SHARE = [0.5, 0.35, 0.15]
+CODE_CHARS = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"))
+UTC_OFFSET_HOURS = 3  # Nairobi
+NULL = "\\N"
+
+
+def timestamps(seconds: np.ndarray, epoch: np.datetime64) -> np.ndarray:
+    return (epoch + seconds.astype("timedelta64[s]")).astype(str)
+
+
+def codes(rng: np.random.Generator, count: int) -> np.ndarray:
+    return rng.choice(CODE_CHARS, (count, 6)).view("<U6").ravel()
+
+
+def copy(cursor, table: str, columns, rows) -> int:
+    # rows: one sequence of strings per column
+    buffer = io.StringIO("\n".join(map("\t".join, zip(*rows))) + "\n")
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    return len(rows[0])
+
+
+# str() on Python scalars is several times faster than numpy's astype(str)
+# for integers, and no slower for floats
+
+def strings(values) -> list:
+    return list(map(str, np.asarray(values).tolist()))
+
+
+def nullable(values: np.ndarray, present: np.ndarray) -> list:
+    return [value if keep else NULL for value, keep in zip(map(str, values.tolist()), present.tolist())]
+
+
+class Generator:
+    def __init__(self, cursor, args):
+        self.cursor = cursor
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+        self.end = np.datetime64(args.end, "s")
+        self.epoch = self.end - np.timedelta64(args.days, "D")
+        self.couriers = max(args.customers // 200, 1)
+        self.laundromats = max(args.customers // 1000, 1)
+        self.loaded = {}
+
+    def report(self, table: str, count: int, started: float):
+        elapsed = time.perf_counter() - started
+        self.loaded[table] = self.loaded.get(table, 0) + count
+        print(f"  {table:<28}{count:>12,} rows {elapsed:8.1f}s {count / max(elapsed, 1e-9):>12,.0f} rows/s")
+
+    def people(self, password: str):
+        args = self.args
+        started = time.perf_counter()
+        ids = range(1, args.customers + 1)
+        count = copy(self.cursor, "customers",
+                     ["customer_id", "name", "email", "phone_number", "password", "stripe_customer_id"],
+                     [[str(i) for i in ids], [f"Customer {i}" for i in ids],
+                      [f"customer{i}@example.com" for i in ids], [f"+2547{i:08d}" for i in ids],
+                      [password] * len(ids), [f"cus_gen_{i}" for i in ids]])
+        self.report("customers", count, started)
+
+        started = time.perf_counter()
+        ids = range(1, self.couriers + 1)
+        count = copy(self.cursor, "couriers",
+                     ["courier_id", "name", "email", "phone_number", "password", "vehicle_reg_no"],
+                     [[str(i) for i in ids], [f"Courier {i}" for i in ids],
+                      [f"courier{i}@example.com" for i in ids], [f"+2541{i:08d}" for i in ids],
+                      [password] * len(ids), [f"KAA {i:06d}" for i in ids]])
+        self.report("couriers", count, started)
+
+        started = time.perf_counter()
+        ids = range(1, self.laundromats + 1)
+        count = copy(self.cursor, "laundromats",
+                     ["laundromat_id", "name", "email", "password", "latitude", "longitude"],
+                     [[str(i) for i in ids], [f"Laundromat {i}" for i in ids],
+                      [f"laundromat{i}@example.com" for i in ids], [password] * len(ids),
+                      strings(-1.28 + self.rng.normal(0, 0.05, len(ids))),
+                      strings(36.82 + self.rng.normal(0, 0.05, len(ids)))])
+        services = ["wash", "dry", "iron"]
+        count += copy(self.cursor, "laundromat_capacities", ["laundromat_id", "service", "kg_per_hour"],
+                      [[str(i) for i in ids for _ in services], services * len(ids),
+                       strings(self.rng.choice([10.0, 20.0, 40.0], len(ids) * len(services)))])
+        self.report("laundromats + capacities", count, started)
+
+        self.cursor.execute("INSERT INTO admins (name, email, password) VALUES ('Admin', 'admin@example.com', %s)",
+                            (password,))
+        self.cursor.executemany(
+            "INSERT INTO service_prices (service, price_per_kg, minimum_charge, updated_at) VALUES (%s, %s, %s, now())",
+            [(service, per_kg, minimum) for service, (per_kg, minimum) in PRICES.items()])
+
+    def lockers(self):
+        count = self.args.lockers
+        started = time.perf_counter()
+        sites = np.arange(count) // 25
+        site_lat = -1.28 + self.rng.normal(0, 0.08, sites[-1] + 1)
+        site_lon = 36.82 + self.rng.normal(0, 0.08, sites[-1] + 1)
+        occupied = self.rng.random(count) < 0.35
+        copy(self.cursor, "lockers",
+             ["locker_id", "locker_number", "location", "status", "size", "code", "latitude", "longitude"],
+             [strings(np.arange(1, count + 1)), [f"L{i:07d}" for i in range(1, count + 1)],
+              [f"Site {site}" for site in sites.tolist()],
+              np.where(occupied, "OCCUPIED", "AVAILABLE").tolist(),
+              self.rng.choice(LOCKER_SIZES, count, p=LOCKER_SIZE_SHARE).tolist(),
+              nullable(codes(self.rng, count), occupied),
+              strings(site_lat[sites] + self.rng.normal(0, 0.0003, count)),
+              strings(site_lon[sites] + self.rng.normal(0, 0.0003, count))])
+        self.report("lockers", count, started)
+
+    def orders_and_payments(self):
+        args = self.args
+        rng = self.rng
+        total = args.orders
+        span = int((self.end - self.epoch) / np.timedelta64(1, "s"))
+        # Heavy customers: Pareto weights give roughly an 80/20 split, capped
+        # so the heaviest orders a few times a day rather than hourly
+        customer_weights = np.minimum(rng.pareto(1.16, args.customers) + 1, 200)
+        customer_weights /= customer_weights.sum()
+        hour_p = np.array(HOUR_WEIGHTS) / sum(HOUR_WEIGHTS)
+        service_amounts = [
+            [PRICES[service] for service in services.split(", ")] for services in SERVICES
+        ]
+        paid_share = args.payments / total if total else 0.0
+        completed_before = span - 2 * 86400
+
+        # Creation times for every order, sorted so ids follow time as they
+        # do in production; the busiest days are the most recent ones
+        days = np.floor(rng.power(1.5, total) * args.days).astype(np.int64)
+        hours = (rng.choice(24, total, p=hour_p) - UTC_OFFSET_HOURS) % 24
+        created = np.sort(days * 86400 + hours * 3600 + rng.integers(0, 3600, total))
+
+        # The next chunk is generated while the previous one is copied; one
+        # copy thread keeps payments ahead of the orders that reference them
+        started = time.perf_counter()
+        copies = []
+        next_payment = 1
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for start in range(0, total, args.chunk_size):
+                created_at = created[start:start + args.chunk_size]
+                n = len(created_at)
+                customers = rng.choice(args.customers, n, p=customer_weights) + 1
+                service = rng.choice(len(SERVICES), n, p=SERVICE_SHARE)
+                weight = np.round(np.clip(rng.lognormal(np.log(5), 0.5, n), 0.5, 40), 1)
+
+                amount = np.zeros(n)
+                for index, prices in enumerate(service_amounts):
+                    chosen = service == index
+                    for per_kg, minimum in prices:
+                        amount[chosen] += np.maximum(weight[chosen] * per_kg, minimum)
+                amount = np.round(amount, 2)
+
+                paid = rng.random(n) < paid_share
+                paid_count = int(paid.sum())
+                payment_ids = np.cumsum(paid) + next_payment - 1
+                next_payment += paid_count
+                payment_date = timestamps(created_at[paid] + rng.integers(60, 1800, paid_count), self.epoch).tolist()
+                failed = rng.random(paid_count) < 0.03
+                payments = [strings(payment_ids[paid]), strings(customers[paid]), strings(amount[paid]),
+                            [f"pi_gen_{i}" for i in payment_ids[paid].tolist()],
+                            np.where(failed, "requires_payment_method", "succeeded").tolist(),
+                            payment_date, payment_date]
+
+                in_locker = rng.random(n) < 0.7
+                completed = created_at < completed_before
+                assigned = completed | (rng.random(n) < 0.5)
+                assigned_at = created_at + rng.integers(1800, 3 * 3600, n)
+                picked_up_at = assigned_at + rng.integers(1800, 2 * 3600, n)
+                estimated_ready_at = created_at + rng.integers(20 * 3600, 30 * 3600, n)
+                completed_at = created_at + rng.integers(24 * 3600, 72 * 3600, n)
+                orders = [strings(np.arange(start + 1, start + n + 1)), strings(customers),
+                          np.array(SERVICES)[service].tolist(), strings(weight),
+                          nullable(payment_ids, paid),
+                          nullable(rng.integers(1, args.lockers + 1, n), in_locker),
+                          nullable(codes(rng, n), in_locker),
+                          nullable(rng.integers(1, self.couriers + 1, n), assigned),
+                          nullable(timestamps(assigned_at, self.epoch), assigned),
+                          nullable(timestamps(picked_up_at, self.epoch), completed),
+                          strings(rng.integers(1, self.laundromats + 1, n)),
+                          timestamps(estimated_ready_at, self.epoch).tolist(),
+                          nullable(timestamps(completed_at, self.epoch), completed),
+                          timestamps(created_at, self.epoch).tolist()]
+
+                # At most one chunk waiting, so memory stays at about two chunks
+                while len(copies) > 1:
+                    copies.pop(0).result()
+                copies.append(executor.submit(self.copy_chunk, payments, orders, start + n, started))
+            for future in copies:
+                future.result()
+
+        self.loaded["orders"] = total
+        self.loaded["payments"] = next_payment - 1
+        elapsed = time.perf_counter() - started
+        print(f"  {'orders + payments':<28}{total + next_payment - 1:>12,} rows {elapsed:8.1f}s "
+              f"{(total + next_payment - 1) / max(elapsed, 1e-9):>12,.0f} rows/s")
+
+    def copy_chunk(self, payments, orders, done: int, started: float):
+        copy(self.cursor, "payments",
+             ["id", "customer_id", "amount", "stripe_payment_id", "status", "payment_date", "created_at"], payments)
+        copy(self.cursor, "orders",
+             ["id", "customer_id", "services", "weight", "payment_id", "locker_id", "locker_code",
+              "courier_id", "assigned_at", "picked_up_at", "laundromat_id", "estimated_ready_at",
+              "completed_at", "created_at"], orders)
+        elapsed = time.perf_counter() - started
+        print(f"    {done:>12,} / {self.args.orders:,} orders {elapsed:8.1f}s", flush=True)
+
+    def deletion_requests(self):
+        count = self.args.deletion_requests
+        if not count:
+            return
+        started = time.perf_counter()
+        rng = self.rng
+        customers = rng.choice(self.args.customers, min(count, self.args.customers), replace=False) + 1
+        total = copy(self.cursor, "customer_deletion_requests", ["customer_id", "processed"],
+                     [strings(customers), ["false"] * len(customers)])
+        total += copy(self.cursor, "courier_deletion_requests", ["courier_id", "processed"],
+                      [strings(rng.integers(1, self.couriers + 1, min(count, self.couriers))),
+                       ["false"] * min(count, self.couriers)])
+        if self.args.orders:
+            self.cursor.execute(
+                "INSERT INTO order_deletion_requests (order_id, customer_id, processed) "
+                "SELECT id, customer_id, false FROM orders TABLESAMPLE BERNOULLI (%s) LIMIT %s",
+                (min(100.0, count * 200.0 / self.args.orders), count))
+            total += self.cursor.rowcount
+        if self.loaded.get("payments"):
+            self.cursor.execute(
+                "INSERT INTO payment_deletion_requests (payment_id, customer_id, processed) "
+                "SELECT id, customer_id, false FROM payments TABLESAMPLE BERNOULLI (%s) LIMIT %s",
+                (min(100.0, count * 200.0 / self.loaded["payments"]), count))
+            total += self.cursor.rowcount
+        self.report("deletion requests", total, started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load a synthetic production-sized dataset")
+    parser.add_argument("--customers", type=int, default=300_000)
+    parser.add_argument("--lockers", type=int, default=20_000)
+    parser.add_argument("--orders", type=int, default=6_000_000)
+    parser.add_argument("--payments", type=int, default=4_000_000, help="paid orders; at most --orders")
+    parser.add_argument("--deletion-requests", type=int, default=1000, help="pending requests of each kind")
+    parser.add_argument("--days", type=int, default=365, help="history length")
+    parser.add_argument("--end", default=datetime.utcnow().strftime("%Y-%m-%d"),
+                        help="date the history ends (default today), for reproducible timestamps")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=200_000, help="orders per COPY")
+    args = parser.parse_args()
+    if args.payments > args.orders:
+        parser.error("--payments cannot exceed --orders: every payment belongs to an order")
+    if min(args.customers, args.lockers) < 1:
+        parser.error("--customers and --lockers must be at least 1")
+
+    from sqlalchemy import Integer, text
+    from app import customer_stats, models, utils
+    from app.database import SessionLocal, get_engine
+
+    engine = get_engine()
+    models.Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        tables = ", ".join(table.name for table in models.Base.metadata.sorted_tables)
+        cursor.execute(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+        try:
+            # The generated rows reference only rows loaded before them, so
+            # foreign key triggers can be skipped when we are allowed to
+            cursor.execute("SAVEPOINT replica_role")
+            cursor.execute("SET LOCAL session_replication_role = replica")
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT replica_role")
+            print(f"foreign keys stay checked while loading ({str(e).strip()})")
+
+        generator = Generator(cursor, args)
+        print("loading")
+        generator.people(utils.hash("password"))
+        generator.lockers()
+        generator.orders_and_payments()
+        generator.deletion_requests()
+
+        for table in models.Base.metadata.sorted_tables:
+            # Rows were loaded with explicit ids; move the sequences past them
+            columns = list(table.primary_key.columns)
+            if len(columns) == 1 and isinstance(columns[0].type, Integer):
+                column = columns[0]
+                cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table.name}', '{column.name}'), "
+                               f"coalesce(max({column.name}), 0) + 1, false) FROM {table.name}")
+        connection.commit()
+    finally:
+        connection.close()
+
+    step = time.perf_counter()
+    db = SessionLocal()
+    try:
+        count = customer_stats.rebuild(db)
+    finally:
+        db.close()
+    print(f"  {'customer_stats (rebuilt)':<28}{count:>12,} rows {time.perf_counter() - step:8.1f}s")
+
+    step = time.perf_counter()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"  {'analyze':<28}{'':>17}{time.perf_counter() - step:8.1f}s")
+    print(f"done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# Local stand-in for the Stripe and Twilio endpoints this API calls, for
+# load testing payment and SMS flows on one machine.
+#
+#   python -m benchmarks.fake_upstreams --port 12111 \
+#       --stripe-latency lognormal:80:0.6 --stripe-error-rate 0.02 \
+#       --twilio-latency uniform:50:300 --twilio-error-rate 0.05
+#
+# then run the API with
+#
+#   STRIPE_API_BASE=http://localhost:12111 TWILIO_API_BASE=http://localhost:12111
+#
+# Latency specs (milliseconds):
+#   fixed:MS | uniform:LO:HI | normal:MEAN:STD | lognormal:MEDIAN:SIGMA | exponential:MEAN
+#
+# Settings can be changed while running with
+#   curl -X POST localhost:12111/_config -d '{"stripe": {"error_rate": 0.5}}'
+import argparse
+import asyncio
+import itertools
+import math
+import random
+import secrets
+import threading
+import time
+from aiohttp import web
+
+_ids = itertools.count(1)
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}{secrets.token_hex(8)}{next(_ids)}"
+
+
+def parse_latency(spec: str):
+    kind, *args = spec.split(":")
+    args = [float(arg) for arg in args]
+    if kind == "fixed":
+        return lambda: args[0]
+    if kind == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        # median in ms, sigma of the underlying normal
+        mu = math.log(args[0])
+        return lambda: random.lognormvariate(mu, args[1])
+    if kind == "exponential":
+        return lambda: random.expovariate(1 / args[0])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class UpstreamBehaviour:
+    def __init__(self, latency: str, error_rate: float, error_status: int):
+        self.latency_spec = latency
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+
+    def update(self, values: dict):
+        if "latency" in values:
+            self.latency = parse_latency(values["latency"])
+            self.latency_spec = values["latency"]
+        if "error_rate" in values:
+            self.error_rate = float(values["error_rate"])
+        if "error_status" in values:
+            self.error_status = int(values["error_status"])
+
+    def as_dict(self):
+        return {
+            "latency": self.latency_spec,
+            "error_rate": self.error_rate,
+            "error_status": self.error_status,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+    async def delay_or_fail(self):
+        # Returns the status to fail with, or None to answer normally
+        self.requests += 1
+        await asyncio.sleep(self.latency() / 1000)
+        if random.random() < self.error_rate:
+            self.errors += 1
+            return self.error_status
+        return None
+
+
+# Stripe
+
+def _stripe_error(status: int):
+    return web.json_response(
+        {"error": {"type": "api_error", "message": f"Simulated upstream failure ({status})"}},
+        status=status,
+    )
+
+
+async def create_payment_intent(request: web.Request):
+    behaviour = request.app["stripe"]
+    failed = await behaviour.delay_or_fail()
+    if failed:
+        return _stripe_error(failed)
+
+    form = await request.post()
+    intent = {
+        "id": _new_id("pi_"),
+        "object": "payment_intent",
+        "amount": int(form.get("amount", 0)),
+        "currency": form.get("currency", "usd"),
+        "customer": form.get("customer"),
+        "description": form.get("description"),
+        "status": "requires_payment_method",
+        "created": int(time.time()),
+        "livemode": False,
+    }
+    request.app["payment_intents"][intent["id"]] = intent
+    return web.json_response(intent)
+
+
+async def retrieve_payment_intent(request: web.Request):
+    behaviour = request.app["stripe"]
+    failed = await behaviour.delay_or_fail()
+    if failed:
+        return _stripe_error(failed)
+
+    intent_id = request.match_info["intent_id"]
+    intent = request.app["payment_intents"].get(intent_id)
+    if intent is None:
+        # Unknown ids (e.g. from a seeded database) still answer, as succeeded
+        intent = {"id": intent_id, "object": "payment_intent", "amount": 0, "currency": "usd",
+                  "status": "succeeded", "created": int(time.time()), "livemode": False}
+    return web.json_response(intent)
+
+
+# Twilio
+
+def _twilio_error(status: int):
+    return web.json_response(
+        {"code": 20500, "message": f"Simulated upstream failure ({status})", "more_info": "", "status": status},
+        status=status,
+    )
+
+
+async def create_verification(request: web.Request):
+    behaviour = request.app["twilio"]
+    failed = await behaviour.delay_or_fail()
+    if failed:
+        return _twilio_error(failed)
+
+    form = await request.post()
+    return web.json_response({
+        "sid": _new_id("VE"),
+        "service_sid": request.match_info["service_sid"],
+        "to": form.get("To"),
+        "channel": form.get("Channel", "sms"),
+        "status": "pending",
+        "valid": False,
+    }, status=201)
+
+
+async def create_verification_check(request: web.Request):
+    behaviour = request.app["twilio"]
+    failed = await behaviour.delay_or_fail()
+    if failed:
+        return _twilio_error(failed)
+
+    form = await request.post()
+    return web.json_response({
+        "sid": _new_id("VE"),
+        "service_sid": request.match_info["service_sid"],
+        "to": form.get("To"),
+        "channel": "sms",
+        "status": "approved",
+        "valid": True,
+    })
+
+
+async def create_message(request: web.Request):
+    behaviour = request.app["twilio"]
+    failed = await behaviour.delay_or_fail()
+    if failed:
+        return _twilio_error(failed)
+
+    form = await request.post()
+    return web.json_response({
+        "sid": _new_id("SM"),
+        "account_sid": request.match_info["account_sid"],
+        "to": form.get("To"),
+        "from": form.get("From"),
+        "body": form.get("Body"),
+        "status": "queued",
+        "num_segments": "1",
+    }, status=201)
+
+
+# Runtime control
+
+async def get_config(request: web.Request):
+    return web.json_response({
+        "stripe": request.app["stripe"].as_dict(),
+        "twilio": request.app["twilio"].as_dict(),
+    })
+
+
+async def set_config(request: web.Request):
+    values = await request.json()
+    for name in ("stripe", "twilio"):
+        if name in values:
+            request.app[name].update(values[name])
+    return await get_config(request)
+
+
+def build_app(stripe: UpstreamBehaviour, twilio: UpstreamBehaviour) -> web.Application:
+    app = web.Application()
+    app["stripe"] = stripe
+    app["twilio"] = twilio
+    app["payment_intents"] = {}
+    app.add_routes([
+        web.post("/v1/payment_intents", create_payment_intent),
+        web.get("/v1/payment_intents/{intent_id}", retrieve_payment_intent),
+        web.post("/v2/Services/{service_sid}/Verifications", create_verification),
+        web.post("/v2/Services/{service_sid}/VerificationCheck", create_verification_check),
+        web.post("/2010-04-01/Accounts/{account_sid}/Messages.json", create_message),
+        web.get("/_config", get_config),
+        web.post("/_config", set_config),
+    ])
+    return app
+
+
+def start_in_thread(stripe: UpstreamBehaviour = None, twilio: UpstreamBehaviour = None,
+                    host: str = "127.0.0.1", port: int = 0) -> str:
+    # Serves the fake upstreams from a daemon thread, for harnesses that run
+    # in the same process as the API; returns the base URL
+    app = build_app(stripe or UpstreamBehaviour("fixed:0", 0.0, 500),
+                    twilio or UpstreamBehaviour("fixed:0", 0.0, 503))
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, host, port)
+    loop.run_until_complete(site.start())
+    bound_port = site._server.sockets[0].getsockname()[1]
+    threading.Thread(target=loop.run_forever, name="fake-upstreams", daemon=True).start()
+    return f"http://{host}:{bound_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Stripe/Twilio server for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--stripe-latency", default="fixed:0")
+    parser.add_argument("--stripe-error-rate", type=float, default=0.0)
+    parser.add_argument("--stripe-error-status", type=int, default=500)
+    parser.add_argument("--twilio-latency", default="fixed:0")
+    parser.add_argument("--twilio-error-rate", type=float, default=0.0)
+    parser.add_argument("--twilio-error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    app = build_app(
+        UpstreamBehaviour(args.stripe_latency, args.stripe_error_rate, args.stripe_error_status),
+        UpstreamBehaviour(args.twilio_latency, args.twilio_error_rate, args.twilio_error_status),
+    )
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+# HTTP throughput benchmark.
+#
+# Seeds a scratch database, boots app.main:app under uvicorn and drives the
+# customer flows below with concurrent virtual users over an async HTTP
+# client, one scenario at a time. Reports p50/p95/p99 latency and
+# requests/second per scenario and saves them as JSON, so two commits can be
+# compared:
+#
+#   python -m benchmarks.http_suite --customers 2000 --concurrency 32 --duration 20
+#   python -m benchmarks.http_suite --compare benchmarks/results/http-<old commit>.json
+#
+# Uses the database from the usual DATABASE_* settings, which must be a
+# scratch database: tables are created if missing and truncated before
+# seeding. Stripe and Twilio are answered by benchmarks.fake_upstreams,
+# started in-process. Pass --base-url to benchmark a server that is already
+# running against the same database instead of booting one.
+#
+# Scenarios, in the order they run:
+#   login           POST /customerlogin
+#   create order    POST /orders/
+#   list orders     GET /orders/ (the customer's own)
+#   list payments   GET /payments/ (the customer's own)
+#   book            POST /lockers/{id}/book on an available locker
+#   unlock          POST /lockers/{id}/unlock on the lockers booked above
+#   lock            POST /lockers/{id}/lock on the lockers unlocked above
+# book, unlock and lock end early when every virtual user has run out of
+# lockers to work on.
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks import fake_upstreams
+
+PASSWORD = "password"
+SERVICES = ["wash", "wash, dry", "wash, dry, iron"]
+
+
+def seed(db, customers: int, orders_per_customer: int, payments_per_customer: int, lockers: int) -> Dict:
+    from sqlalchemy import insert, text
+    from app import models, utils
+
+    tables = ", ".join(table.name for table in models.Base.metadata.sorted_tables)
+    db.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+
+    rng = random.Random(0)
+    # One bcrypt hash for everyone; hashing per row would dominate seeding
+    password = utils.hash(PASSWORD)
+    now = datetime.utcnow()
+    couriers = max(customers // 50, 1)
+    laundromats = max(customers // 100, 1)
+
+    def chunked(model, rows, size=5000):
+        for start in range(0, len(rows), size):
+            db.execute(insert(model), rows[start:start + size])
+
+    db.execute(insert(models.Admin), [{"name": "Admin", "email": "admin@example.com", "password": password}])
+    chunked(models.Customer, [
+        {"name": f"Customer {i}", "email": f"customer{i}@example.com", "phone_number": f"+2547{i:08d}",
+         "password": password, "stripe_customer_id": f"cus_{i}"}
+        for i in range(1, customers + 1)
+    ])
+    chunked(models.Courier, [
+        {"name": f"Courier {i}", "email": f"courier{i}@example.com", "phone_number": f"+2541{i:08d}",
+         "password": password, "vehicle_reg_no": f"KAA {i:05d}"}
+        for i in range(1, couriers + 1)
+    ])
+    chunked(models.Laundromat, [
+        {"name": f"Laundromat {i}", "email": f"laundromat{i}@example.com", "password": password,
+         "latitude": -1.28 + rng.uniform(-0.1, 0.1), "longitude": 36.82 + rng.uniform(-0.1, 0.1)}
+        for i in range(1, laundromats + 1)
+    ])
+    chunked(models.LaundromatCapacity, [
+        {"laundromat_id": i, "service": service, "kg_per_hour": rng.choice([10.0, 20.0, 40.0])}
+        for i in range(1, laundromats + 1) for service in ("wash", "dry", "iron")
+    ])
+    db.execute(insert(models.ServicePrice), [
+        {"service": "wash", "price_per_kg": 1.5, "minimum_charge": 5.0},
+        {"service": "dry", "price_per_kg": 1.0, "minimum_charge": 3.0},
+        {"service": "iron", "price_per_kg": 2.0, "minimum_charge": 4.0},
+    ])
+    # Half the lockers start occupied, like a busy afternoon
+    chunked(models.Locker, [
+        {"locker_number": f"L{i:06d}", "location": f"Block {i % 50}", "size": rng.choice(list(models.LockerSize)),
+         "status": models.LockerStatus.OCCUPIED if i % 2 else models.LockerStatus.AVAILABLE,
+         "latitude": -1.28 + rng.uniform(-0.1, 0.1), "longitude": 36.82 + rng.uniform(-0.1, 0.1)}
+        for i in range(1, lockers + 1)
+    ])
+    chunked(models.Payment, [
+        {"customer_id": customer_id, "amount": round(rng.uniform(5, 80), 2),
+         "stripe_payment_id": f"pi_seed_{customer_id}_{n}", "status": "succeeded",
+         "payment_date": now - timedelta(hours=rng.randint(1, 24 * 90))}
+        for customer_id in range(1, customers + 1) for n in range(payments_per_customer)
+    ])
+    chunked(models.Order, [
+        {"customer_id": customer_id, "services": rng.choice(SERVICES), "weight": round(rng.uniform(1, 15), 1),
+         "laundromat_id": rng.randint(1, laundromats), "created_at": now - timedelta(hours=rng.randint(1, 24 * 90))}
+        for customer_id in range(1, customers + 1) for _ in range(orders_per_customer)
+    ])
+    db.commit()
+
+    return {
+        "customers": customers,
+        "couriers": couriers,
+        "laundromats": laundromats,
+        "lockers": lockers,
+        "orders": customers * orders_per_customer,
+        "payments": customers * payments_per_customer,
+        "available_lockers": [i for i in range(1, lockers + 1) if not i % 2],
+    }
+
+
+class VirtualUser:
+    def __init__(self, customer_id: int):
+        self.customer_id = customer_id
+        self.email = f"customer{customer_id}@example.com"
+        self.headers: Dict[str, str] = {}
+        self.booked: List = []  # (locker_id, code) waiting to be unlocked
+        self.unlocked: List = []  # (locker_id, code) waiting to be locked again
+
+
+# Each step makes one request for a virtual user and returns
+# (response, expected status), or None when the user has nothing left to do
+
+async def login(client, user, state):
+    email = f"customer{random.randint(1, state['customers'])}@example.com"
+    return await client.post("/customerlogin", json={"email": email, "password": PASSWORD}), 200
+
+
+async def create_order(client, user, state):
+    body = {"services": random.choice(SERVICES), "weight": round(random.uniform(1, 15), 1)}
+    return await client.post("/orders/", json=body, headers=user.headers), 201
+
+
+async def list_orders(client, user, state):
+    return await client.get("/orders/", headers=user.headers), 200
+
+
+async def list_payments(client, user, state):
+    return await client.get("/payments/", headers=user.headers), 200
+
+
+async def book(client, user, state):
+    if not state["available_lockers"]:
+        return None
+    locker_id = state["available_lockers"].pop()
+    response = await client.post(f"/lockers/{locker_id}/book", headers=user.headers)
+    if response.status_code == 200:
+        user.booked.append((locker_id, response.json()["code"]))
+    return response, 200
+
+
+async def unlock(client, user, state):
+    if not user.booked:
+        return None
+    locker_id, code = user.booked.pop()
+    response = await client.post(f"/lockers/{locker_id}/unlock", json={"code": code}, headers=user.headers)
+    if response.status_code == 200:
+        user.unlocked.append((locker_id, code))
+    return response, 200
+
+
+async def lock(client, user, state):
+    if not user.unlocked:
+        return None
+    locker_id, code = user.unlocked.pop()
+    return await client.post(f"/lockers/{locker_id}/lock", json={"code": code}, headers=user.headers), 200
+
+
+SCENARIOS = {
+    "login": login,
+    "create order": create_order,
+    "list orders": list_orders,
+    "list payments": list_payments,
+    "book": book,
+    "unlock": unlock,
+    "lock": lock,
+}
+
+
+def percentile(ordered: List[float], fraction: float) -> Optional[float]:
+    # Nearest rank
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def summarise(latencies: List[float], errors: Dict[str, int], elapsed: float) -> Dict:
+    ordered = sorted(latencies)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else None,
+        "p50_ms": ms(percentile(ordered, 0.50)),
+        "p95_ms": ms(percentile(ordered, 0.95)),
+        "p99_ms": ms(percentile(ordered, 0.99)),
+        "max_ms": ms(ordered[-1]) if ordered else None,
+    }
+
+
+async def run_scenario(client, step, users: List[VirtualUser], state: Dict, duration: float) -> Dict:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user(user):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                result = await step(client, user, state)
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            if result is None:
+                return
+            response, expected = result
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != expected:
+                errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(user) for user in users))
+    return summarise(latencies, errors, time.perf_counter() - started)
+
+
+async def drive(base_url: str, state: Dict, concurrency: int, duration: float, scenarios: List[str]) -> Dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        # One customer per virtual user, so bookings do not fight over the
+        # same latest order
+        users = [VirtualUser(customer_id) for customer_id in range(1, concurrency + 1)]
+        for user in users:
+            response = await client.post("/customerlogin", json={"email": user.email, "password": PASSWORD})
+            response.raise_for_status()
+            user.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        results = {}
+        for name in scenarios:
+            results[name] = await run_scenario(client, SCENARIOS[name], users, state, duration)
+            print_row(name, results[name])
+        return results
+
+
+def print_row(name: str, result: Dict, baseline: Optional[Dict] = None):
+    def cell(key, width, higher_is_better=False):
+        value = result.get(key)
+        text = "-" if value is None else f"{value:.1f}"
+        old = (baseline or {}).get(key)
+        if value is not None and old:
+            change = (value - old) / old * 100
+            text += f" ({change:+.0f}%{'' if (change >= 0) == higher_is_better else ' !'})" \
+                if abs(change) >= 5 else ""
+        return f"{text:>{width}}"
+
+    errors = sum(result["errors"].values())
+    print(f"{name:<16}{result['requests']:>9}{errors:>8}{cell('rps', 18, True)}"
+          f"{cell('p50_ms', 18)}{cell('p95_ms', 18)}{cell('p99_ms', 18)}")
+
+
+def print_header():
+    print(f"{'scenario':<16}{'requests':>9}{'errors':>8}{'req/s':>18}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}")
+
+
+def git_commit() -> Dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "app"))}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(env: Dict[str, str], workers: int) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+        try:
+            if httpx.get(base_url + "/health").status_code == 200:
+                return server, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not become healthy within 60s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent HTTP benchmark of the customer flows")
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--orders-per-customer", type=int, default=10)
+    parser.add_argument("--payments-per-customer", type=int, default=5)
+    parser.add_argument("--lockers", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per scenario")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--base-url", help="benchmark this running server instead of booting one")
+    parser.add_argument("--output", help="results file (default benchmarks/results/http-<commit>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+    if args.concurrency > args.customers:
+        parser.error("--concurrency cannot exceed --customers: each virtual user is a different customer")
+
+    # Must be set before the app (and its settings) are imported, here and
+    # in the server process
+    upstream_url = fake_upstreams.start_in_thread()
+    os.environ["STRIPE_API_BASE"] = upstream_url
+    os.environ["TWILIO_API_BASE"] = upstream_url
+    os.environ.setdefault("STRIPE_API_KEY", "sk_test_http_suite")
+    # Each virtual user runs flat out, far past any per-client limit
+    for route_class in ("READ", "WRITE", "LOGIN"):
+        os.environ[f"RATE_LIMIT_{route_class}_PER_SECOND"] = "0"
+
+    from app import models
+    from app.database import SessionLocal, get_engine
+
+    models.Base.metadata.create_all(bind=get_engine())
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        state = seed(db, args.customers, args.orders_per_customer, args.payments_per_customer, args.lockers)
+        print(f"seeded {state['customers']} customers, {state['orders']} orders, {state['payments']} payments, "
+              f"{state['lockers']} lockers in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+    random.shuffle(state["available_lockers"])
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server, base_url = start_server(dict(os.environ), args.workers)
+    try:
+        print_header()
+        results = asyncio.run(drive(base_url, state, args.concurrency, args.duration, args.scenarios))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = {
+        **git_commit(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "config": {key: getattr(args, key) for key in
+                   ("customers", "orders_per_customer", "payments_per_customer", "lockers",
+                    "concurrency", "duration", "workers")},
+        "scenarios": results,
+    }
+    output = args.output or os.path.join("benchmarks", "results", f"http-{report['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\ncompared with {baseline.get('commit')} ({args.compare}); ! marks a change for the worse")
+        print_header()
+        for name, result in results.items():
+            print_row(name, result, baseline["scenarios"].get(name))
+
+
+if __name__ == "__main__":
+    main()
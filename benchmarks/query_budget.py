@@ -0,0 +1,220 @@
+# Query-budget regression check.
+#
+# Runs each endpoint below against seeded datasets of increasing size and
+# counts the SQL statements and outbound Stripe/Twilio calls of one request
+# (after a warm-up request, so one-off cache loads are not counted). It
+# fails when an endpoint goes over its declared budget, or when its counts
+# grow with the dataset, which is what an N+1 or a per-row upstream call
+# looks like.
+#
+#   python -m benchmarks.query_budget --sizes 10 100 1000
+#
+# Uses the database from the usual DATABASE_* settings, which must be a
+# scratch database: tables are created if missing and truncated between
+# sizes. Stripe and Twilio are answered by benchmarks.fake_upstreams,
+# started in-process. Exits with status 1 when any budget is broken.
+import argparse
+import os
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Union
+
+from benchmarks import fake_upstreams
+
+
+@dataclass
+class Case:
+    name: str
+    method: str
+    path: Union[str, Callable[[dict], str]]
+    as_user: str
+    max_statements: int
+    max_upstream: int = 0
+    body: Optional[Union[dict, list]] = None
+    expect_status: int = 200
+
+
+# Budgets are per request, authentication included
+CASES = [
+    Case("list own orders", "GET", "/orders/", "customer", 2),
+    Case("list all orders", "GET", "/orders/", "admin", 2),
+    Case("create order", "POST", "/orders/", "customer", 5, body={"services": "wash, dry", "weight": 4.5},
+         expect_status=201),
+    Case("quote order", "POST", "/orders/quote", "customer", 1, body={"services": "wash, dry", "weight": 4.5}),
+    Case("quote orders in batch", "POST", "/orders/quote/batch", "customer", 1,
+         body=[{"services": "wash", "weight": w} for w in (1, 5, 12)]),
+    Case("list own payments", "GET", "/payments/", "customer", 2),
+    Case("get payment", "GET", lambda ids: f"/payments/{ids['payment']}", "customer", 2, max_upstream=1),
+    Case("create payment", "POST", "/payments/", "customer", 9, max_upstream=1, body={}, expect_status=201),
+    Case("list lockers", "GET", "/lockers/", "admin", 2),
+    Case("list available lockers", "GET", "/lockers/available", "customer", 2),
+    Case("list occupied lockers", "GET", "/lockers/occupied", "courier", 2),
+    Case("list booked lockers", "GET", "/lockers/booked", "customer", 2),
+    Case("book locker", "POST", lambda ids: f"/lockers/{ids['available_lockers'].pop()}/book", "customer", 7),
+    Case("customer directory", "GET", "/customers/", "admin", 2),
+    Case("courier directory", "GET", "/courier/", "admin", 2),
+    Case("laundromat directory", "GET", "/laundromat/", "admin", 2),
+    Case("customer detail", "GET", lambda ids: f"/customers/{ids['customer']}", "customer", 3),
+    Case("price table", "GET", "/prices/", "customer", 2),
+    Case("deletion request queue", "GET", "/deletion-requests/", "admin", 5),
+]
+
+
+def seed(db, size: int) -> Dict:
+    # size customers, couriers, laundromats and lockers; the customer under
+    # test owns size orders and size payments, half of them in lockers
+    from sqlalchemy import insert, text
+    from app import models, utils
+
+    tables = ", ".join(table.name for table in models.Base.metadata.sorted_tables)
+    db.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+
+    password = utils.hash("password")
+    now = datetime.utcnow()
+    db.execute(insert(models.Admin), [{"name": "Admin", "email": "admin@example.com", "password": password}])
+    db.execute(insert(models.Customer), [
+        {"name": f"Customer {i}", "email": f"customer{i}@example.com", "phone_number": f"+2547{i:08d}",
+         "password": password, "stripe_customer_id": f"cus_{i}"}
+        for i in range(1, size + 1)
+    ])
+    db.execute(insert(models.Courier), [
+        {"name": f"Courier {i}", "email": f"courier{i}@example.com", "phone_number": f"+2541{i:08d}",
+         "password": password, "vehicle_reg_no": f"KAA {i:05d}"}
+        for i in range(1, size + 1)
+    ])
+    db.execute(insert(models.Laundromat), [
+        {"name": f"Laundromat {i}", "email": f"laundromat{i}@example.com", "password": password,
+         "latitude": -1.28 + i * 0.001, "longitude": 36.82}
+        for i in range(1, size + 1)
+    ])
+    db.execute(insert(models.LaundromatCapacity), [
+        {"laundromat_id": i, "service": service, "kg_per_hour": 20.0}
+        for i in range(1, size + 1) for service in ("wash", "dry")
+    ])
+    db.execute(insert(models.ServicePrice), [
+        {"service": "wash", "price_per_kg": 1.5, "minimum_charge": 5.0},
+        {"service": "dry", "price_per_kg": 1.0, "minimum_charge": 3.0},
+    ])
+    db.execute(insert(models.Locker), [
+        {"locker_number": f"L{i:06d}", "location": f"Block {i % 20}", "size": models.LockerSize.MEDIUM,
+         "status": models.LockerStatus.OCCUPIED if i <= size // 2 else models.LockerStatus.AVAILABLE,
+         "latitude": -1.28, "longitude": 36.82 + i * 0.0001}
+        for i in range(1, size + 1)
+    ])
+    db.execute(insert(models.Payment), [
+        {"customer_id": 1, "amount": 10.0 + i, "stripe_payment_id": f"pi_seed_{i}", "status": "succeeded",
+         "payment_date": now - timedelta(hours=i)}
+        for i in range(1, size + 1)
+    ])
+    db.execute(insert(models.Order), [
+        {"customer_id": 1, "services": "wash, dry", "weight": 3.0 + i % 7, "payment_id": i,
+         "locker_id": i if i <= size // 2 else None, "created_at": now - timedelta(hours=i)}
+        for i in range(1, size + 1)
+    ])
+    db.execute(insert(models.CustomerDeletionRequest), [
+        {"customer_id": i, "processed": False} for i in range(2, min(size, 20) + 1)
+    ])
+    db.commit()
+
+    return {
+        "customer": 1,
+        "payment": 1,
+        # Several per run: warm-up and measured requests each book one
+        "available_lockers": list(range(size // 2 + 1, size + 1)),
+    }
+
+
+def reset_caches():
+    # In-memory state built from the previous dataset
+    from app import dispatch, pricing, scheduling
+    dispatch.engine.reset()
+    scheduling.scheduler.reset()
+    pricing.price_table.invalidate()
+
+
+def tokens():
+    from app import oauth2
+    return {
+        user_type: "Bearer " + oauth2.create_access_token({"user_id": 1, "user_type": user_type})
+        for user_type in ("admin", "customer", "courier", "laundromat")
+    }
+
+
+def measure(client, case: Case, ids: dict, auth: dict):
+    from app.metrics import registry
+
+    path = case.path(ids) if callable(case.path) else case.path
+    statements = registry.statements
+    upstream = sum(registry.upstream.values())
+    response = client.request(case.method, path, json=case.body, headers={"Authorization": auth[case.as_user]})
+    return (response.status_code, registry.statements - statements,
+            sum(registry.upstream.values()) - upstream)
+
+
+def run(sizes) -> bool:
+    from fastapi.testclient import TestClient
+    from app import models
+    from app.database import SessionLocal, get_engine
+    from app.main import create_app
+
+    models.Base.metadata.create_all(bind=get_engine())
+    # No lifespan: the background workers are not needed here
+    client = TestClient(create_app())
+    auth = tokens()
+    results = {case.name: {} for case in CASES}
+
+    for size in sizes:
+        db = SessionLocal()
+        try:
+            ids = seed(db, size)
+        finally:
+            db.close()
+        reset_caches()
+        for case in CASES:
+            measure(client, case, ids, auth)  # warm-up
+            results[case.name][size] = measure(client, case, ids, auth)
+
+    ok = True
+    print(f"{'endpoint':<28}" + "".join(f"{size:>14}" for size in sizes) + "   budget")
+    for case in CASES:
+        runs = results[case.name]
+        problems = []
+        for size, (status_code, statements, upstream) in runs.items():
+            if status_code != case.expect_status:
+                problems.append(f"status {status_code} at size {size}")
+            if statements > case.max_statements:
+                problems.append(f"{statements} statements at size {size}")
+            if upstream > case.max_upstream:
+                problems.append(f"{upstream} upstream calls at size {size}")
+        first, last = runs[sizes[0]], runs[sizes[-1]]
+        if last[1] > first[1] or last[2] > first[2]:
+            problems.append("grows with data size")
+
+        cells = "".join(f"{f'{statements} sql/{upstream} up':>14}" for _, statements, upstream in runs.values())
+        print(f"{case.name:<28}{cells}   {case.max_statements} sql/{case.max_upstream} up"
+              + (f"   FAIL: {'; '.join(problems)}" if problems else ""))
+        ok = ok and not problems
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-endpoint SQL and upstream call budgets")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    args = parser.parse_args()
+
+    # Must be set before the app (and its settings) are imported
+    base_url = fake_upstreams.start_in_thread()
+    os.environ["STRIPE_API_BASE"] = base_url
+    os.environ["TWILIO_API_BASE"] = base_url
+    os.environ.setdefault("STRIPE_API_KEY", "sk_test_query_budget")
+    # Budgets are about the queries behind a response, not cache hits
+    os.environ["RESPONSE_CACHE_MAX_BYTES"] = "0"
+    for route_class in ("READ", "WRITE", "LOGIN"):
+        os.environ[f"RATE_LIMIT_{route_class}_PER_SECOND"] = "0"
+
+    sys.exit(0 if run(sorted(args.sizes)) else 1)
+
+
+if __name__ == "__main__":
+    main()
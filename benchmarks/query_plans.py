@@ -0,0 +1,185 @@
+# Query plan regression check.
+#
+# Runs EXPLAIN on the queries behind the busiest endpoints and background
+# jobs, built the same way the app builds them, and fails when one of them
+# reads a table it should reach through an index with a sequential scan.
+# That is what a missing or unusable index looks like once the tables are
+# production-sized; on a small database the planner seq-scans everything.
+#
+#   python -m benchmarks.query_plans --load
+#
+# --load first fills the database with benchmarks.dataset (sized by
+# --customers, --orders and so on below); without it the plans are checked
+# against whatever the database already holds. Uses the database from the
+# usual DATABASE_* settings, which must be a scratch database when loading.
+# Exits with status 1 when any plan falls back to a sequential scan.
+#
+# Lists that return a large share of a table (e.g. /lockers/available) are
+# left out: a sequential scan is the right plan for them. So are tables under
+# MIN_PAGES pages, which the dataset leaves small or empty (couriers'
+# deletion requests, notification deliveries); they are reported as such.
+import argparse
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Callable, List
+
+# Below this a sequential scan is as cheap as any index
+MIN_PAGES = 3
+
+
+@dataclass
+class Case:
+    name: str
+    # (db, ids) -> Query, with ids picked from the loaded data
+    query: Callable
+    # Tables that must not be read with a sequential scan
+    indexed: List[str]
+
+
+def cases():
+    from sqlalchemy import func
+    from app import models
+    from app.pagination import search_filter
+    from app.models import CourierDeletionRequest, CustomerDeletionRequest, Locker, LockerStatus, Order, \
+        OrderDeletionRequest, Payment, PaymentDeletionRequest
+
+    return [
+        Case("list own orders", lambda db, ids: db.query(Order).filter(Order.customer_id == ids["customer"]),
+             ["orders"]),
+        Case("latest order (book locker, pay)",
+             lambda db, ids: db.query(Order).filter(Order.customer_id == ids["customer"])
+             .order_by(Order.created_at.desc()).limit(1), ["orders"]),
+        Case("list own payments", lambda db, ids: db.query(Payment).filter_by(customer_id=ids["customer"]),
+             ["payments"]),
+        Case("list booked lockers",
+             lambda db, ids: db.query(Locker).filter(
+                 Locker.status == LockerStatus.OCCUPIED,
+                 Locker.locker_id.in_(db.query(Order.locker_id).filter(Order.customer_id == ids["customer"]))),
+             ["orders"]),
+        Case("unlock by code",
+             lambda db, ids: db.query(Locker).filter(func.lower(Locker.code) == func.lower(ids["code"])).limit(1),
+             ["lockers"]),
+        Case("orders in a locker", lambda db, ids: db.query(Order.id).filter(Order.locker_id == ids["locker"]),
+             ["orders"]),
+        Case("orders of payments (delete payment)",
+             lambda db, ids: db.query(Order.id).filter(Order.payment_id.in_([ids["payment"]])), ["orders"]),
+        Case("orders of a courier (delete courier)",
+             lambda db, ids: db.query(Order.id).filter(Order.courier_id.in_([ids["courier"]])), ["orders"]),
+        Case("open orders (scheduler load)",
+             lambda db, ids: db.query(Order.laundromat_id, Order.services, func.coalesce(func.sum(Order.weight), 0))
+             .filter(Order.laundromat_id.isnot(None), Order.completed_at.is_(None))
+             .group_by(Order.laundromat_id, Order.services), ["orders"]),
+        Case("awaiting pickup (dispatch load)",
+             lambda db, ids: db.query(Order.id, Order.locker_id, Order.courier_id, Locker.latitude, Locker.longitude)
+             .join(Locker, Locker.locker_id == Order.locker_id)
+             .filter(Locker.status == LockerStatus.OCCUPIED, Order.picked_up_at.is_(None),
+                     Locker.latitude.isnot(None), Locker.longitude.isnot(None)), ["orders"]),
+        Case("customer deletion requests by customer",
+             lambda db, ids: db.query(CustomerDeletionRequest.id)
+             .filter(CustomerDeletionRequest.customer_id.in_([ids["customer"]])), ["customer_deletion_requests"]),
+        Case("courier deletion requests by courier",
+             lambda db, ids: db.query(CourierDeletionRequest.id)
+             .filter(CourierDeletionRequest.courier_id.in_([ids["courier"]])), ["courier_deletion_requests"]),
+        Case("order deletion requests by order",
+             lambda db, ids: db.query(OrderDeletionRequest.id)
+             .filter(OrderDeletionRequest.order_id.in_([ids["order"]])), ["order_deletion_requests"]),
+        Case("order deletion requests by customer",
+             lambda db, ids: db.query(OrderDeletionRequest.id)
+             .filter(OrderDeletionRequest.customer_id.in_([ids["customer"]])), ["order_deletion_requests"]),
+        Case("payment deletion requests by payment",
+             lambda db, ids: db.query(PaymentDeletionRequest.id)
+             .filter(PaymentDeletionRequest.payment_id.in_([ids["payment"]])), ["payment_deletion_requests"]),
+        Case("payment deletion requests by customer",
+             lambda db, ids: db.query(PaymentDeletionRequest.id)
+             .filter(PaymentDeletionRequest.customer_id.in_([ids["customer"]])), ["payment_deletion_requests"]),
+        Case("customer directory search",
+             lambda db, ids: db.query(models.Customer.customer_id)
+             .filter(search_filter(models.Customer, f"Customer {ids['customer']}"))
+             .order_by(models.Customer.customer_id).limit(51), ["customers"]),
+        Case("courier directory search",
+             lambda db, ids: db.query(models.Courier.courier_id)
+             .filter(search_filter(models.Courier, f"courier{ids['courier']}@"))
+             .order_by(models.Courier.courier_id).limit(51), ["couriers"]),
+        Case("notification deliveries by customer",
+             lambda db, ids: db.query(models.NotificationDelivery.id)
+             .filter(models.NotificationDelivery.customer_id.in_([ids["customer"]])), ["notification_deliveries"]),
+    ]
+
+
+def pick_ids(db) -> dict:
+    # A customer, locker, payment and courier that actually have orders
+    from sqlalchemy import text
+
+    order = db.execute(text(
+        "SELECT id, customer_id, locker_id, payment_id, courier_id FROM orders "
+        "WHERE locker_id IS NOT NULL AND payment_id IS NOT NULL AND courier_id IS NOT NULL LIMIT 1")).first()
+    if order is None:
+        sys.exit("No orders with a locker, payment and courier; load a dataset first (--load)")
+    code = db.execute(text("SELECT code FROM lockers WHERE code IS NOT NULL LIMIT 1")).scalar() or "ABC123"
+    return {"order": order.id, "customer": order.customer_id, "locker": order.locker_id,
+            "payment": order.payment_id, "courier": order.courier_id, "code": code}
+
+
+def scans(node, found=None):
+    # (node type, table, index) of every scan; bitmap index scans name only the index
+    found = [] if found is None else found
+    if node.get("Relation Name") or node.get("Index Name"):
+        found.append((node["Node Type"], node.get("Relation Name"), node.get("Index Name")))
+    for child in node.get("Plans", []):
+        scans(child, found)
+    return found
+
+
+def explain(db, query):
+    from sqlalchemy import text
+
+    sql = str(query.statement.compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+    plan = db.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+    return scans(plan[0]["Plan"])
+
+
+def run() -> bool:
+    from sqlalchemy import text
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        ids = pick_ids(db)
+        pages = dict(db.execute(text("SELECT relname, relpages FROM pg_class WHERE relkind = 'r'")).all())
+        ok = True
+        for case in cases():
+            found = explain(db, case.query(db, ids))
+            small = [table for table in case.indexed if pages.get(table, 0) < MIN_PAGES]
+            bad = sorted({table for node_type, table, _ in found
+                          if node_type == "Seq Scan" and table in case.indexed and table not in small})
+            ok = ok and not bad
+            plan = ", ".join(node_type + (f" on {table}" if table else "") + (f" using {index}" if index else "")
+                             for node_type, table, index in found)
+            notes = [f"FAIL: seq scan on {', '.join(bad)}"] if bad else []
+            notes += [f"not checked: {table} has under {MIN_PAGES} pages" for table in small]
+            print(f"{case.name:<42}{plan}" + "".join(f"   {note}" for note in notes))
+        return ok
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that hot queries use indexes")
+    parser.add_argument("--load", action="store_true", help="load a dataset with benchmarks.dataset first")
+    parser.add_argument("--customers", type=int, default=20_000)
+    parser.add_argument("--lockers", type=int, default=2_000)
+    parser.add_argument("--orders", type=int, default=400_000)
+    parser.add_argument("--payments", type=int, default=250_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.load:
+        subprocess.run([sys.executable, "-m", "benchmarks.dataset", "--customers", str(args.customers),
+                        "--lockers", str(args.lockers), "--orders", str(args.orders),
+                        "--payments", str(args.payments), "--seed", str(args.seed)], check=True)
+    sys.exit(0 if run() else 1)
+
+
+if __name__ == "__main__":
+    main()
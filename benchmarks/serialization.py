@@ -0,0 +1,98 @@
+# Per-row cost of rendering list responses, before and after the orjson
+# fast path (app/responses.py). No database or server is involved: rows are
+# plain objects with the attributes an ORM instance would have.
+#
+#   python -m benchmarks.serialization --rows 10000 --repeat 5
+#
+# Modes:
+#   default      response_model validation + jsonable_encoder + json.dumps (FastAPI's JSONResponse)
+#   orjson       response_model validation + jsonable_encoder + orjson (ORJSONResponse as default class)
+#   rows         rows_response(): schema fields read off each row, straight to orjson
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from app import schemas
+from app.responses import rows_response
+
+
+def make_rows(kind: str, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    now = datetime(2023, 6, 1)
+    rows = []
+    for i in range(1, count + 1):
+        if kind == "orders":
+            rows.append(SimpleNamespace(
+                id=i, services=rng.choice(["wash", "wash, dry", "wash, dry, iron"]),
+                weight=round(rng.uniform(1, 15), 2), laundromat_id=rng.randint(1, 50),
+                estimated_ready_at=now + timedelta(minutes=rng.randint(0, 10000)),
+            ))
+        elif kind == "payments":
+            rows.append(SimpleNamespace(
+                id=i, amount=round(rng.uniform(5, 80), 2), payment_date=now - timedelta(minutes=i),
+                customer_id=rng.randint(1, 5000), created_at=now - timedelta(minutes=i),
+            ))
+        else:
+            rows.append(SimpleNamespace(
+                locker_id=i, locker_number=f"L{i:05d}", location=f"Block {i % 40}",
+                status=rng.choice(list(schemas.LockerStatus)), size=rng.choice(list(schemas.LockerSize)),
+                latitude=-1.28 + rng.uniform(-0.1, 0.1), longitude=36.82 + rng.uniform(-0.1, 0.1),
+            ))
+    return rows
+
+
+SCHEMAS = {"orders": schemas.OrderOut, "payments": schemas.PaymentOut, "lockers": schemas.LockerOut}
+
+
+def render_validated(field, rows, response_class):
+    content = asyncio.run(serialize_response(field=field, response_content=rows))
+    return response_class(content).body
+
+
+def run(kind: str, count: int, repeat: int):
+    schema = SCHEMAS[kind]
+    rows = make_rows(kind, count)
+    field = create_response_field(name="Response_" + kind, type_=List[schema])
+    modes = {
+        "default": lambda: render_validated(field, rows, JSONResponse),
+        "orjson": lambda: render_validated(field, rows, ORJSONResponse),
+        "rows": lambda: rows_response(rows, schema).body,
+    }
+
+    results = {}
+    for mode, render in modes.items():
+        render()  # warm up
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[mode] = best
+
+    baseline = results["default"]
+    print(f"{kind}: {count} rows, best of {repeat}")
+    for mode, elapsed in results.items():
+        print(f"  {mode:<8} {elapsed * 1000:8.1f} ms  {elapsed / count * 1e6:6.2f} us/row  "
+              f"x{baseline / elapsed:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List response serialisation micro-benchmark")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--kind", choices=list(SCHEMAS) + ["all"], default="all")
+    args = parser.parse_args()
+
+    for kind in (SCHEMAS if args.kind == "all" else [args.kind]):
+        run(kind, args.rows, args.repeat)
+
+
+if __name__ == "__main__":
+    main()